@@ -0,0 +1,578 @@
+"""This is the benchmark script of Problem 1
+
+Benchmarks of gen_images.py:
+i) overlap : How the time needed to generate one output image scales with the
+   canvas size for both overlap detection methods (grid and scan)
+ii) frames : Frames per second of the headless generation path (render and
+    write PNG), optionally with the --preview GUI work added for comparison
+    for both placement engines and with or without the sprite cache
+iii) suite : Regression suite over canvas sizes, shape counts, K values and fill
+     densities. Times augment_image, check_overlap_coordinates, add_obj, one
+     round of the batch placement against the number of placed shapes, both
+     placement engines per image and the
+     end-to-end main() loop and writes one JSON record per measurement with
+     frames/sec, objects per image, placement acceptance rate and peak RSS. --profile runs the end-to-end
+     loop under cProfile and writes the stats of the hot path
+iv) augment : Time per scale and rotate call of the PIL and OpenCV augmentation
+    backends for every color mode
+v) startup : Import time of gen_images.py from a python -X importtime report,
+    with the slowest top level imports. --max-ms fails when it is exceeded
+
+Synthetic sprites with the same sizes as the cropped input shapes are used,
+so the benchmark does not depend on the input folder (except suite main,
+which runs gen_images.main on --input).
+
+Usage : python benchmark.py overlap --sizes 1024 2048 4096 --repeat 3
+        python benchmark.py frames --dimension 1024 --num-images 20
+        python benchmark.py frames --dimension 1024 --num-images 20 --color-mode RGB
+        python benchmark.py suite --sizes 1024 2048 --shape-counts 4 8 --k-values 90 361 --fill-densities 0.2 0.4 --output bench.jsonl
+        python benchmark.py augment --modes L RGB RGBA --size 50 200
+        python benchmark.py startup --repeat 5 --max-ms 500
+"""
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import gen_images
+from occupancy_index import BatchOccupancyGrid, OccupancyGrid
+from sprite_cache import SpriteCache
+
+# Sizes of the cropped prism, cube, dodecahedron and rectangle shapes
+SHAPE_SIZES = [(320, 297), (170, 177), (680, 711), (58, 195)]
+
+
+"""Helper Method to create solid sprites with the sizes of the input shapes
+
+    Args: count : Number of sprites
+          mode : Color mode of the sprites, "L", "RGB" or "RGBA"
+    Returns : list of PIL images
+
+"""
+def synthetic_shapes(count=len(SHAPE_SIZES), mode="L"):
+    return [Image.new(mode, SHAPE_SIZES[i % len(SHAPE_SIZES)], "white") for i in range(0, count)]
+
+
+"""Helper Method to time the generation of a single output image
+
+    Args: shapes : list of PIL images
+          dimension : Edge length of the square canvas
+          method : "grid" or "scan"
+          seed : Random seed, identical for both methods
+    Returns : (elapsed seconds, number of placed shapes)
+
+"""
+def time_one_image(shapes, dimension, method, seed):
+    random.seed(seed)
+    canvas = np.zeros((dimension, dimension), dtype="uint8")
+    index = OccupancyGrid(dimension, dimension) if method == "grid" else None
+    positions = []
+
+    start = time.perf_counter()
+    for shape in shapes:
+        positions = gen_images.add_obj(positions, shape, dimension, dimension, index, canvas=canvas)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, len(positions)
+
+
+def bench_overlap(args):
+    shapes = synthetic_shapes()
+
+    print(f"{'size':>6} {'method':>6} {'sec/image':>10} {'shapes':>7}")
+    for dimension in args.sizes:
+        for method in args.methods:
+            timings = []
+            for r in range(0, args.repeat):
+                elapsed, placed = time_one_image(shapes, dimension, method, args.seed + r)
+                timings.append(elapsed)
+            print(f"{dimension:>6} {method:>6} {min(timings):>10.4f} {placed:>7}")
+
+
+def bench_frames(args):
+    shapes = synthetic_shapes(mode=args.color_mode)
+    image_dimensions = (args.dimension, args.dimension)
+
+    cache = None
+    if args.sprite_cache_mb > 0:
+        cache = SpriteCache(gen_images.AUGMENT_BACKENDS[args.augment_backend],
+                            max_bytes=args.sprite_cache_mb * 1024 * 1024)
+
+    plan = gen_images.plan_placement(shapes, image_dimensions, cache)
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        start = time.perf_counter()
+        for i in range(0, args.num_images):
+            image, _ = gen_images.render_image(shapes, image_dimensions,
+                                            gen_images.image_seed(args.seed, i),
+                                            cache=cache, placement=args.placement, plan=plan,
+                                            augment_backend=args.augment_backend)
+            if args.preview:
+                gen_images.preview_image(image)
+            gen_images.save_image(output_folder, i, image)
+        elapsed = time.perf_counter() - start
+
+    mode = "preview" if args.preview else "headless"
+    print(f"{mode}, {args.placement} placement, {args.color_mode}, {args.augment_backend}: {args.num_images} images of "
+          f"{args.dimension}x{args.dimension} "
+          f"in {elapsed:.3f} s, {args.num_images / elapsed:.2f} frames/sec")
+    if cache is not None:
+        print(f"sprite cache: {len(cache)} sprites, {cache.hits} hits, {cache.misses} misses")
+
+
+"""Helper Method to get the peak resident set size of the benchmark process
+
+    Args: None
+    Returns : Peak RSS in KB
+
+"""
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and in KB on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+"""Helper Method to write one benchmark record as a JSON line
+
+    Args: out : File object of the machine readable output
+          record : Dictionary of the benchmark parameters and results
+    Returns : None
+
+"""
+def emit(out, record):
+    record["peak_rss_kb"] = peak_rss_kb()
+    out.write(json.dumps(record) + "\n")
+    out.flush()
+
+
+"""Helper Method to time a function over a number of calls
+
+    Args: function : Function without arguments
+          calls : Number of calls
+    Returns : Mean seconds per call
+
+"""
+def time_calls(function, calls):
+    start = time.perf_counter()
+    for _ in range(0, calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+"""Helper Method to time the augmentation backends on random scaling factors and angles
+
+    Args: out : Output file of the JSON records, None to print a table
+          modes : Color modes of the synthetic shape
+          sizes : Edge lengths of the normalised shape
+          calls : Number of calls per backend
+          seed : Random seed, identical for all backends
+    Returns : None
+
+"""
+def time_backends(out, modes, sizes, calls, seed):
+    if out is None:
+        print(f"{'mode':>5} {'size':>5} {'backend':>8} {'us/call':>9}")
+    for mode in modes:
+        for size in sizes:
+            base = synthetic_shapes(1, mode)[0].resize((size, size))
+            for backend, transform in gen_images.AUGMENT_BACKENDS.items():
+                rng = np.random.default_rng(seed)
+                values = iter(zip(rng.uniform(0.75, 1, calls), rng.uniform(0, 90, calls)))
+                seconds = time_calls(lambda: transform(base, *next(values)), calls)
+                if out is None:
+                    print(f"{mode:>5} {size:>5} {backend:>8} {seconds * 1e6:>9.1f}")
+                else:
+                    emit(out, {"benchmark": "augment_backend", "backend": backend, "mode": mode,
+                               "size": size, "calls": calls, "us_per_call": seconds * 1e6})
+
+
+def bench_augment(args):
+    time_backends(None, args.modes, args.size, args.calls, args.seed)
+
+
+def suite_augment(out, args):
+    base = synthetic_shapes(1)[0].resize((50, 50))
+    cache = SpriteCache(gen_images.scale_rotate_image)
+    cache.base(0, base)
+    cache.size_table(0)
+
+    for name, cache_arg in (("augment_image", None), ("augment_image_cached", cache)):
+        random.seed(args.seed)
+        seconds = time_calls(lambda: gen_images.augment_image(0, 0, base, cache_arg, 0), args.calls)
+        emit(out, {"benchmark": name, "calls": args.calls, "us_per_call": seconds * 1e6})
+
+    time_backends(out, ["L", "RGB"], [50], args.calls, args.seed)
+
+
+class _FrozenIndex:
+
+    """Helper Method : Wraps an index so that queries do not register the candidate
+
+    Args: index : OccupancyGrid
+    Returns : None
+
+    """
+    def __init__(self, index):
+        self.index = index
+        self.uses_mask = index.uses_mask
+
+    def overlaps(self, rect, mask=None):
+        return self.index.overlaps(rect, mask)
+
+    def insert(self, rect, mask=None):
+        pass
+
+
+def suite_placement(out, args):
+    #add_obj takes the number of attempts from gen_images.K, it is restored even if a run fails
+    default_k = gen_images.K
+    try:
+        for dimension in args.sizes:
+            for shape_count in args.shape_counts:
+                shapes = synthetic_shapes(shape_count)
+                for k in args.k_values:
+                    gen_images.K = k
+                    for method in ("grid", "scan"):
+                        random.seed(args.seed)
+                        canvas = np.zeros((dimension, dimension), dtype="uint8")
+                        index = OccupancyGrid(dimension, dimension) if method == "grid" else None
+                        positions = []
+
+                        start = time.perf_counter()
+                        for shape in shapes:
+                            positions = gen_images.add_obj(positions, shape, dimension, dimension, index,
+                                                           canvas=canvas)
+                        seconds = time.perf_counter() - start
+                        emit(out, {"benchmark": "add_obj", "method": method, "size": dimension,
+                                   "shapes": shape_count, "k": k,
+                                   "ms_per_shape": seconds * 1e3 / shape_count,
+                                   "acceptance_rate": len(positions) / (k * shape_count)})
+
+                        #Overlap queries against the filled canvas
+                        candidate = gen_images.scale_rotate_image(shapes[0].resize((50, 50)), 0.9, 45)
+                        height, width = candidate.shape[:2]
+                        points = [(random.randint(0, dimension - width), random.randint(0, dimension - height))
+                                  for _ in range(0, args.calls)]
+                        start = time.perf_counter()
+                        for x, y in points:
+                            #A copy of positions and no canvas keep the scene unchanged between queries
+                            gen_images.check_overlap_coordinates(candidate, list(positions), x, y,
+                                                                 None if index is None else _FrozenIndex(index))
+                        seconds = time.perf_counter() - start
+                        emit(out, {"benchmark": "check_overlap_coordinates", "method": method,
+                                   "size": dimension, "shapes": shape_count, "k": k,
+                                   "placed": len(positions), "us_per_call": seconds * 1e6 / args.calls})
+    finally:
+        gen_images.K = default_k
+
+
+"""Helper Method to time the batch placement on empty and filled canvases.
+A round should cost the same however many shapes are placed, and the batch
+engine should not be slower than the sequential one on large canvases
+
+    Args: out : File object of the JSON records
+          args : Arguments of the suite (sizes, round_size, calls, seed)
+    Returns : None
+
+"""
+def suite_rounds(out, args):
+    shapes = synthetic_shapes()
+    for dimension in args.sizes:
+        image_dimensions = (dimension, dimension)
+        cache = SpriteCache(gen_images.warp_affine_image)
+        plan = gen_images.plan_placement(shapes, image_dimensions, cache)
+
+        #Rounds of the first shape against an empty and a filled grid, the grid is not changed
+        index = BatchOccupancyGrid(dimension, dimension)
+        img = cache.base(0, shapes[0])
+        max_size = gen_images.max_augmented_size(*img.size)
+        positions = []
+        for fill in ("empty", "filled"):
+            if fill == "filled":
+                rng = np.random.default_rng(args.seed)
+                for shape_id, shape in enumerate(shapes):
+                    positions = gen_images.add_obj_batch(positions, shape, dimension, dimension, rng, cache,
+                                                         shape_id, None, plan, None, index=index)
+            rng = np.random.default_rng(args.seed)
+            seconds = time_calls(lambda: gen_images.place_round(index, img, dimension - max_size,
+                                                                dimension - max_size, rng, args.round_size,
+                                                                cache, 0), args.calls // 10 or 1)
+            emit(out, {"benchmark": "place_round", "size": dimension, "placed": len(index),
+                       "round_size": args.round_size, "us_per_round": seconds * 1e6})
+
+        for placement in ("batch", "sequential"):
+            start = time.perf_counter()
+            _, positions = gen_images.render_image(shapes, image_dimensions, args.seed, cache=cache,
+                                                   placement=placement, plan=plan,
+                                                   augment_backend="opencv")
+            emit(out, {"benchmark": "render_image", "placement": placement, "size": dimension,
+                       "objects": len(positions), "ms_per_image": (time.perf_counter() - start) * 1e3})
+
+
+def suite_main(out, args):
+    parser = gen_images.build_parser()
+    for dimension in args.sizes:
+        for fill_density in args.fill_densities:
+            with tempfile.TemporaryDirectory() as output_folder:
+                gen_args = parser.parse_args(["--input", args.input, "--output", output_folder,
+                                              "--dimensions", str(dimension), str(dimension),
+                                              "--num-images", str(args.num_images),
+                                              "--seed", str(args.seed), "--stats",
+                                              "--fill-density", str(fill_density)])
+                profiler = cProfile.Profile() if args.profile else None
+                #The progress lines of gen_images.main go to stderr, so that the
+                #standard output only holds the JSON records
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(sys.stderr):
+                    if profiler is not None:
+                        profiler.runcall(gen_images.main, gen_args)
+                    else:
+                        gen_images.main(gen_args)
+                seconds = time.perf_counter() - start
+
+                placed = attempts = 0
+                with open(output_folder + "/stats.jsonl") as f:
+                    for line in f:
+                        stats = json.loads(line)
+                        placed += stats["objects"]
+                        attempts += stats["attempts"]
+
+            emit(out, {"benchmark": "main", "size": dimension, "fill_density": fill_density,
+                       "images": args.num_images, "frames_per_sec": args.num_images / seconds,
+                       "objects_per_image": placed / args.num_images,
+                       "acceptance_rate": placed / max(attempts, 1)})
+
+            if profiler is not None:
+                profile_path = f"{args.profile}.{dimension}.{fill_density}"
+                profiler.dump_stats(profile_path)
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+
+
+def bench_suite(args):
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        suite_augment(out, args)
+        suite_placement(out, args)
+        suite_rounds(out, args)
+        suite_main(out, args)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+"""Helper Method to measure the import of a module with python -X importtime
+
+    Args: module : Name of the module to import
+    Returns : (wall seconds of the process, list of (cumulative us, depth, module name))
+
+"""
+def import_times(module):
+    command = [sys.executable, "-X", "importtime", "-c", "import " + module]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(cumulative), depth, name.strip()))
+    return seconds, entries
+
+
+def bench_startup(args):
+    runs = [import_times("gen_images") for _ in range(0, args.repeat)]
+    seconds, entries = min(runs, key=lambda run: run[0])
+
+    total_us = next(cumulative for cumulative, depth, name in entries if name == "gen_images")
+    top_level = sorted((entry for entry in entries if entry[1] == 1), reverse=True)[: args.top]
+
+    if args.json:
+        print(json.dumps({"benchmark": "startup", "import_ms": total_us / 1e3,
+                          "process_ms": seconds * 1e3,
+                          "top_imports": [{"module": name, "ms": cumulative / 1e3}
+                                          for cumulative, depth, name in top_level]}))
+    else:
+        print(f"import gen_images: {total_us / 1e3:.1f} ms, python process: {seconds * 1e3:.1f} ms")
+        for cumulative, depth, name in top_level:
+            print(f"{cumulative / 1e3:>10.1f} ms  {name}")
+
+    if args.max_ms is not None and total_us / 1e3 > args.max_ms:
+        print(f"import time exceeds {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of gen_images.py.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    overlap_parser = subparsers.add_parser("overlap",
+        help="Time per image of the overlap detection methods across canvas sizes."
+    )
+
+    overlap_parser.add_argument("--sizes", nargs="+", type=int, default=[1024, 2048, 4096],
+        help="Canvas edge lengths to benchmark."
+    )
+
+    overlap_parser.add_argument("--methods", nargs="+", choices=["grid", "scan"], default=["grid", "scan"],
+        help="Overlap detection methods to benchmark."
+    )
+
+    overlap_parser.add_argument("--repeat", type=int, default=3,
+        help="Number of timed images per size and method, the fastest is reported."
+    )
+
+    overlap_parser.add_argument("--seed", type=int, default=0,
+        help="Base random seed."
+    )
+
+    overlap_parser.set_defaults(run=bench_overlap)
+
+    frames_parser = subparsers.add_parser("frames",
+        help="Frames per second of the generation loop."
+    )
+
+    frames_parser.add_argument("--dimension", type=int, default=1024,
+        help="Canvas edge length."
+    )
+
+    frames_parser.add_argument("--num-images", type=int, default=20,
+        help="Number of images to generate."
+    )
+
+    frames_parser.add_argument("--preview", action="store_true",
+        help="Include the GUI preview of every image (needs a display)."
+    )
+
+    frames_parser.add_argument("--placement", choices=["batch", "sequential"], default="batch",
+        help="Placement engine of gen_images.py."
+    )
+
+    frames_parser.add_argument("--color-mode", choices=["L", "RGB", "RGBA"], default="L",
+        help="Color mode of the synthetic shapes and the output images."
+    )
+
+    frames_parser.add_argument("--augment-backend", choices=["pil", "opencv"], default="opencv",
+        help="Augmentation backend of gen_images.py."
+    )
+
+    frames_parser.add_argument("--sprite-cache-mb", type=int, default=64,
+        help="Memory bound of the sprite cache in MB. 0 disables the cache."
+    )
+
+    frames_parser.add_argument("--seed", type=int, default=0,
+        help="Base random seed."
+    )
+
+    frames_parser.set_defaults(run=bench_frames)
+
+    suite_parser = subparsers.add_parser("suite",
+        help="Regression suite with machine readable JSON lines output."
+    )
+
+    suite_parser.add_argument("--sizes", nargs="+", type=int, default=[1024, 2048],
+        help="Canvas edge lengths."
+    )
+
+    suite_parser.add_argument("--shape-counts", nargs="+", type=int, default=[4, 8],
+        help="Numbers of synthetic shapes for the placement benchmarks."
+    )
+
+    suite_parser.add_argument("--k-values", nargs="+", type=int, default=[90, 361],
+        help="Numbers of placement attempts per shape of the add_obj benchmark (no placement plan)."
+    )
+
+    suite_parser.add_argument("--fill-densities", nargs="+", type=float, default=[0.2, 0.4],
+        help="Target fill densities of the end-to-end benchmark."
+    )
+
+    suite_parser.add_argument("--round-size", type=int, default=64,
+        help="Number of placement attempts of the timed batch rounds."
+    )
+
+    suite_parser.add_argument("--calls", type=int, default=1000,
+        help="Number of calls of the micro benchmarks."
+    )
+
+    suite_parser.add_argument("--input", default="input_images",
+        help="Input images folder of the end-to-end benchmark."
+    )
+
+    suite_parser.add_argument("--num-images", type=int, default=5,
+        help="Number of images of the end-to-end benchmark."
+    )
+
+    suite_parser.add_argument("--output", default=None,
+        help="File of the JSON lines output. Default: standard output, other output goes to standard error."
+    )
+
+    suite_parser.add_argument("--profile", default=None,
+        help="Run the end-to-end benchmark under cProfile and write the stats to PROFILE.<size>.<fill density>."
+    )
+
+    suite_parser.add_argument("--seed", type=int, default=0,
+        help="Base random seed."
+    )
+
+    suite_parser.set_defaults(run=bench_suite)
+
+    augment_parser = subparsers.add_parser("augment",
+        help="Time per call of the PIL and OpenCV augmentation backends."
+    )
+
+    augment_parser.add_argument("--modes", nargs="+", choices=["L", "RGB", "RGBA"], default=["L", "RGB", "RGBA"],
+        help="Color modes of the synthetic shape."
+    )
+
+    augment_parser.add_argument("--size", nargs="+", type=int, default=[50, 200],
+        help="Edge lengths of the normalised shape, 50 is the size used by gen_images.py."
+    )
+
+    augment_parser.add_argument("--calls", type=int, default=2000,
+        help="Number of calls per backend."
+    )
+
+    augment_parser.add_argument("--seed", type=int, default=0,
+        help="Random seed."
+    )
+
+    augment_parser.set_defaults(run=bench_augment)
+
+    startup_parser = subparsers.add_parser("startup",
+        help="Import time of gen_images.py."
+    )
+
+    startup_parser.add_argument("--repeat", type=int, default=5,
+        help="Number of measured interpreter starts, the fastest is reported."
+    )
+
+    startup_parser.add_argument("--top", type=int, default=10,
+        help="Number of slowest top level imports to report."
+    )
+
+    startup_parser.add_argument("--max-ms", type=float, default=None,
+        help="Exit with an error when importing gen_images takes longer."
+    )
+
+    startup_parser.add_argument("--json", action="store_true",
+        help="Print the result as a JSON record."
+    )
+
+    startup_parser.set_defaults(run=bench_startup)
+
+    args = parser.parse_args()
+    args.run(args)
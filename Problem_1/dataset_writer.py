@@ -0,0 +1,386 @@
+"""This is the dataset_writer script of Problem 1
+
+Provides the output backends of gen_images.py:
+i) png : One PNG file per output image in the output folder (Output_Image_i.png)
+ii) tar : PNG images streamed into tar shards of shard_size images each
+iii) npy : Raw images written into memory-mapped .npy shards of shard_size images each
+
+The sharded backends write a shard index (shards.json) to the output folder.
+The annotations of the placed shapes are appended to annotations.jsonl, one
+line per output image, and with --stats the placement statistics of every
+image to stats.jsonl.
+Images are encoded by encode_image, which is separate from the writers so
+that the encoding can run in the pool workers. A writer never keeps more
+than the shard that it is currently writing open.
+"""
+import io
+import json
+import os
+
+import cv2 as cv
+import numpy as np
+
+
+"""Helper Method to get an output image in the channel order of OpenCV
+
+    Args: image : Grayscale, RGB or RGBA NumPy array
+    Returns : The image itself for grayscale, a BGR or BGRA copy otherwise
+
+"""
+def opencv_image(image):
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv.cvtColor(image, cv.COLOR_RGBA2BGRA)
+    return cv.cvtColor(image, cv.COLOR_RGB2BGR)
+
+
+"""Helper Method to encode an output image for the given output format
+
+    Args: image : Background image with the shapes added to it (grayscale, RGB or RGBA)
+          output_format : "png", "tar" or "npy"
+          compression : PNG compression level between 0 and 9
+    Returns : PNG bytes for png and tar, the image itself for npy (channels in RGB order)
+
+"""
+def encode_image(image, output_format, compression=1):
+    if output_format == "npy":
+        return image
+
+    ok, encoded = cv.imencode(".png", opencv_image(image), [cv.IMWRITE_PNG_COMPRESSION, compression])
+    if not ok:
+        raise cv.error("encode_image : PNG encoding failed")
+    return encoded.tobytes()
+
+
+"""Helper Method to get the file name of an output image
+
+    Args: image_index : Index of the output image
+    Returns : File name
+
+"""
+def image_name(image_index):
+    return "Output_Image_" + str(image_index) + ".png"
+
+
+class PngFolderWriter:
+
+    """Helper Method : Initialisation of the PNG folder writer
+
+    Args: output_folder : Path to the output images folder
+    Returns : None
+
+    """
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+
+    """Helper Method : Writes one encoded output image
+
+    Args: image_index : Index of the output image
+          payload : PNG bytes from encode_image
+    Returns : None
+
+    """
+    def write(self, image_index, payload):
+        with open(os.path.join(self.output_folder, image_name(image_index)), "wb") as f:
+            f.write(payload)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardWriter:
+
+    """Helper Method : Initialisation of the shard bookkeeping shared by the sharded writers
+
+    Args: output_folder : Path to the output images folder
+          shard_size : Number of images per shard
+          output_format : Format name written to the shard index
+    Returns : None
+
+    """
+    def __init__(self, output_folder, shard_size, output_format):
+        if shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        self.index = {"format": output_format, "shard_size": shard_size, "shards": []}
+        self.count = 0
+
+    """Helper Method : Starts a new shard when the current one is full
+
+    Args: image_index : Index of the output image that is written next
+    Returns : Entry of the current shard in the shard index
+
+    """
+    def _shard_for(self, image_index):
+        if self.count % self.shard_size == 0:
+            self._close_shard()
+            file_name = "shard-%05d.%s" % (len(self.index["shards"]), self.index["format"])
+            shard = {"file": file_name, "images": []}
+            self.index["shards"].append(shard)
+            self._open_shard(os.path.join(self.output_folder, file_name))
+        self.count += 1
+        shard = self.index["shards"][-1]
+        shard["images"].append(image_index)
+        return shard
+
+    """Helper Method : Closes the last shard and writes the shard index
+
+    Args: None
+    Returns : None
+
+    """
+    def close(self):
+        self._close_shard()
+        with open(os.path.join(self.output_folder, "shards.json"), "w") as f:
+            json.dump(self.index, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TarShardWriter(ShardWriter):
+
+    def __init__(self, output_folder, shard_size):
+        ShardWriter.__init__(self, output_folder, shard_size, "tar")
+        self.tar = None
+
+    def _open_shard(self, path):
+        #tarfile is only imported when tar shards are written
+        import tarfile
+        self.tar = tarfile.open(path, "w")
+
+    def _close_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+    """Helper Method : Streams one encoded output image into the current tar shard
+
+    Args: image_index : Index of the output image
+          payload : PNG bytes from encode_image
+    Returns : None
+
+    """
+    def write(self, image_index, payload):
+        import tarfile
+        self._shard_for(image_index)
+        info = tarfile.TarInfo(image_name(image_index))
+        info.size = len(payload)
+        self.tar.addfile(info, io.BytesIO(payload))
+
+
+class NpyShardWriter(ShardWriter):
+
+    """Helper Method : Initialisation of the .npy shard writer
+
+    Args: output_folder : Path to the output images folder
+          shard_size : Number of images per shard
+          num_images : Total number of images, the last shard only gets the remaining images
+    Returns : None
+
+    """
+    def __init__(self, output_folder, shard_size, num_images):
+        ShardWriter.__init__(self, output_folder, shard_size, "npy")
+        self.num_images = num_images
+        self.path = None
+        self.shard = None
+
+    def _open_shard(self, path):
+        self.path = path
+        self.shard = None
+
+    def _close_shard(self):
+        if self.shard is not None:
+            self.shard.flush()
+            self.shard = None
+
+    """Helper Method : Copies one output image into the memory-mapped shard
+
+    Args: image_index : Index of the output image
+          payload : Image from encode_image
+    Returns : None
+
+    """
+    def write(self, image_index, payload):
+        shard = self._shard_for(image_index)
+        position = len(shard["images"]) - 1
+
+        #The shard is allocated on the first image, when its shape is known
+        if self.shard is None:
+            length = min(self.shard_size, self.num_images - self.count + 1)
+            self.shard = np.lib.format.open_memmap(self.path, mode="w+", dtype=payload.dtype,
+                                                   shape=(length,) + payload.shape)
+            self.index["dtype"] = str(payload.dtype)
+            self.index["image_shape"] = list(payload.shape)
+        self.shard[position] = payload
+
+
+class JsonlAnnotationWriter:
+
+    """Helper Method : Initialisation of the annotation writer, opens annotations.jsonl
+
+    Args: output_folder : Path to the output images folder
+          image_dimensions : Output image dimensions (width height)
+          append : Append to the annotations of a resumed run
+    Returns : None
+
+    """
+    def __init__(self, output_folder, image_dimensions, append=False):
+        self.image_dimensions = image_dimensions
+        self.file = open(os.path.join(output_folder, "annotations.jsonl"), "a" if append else "w")
+
+    """Helper Method : Appends the annotations of one output image as a single JSON line
+
+    Args: image_index : Index of the output image
+          objects : list of dictionaries with class, bbox and angle
+    Returns : None
+
+    """
+    def write(self, image_index, objects):
+        record = {"image_id": image_index, "file_name": image_name(image_index),
+                  "width": self.image_dimensions[0], "height": self.image_dimensions[1],
+                  "objects": objects}
+        self.file.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlStatsWriter:
+
+    """Helper Method : Initialisation of the statistics writer, opens stats.jsonl
+
+    Args: output_folder : Path to the output images folder
+          append : Append to the statistics of a resumed run
+    Returns : None
+
+    """
+    def __init__(self, output_folder, append=False):
+        self.file = open(os.path.join(output_folder, "stats.jsonl"), "a" if append else "w")
+        self.images = 0
+        self.objects = 0
+        self.attempts = 0
+        self.fill_density = 0.0
+        self.seconds = 0.0
+
+    """Helper Method : Appends the statistics of one output image as a single JSON line
+
+    Args: image_index : Index of the output image
+          stats : Dictionary from ShapeSceneGenerator.render
+    Returns : None
+
+    """
+    def write(self, image_index, stats):
+        self.file.write(json.dumps(dict(image_id=image_index, **stats)) + "\n")
+        self.images += 1
+        self.objects += stats["objects"]
+        self.attempts += stats["attempts"]
+        self.fill_density += stats["fill_density"]
+        self.seconds += stats.get("seconds", 0.0)
+
+    def flush(self):
+        self.file.flush()
+
+    """Helper Method : Summary of all the images written so far
+
+    Args: None
+    Returns : Summary line
+
+    """
+    def summary(self):
+        images = max(self.images, 1)
+        return (f"{self.images} images, {self.objects / images:.1f} objects per image, "
+                f"acceptance rate {self.objects / max(self.attempts, 1):.3f}, "
+                f"fill density {self.fill_density / images:.3f}, "
+                f"{self.seconds * 1e3 / images:.1f} ms render time per image")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullAnnotationWriter:
+
+    def write(self, image_index, objects):
+        pass
+
+    def flush(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+"""Helper Method to create the writer of an output format
+
+    Args: output_format : "png", "tar" or "npy"
+          output_folder : Path to the output images folder
+          shard_size : Number of images per shard of tar and npy
+          num_images : Total number of images
+    Returns : Writer instance
+
+"""
+def open_writer(output_format, output_folder, shard_size, num_images):
+    if output_format == "tar":
+        return TarShardWriter(output_folder, shard_size)
+    if output_format == "npy":
+        return NpyShardWriter(output_folder, shard_size, num_images)
+    return PngFolderWriter(output_folder)
+
+
+"""Helper Method to create the annotation writer
+
+    Args: annotations : "jsonl" or "none"
+          output_folder : Path to the output images folder
+          image_dimensions : Output image dimensions (width height)
+          append : Append to the annotations of a resumed run
+    Returns : Writer instance
+
+"""
+def open_annotation_writer(annotations, output_folder, image_dimensions, append=False):
+    if annotations == "jsonl":
+        return JsonlAnnotationWriter(output_folder, image_dimensions, append)
+    return NullAnnotationWriter()
+
+
+"""Helper Method to create the statistics writer
+
+    Args: enabled : True to write stats.jsonl
+          output_folder : Path to the output images folder
+          append : Append to the statistics of a resumed run
+    Returns : Writer instance
+
+"""
+def open_stats_writer(enabled, output_folder, append=False):
+    if enabled:
+        return JsonlStatsWriter(output_folder, append)
+    return NullAnnotationWriter()
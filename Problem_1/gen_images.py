@@ -12,17 +12,68 @@ vi) Each shape is randomly scaled between 0.75 and 1.
 viii) Image shape is rotated randomly between 0 and 90 degrees.
 ix) Support required command line arguments is added (see below) for the program. Error checking is added as well.
 x) Boundary conditions are added to avoid overlapping of images
+xi) Overlap queries are answered by a uniform grid index (see occupancy_index.py),
+the old linear scan can still be selected with --overlap-index scan
+xii) Images can be generated in parallel with --workers N. Every image gets a seed
+derived from --seed, so the output is identical for any number of workers
+xiii) Images are generated headless by default, no GUI backend is used unless
+--preview is given
+xiv) Scaled and rotated shapes are taken from a cache of pre-augmented sprites
+(see sprite_cache.py) keyed by quantized scale and angle, --sprite-cache-mb 0
+augments every placement attempt exactly
+xv) By default all placement attempts of a shape are drawn and tested for overlap
+at once with NumPy, and only the accepted shapes are augmented and drawn
+(--placement batch). The candidates are tested in the cells of a grid index
+(BatchOccupancyGrid), so a round costs the same on a large canvas as on a small
+one. --placement sequential tests one attempt at a time
+xvi) Output images can be streamed into tar or memory-mapped .npy shards with a
+shard index instead of one PNG file per image (see dataset_writer.py)
+xvii) Class, bounding box and rotation angle of every placed shape are written to
+annotations.jsonl in the same pass, one line per output image
+xviii) All images of --input are used as shapes. They are cropped to their content
+automatically and cached on disk by file hash (see shape_assets.py)
+xix) Only the pixels of a rotated shape are written to the background image. With
+--overlap-index mask, shapes may share free bounding box area as long as their
+pixels do not overlap, tested on a packed occupancy bitmap
+xx) ShapeSceneGenerator is an importable, reentrant API that yields (image, annotations)
+frames without module level state and can render into a preallocated buffer
+xxi) Only NumPy, PIL and OpenCV are imported at load time, everything else is
+imported on first use (see benchmark.py startup)
+xxii) The number of shapes per image is planned from the real canvas and sprite
+sizes instead of a fixed K (see placement_plan.py). The canvas is filled up to its
+estimated capacity, or to --target-count objects or --fill-density. A shape stops
+early when the acceptance rate of its placement attempts collapses, and per-image
+statistics are written to stats.jsonl with --stats
+xxiii) Output images can be grayscale, RGB or RGBA (--color-mode). Sprites are kept
+as NumPy arrays of the output color mode from the sprite cache to the background
+image, and are drawn in place without a per-shape copy
+xxiv) Scaling and rotation are done in degrees with exact output bounds, so rotated
+shapes are never cut. --augment-backend opencv (default) applies both with one
+cv.warpAffine call, --augment-backend pil resizes and rotates with PIL
+xxv) Completed images are recorded in manifest.jsonl with their seed, parameter
+fingerprint and checksum (see manifest.py). --resume continues a killed run and
+only generates the images that are missing or were made with other parameters
 """
+#Only the modules of the generation path are imported at load time.
+#multiprocessing and argparse are imported on first use
 import cv2 as cv
+import hashlib
 import numpy as np
-from scipy import signal
-import matplotlib.pyplot as plt
-import sys
 import os
 import random
-import argparse
-import io
+import time
 from PIL import Image
+from occupancy_index import BatchOccupancyGrid, OccupancyGrid, PixelOccupancy
+from placement_plan import PlacementPlan, frame_stats
+from sprite_cache import SpriteCache
+from dataset_writer import encode_image, image_name, opencv_image, open_writer, open_annotation_writer, \
+    open_stats_writer
+from manifest import MANIFEST_FILE, ManifestWriter, compact_records, completed_images, fingerprint, read_records
+from shape_assets import COLOR_MODES, load_shapes
+
+
+#Number of placement attempts per shape when no placement plan is given, see add_obj
+K = 19*19
 
 
 """Helper Method to detect the overlap of the co-ordinates
@@ -41,35 +92,79 @@ def do_rectangles_overlap(rect1, rect2):
     return True
 
 
+"""Helper Method to add an augmented image to the background image.
+Only the pixels of the rotated shape are written, the black corners left by
+the rotation keep the background that is already there. Placed shapes never
+share a pixel, so the background is still black under the pixels of the new
+shape and np.maximum writes exactly those pixels, in place and without a mask
+
+    Args: canvas : Background image (uint8 NumPy array), written in place.
+                   If it is None, nothing is drawn
+          sprite : Augmented sprite (NumPy array) with the channels of canvas
+          x : x co-ordinate on the background image
+          y : y co-ordinate on the background image
+    Returns : None
+
+"""
+def composite_image(canvas, sprite, x, y):
+    if canvas is None:
+        return
+    augmented_h, augmented_w = sprite.shape[:2]
+    if y + augmented_h <= canvas.shape[0] and x + augmented_w <= canvas.shape[1]:
+        region = canvas[y : y + augmented_h, x : x + augmented_w]
+        np.maximum(region, sprite, out=region)
+
+
+"""Helper Method to get the pixels of the shape of a sprite
+
+    Args: sprite : Augmented sprite (NumPy array)
+    Returns : 2D bool NumPy array, True for the pixels of the shape
+
+"""
+def sprite_mask(sprite):
+    if sprite.ndim == 3:
+        return sprite.any(axis=2)
+    return sprite > 0
+
+
 """Helper Method to detect the overlap of the images and update the image list with co-odinates of the non-overlapping images
 
-    Args: augmented_image : Cropped, rotated and scaled image
-          positions : list of non-overlapping PIL images
+    Args: augmented_image : Cropped, rotated and scaled sprite (NumPy array)
+          positions : list of non-overlapping sprites
           x : Random x co-ordinate
           y : Random y co-ordinate
+          index : Optional OccupancyGrid holding the rectangles of positions.
+                  If it is None, the candidate is checked against every entry
+                  of positions (linear scan)
+          shape_id : Class of the shape, stored with the position for the annotations
+          angle : Rotation angle of the augmented image, stored with the position
+          canvas : Background image the shape is drawn into
           
-    Returns : Updated list of x, y, PIL images
+    Returns : Updated list of x, y, sprites, shape_id, angle
         
 """ 
-def check_overlap_coordinates(augmented_image, positions, x, y):
+def check_overlap_coordinates(augmented_image, positions, x, y, index=None, shape_id=None, angle=None,
+                              canvas=None):
     overlap_status = False
+    aug_h, aug_w = augmented_image.shape[:2]
+    new_rect = (x, y, x + aug_w, y + aug_h)
 
-    #This condition becomes true when the first image comes from this function
-    #Extracts co-ordinate values and appends co-ordinates and PIL image to the list
-    if len(positions) == 0:
-        augmented_image_gray = augmented_image.convert("L")
-        augmented_w, augmented_h = augmented_image_gray.size
-        position = (x, y, augmented_image_gray)
-        positions.append(position)
+    #Shape pixels are never black (see shape_pixels), so the pixels
+    #of the rotated shape are the non-zero pixels of the augmented image
+    mask = None
+    if index is not None and index.uses_mask:
+        mask = sprite_mask(augmented_image)
 
-    if len(positions) > 0:
-        for px, py, gray_image in positions:
-            gray_image_array = np.array(gray_image)
-            gray_w, gray_h = gray_image.size
-            aug_w, aug_h = augmented_image.size
+    if index is not None:
+        #Only the rectangles registered in the grid cells covered by
+        #the candidate are tested, or only the pixels of the mask
+        overlap_status = index.overlaps(new_rect, mask)
+
+    elif len(positions) > 0:
+        for px, py, sprite, *_ in positions:
+            gray_h, gray_w = sprite.shape[:2]
 
             existing_rect = (px, py, px + gray_w, py + gray_h)
-            new_rect = (x, y, x + aug_w, y + aug_h)
 
             #Overlapping is detected by passing the image to this function
             if do_rectangles_overlap(new_rect, existing_rect):
@@ -78,79 +173,195 @@ def check_overlap_coordinates(augmented_image, positions, x, y):
 
     if not overlap_status:
         try:
-            augmented_image_gray = augmented_image.convert("L")
-            positions.append((x, y, augmented_image_gray))
-            augmented_image_array = np.array(augmented_image_gray)
-
-            augmented_w, augmented_h = augmented_image_gray.size
+            positions.append((x, y, augmented_image, shape_id, angle))
+            if index is not None:
+                index.insert(new_rect, mask)
 
             #If images are not overlapped with each other then the foreground image is added
             #to the background image
-            if y + augmented_h <= bg.shape[0] and x + augmented_w <= bg.shape[1]:
-                bg[y : y + augmented_h, x : x + augmented_w] = np.array(
-                    augmented_image_array
-                )
+            composite_image(canvas, augmented_image, x, y)
         except Exception as err:
             print(f"Unexpected {err=}, {type(err)=}")
             raise
 
     return positions
 
+"""Helper Method to compute the exact bounds of scaled and rotated images.
+Works on scalars and on NumPy arrays of scaling factors and angles
+
+    Args: width : Width of the normalised image
+          height : Height of the normalised image
+          scaling_factors : Scaling factors (scalar or NumPy array)
+          angles : Rotation angles in degrees (scalar or NumPy array)
+    Returns : (width, height) of the augmented images, as int or int arrays
+
+"""
+def augmented_sizes(width, height, scaling_factors, angles):
+    radians = np.deg2rad(angles)
+    cos = np.abs(np.cos(radians))
+    sin = np.abs(np.sin(radians))
+    scaled_width = scaling_factors * width
+    scaled_height = scaling_factors * height
+
+    #The rotated rectangle fits exactly, the small tolerance keeps rounding
+    #errors of sin and cos from adding a pixel
+    widths = np.maximum(np.ceil(scaled_width * cos + scaled_height * sin - 1e-6), 1).astype(int)
+    heights = np.maximum(np.ceil(scaled_width * sin + scaled_height * cos - 1e-6), 1).astype(int)
+    return widths, heights
+
+
+"""Helper Method to get the largest size an augmented image of a shape can have
+
+    Args: width : Width of the normalised image
+          height : Height of the normalised image
+    Returns : Edge length that no augmented image exceeds, for any angle and scaling factor up to 1
+
+"""
+def max_augmented_size(width, height):
+    return int(np.ceil(np.hypot(width, height) - 1e-6))
+
+
+"""Helper Method to make the pixels of a shape non-zero and everything else zero.
+Black is kept for the background and the rotation corners, so the non-zero
+pixels of an augmented image are exactly the pixels of the shape
+
+    Args: array : NumPy array of a PIL image
+          mode : Color mode of the image
+    Returns : NumPy array
+
+"""
+def shape_pixels(array, mode):
+    if mode == "RGBA":
+        #Transparent pixels are not part of the shape
+        return array * (array[..., 3:] > 0)
+    #Black shape pixels are lifted to 1
+    return np.maximum(array, 1)
+
+
+"""Helper Method to scale and rotate the image by the given values (PIL backend).
+The image is resized, centred on a black image of the exact output size and
+rotated, two resampling passes
+
+    Args: img : PIL image of mode L, RGB or RGBA
+          scaling_factor : Scaling factor between 0.75 and 1
+          random_angle : Rotation angle between 0 and 90 degrees
+          
+    Returns : Augmented sprite, read-only NumPy array with the channels of img
+        
+"""
+
+def scale_rotate_image(img, scaling_factor, random_angle):
+    original_image_width, original_image_height = img.size
+    width, height = augmented_sizes(original_image_width, original_image_height, scaling_factor, random_angle)
+
+    # Scale the x co-ordinate and y co-ordinate by the scaling factor
+    # x<=0 or y<=0 corner case is handled below
+    # if the value of the scaled x-co-ordinate or y-cordinate becomes less
+    # than or equal to 0 the coordinate is updated with 1
+    scaled_width = max(int(scaling_factor * original_image_width), 1)
+    scaled_height = max(int(scaling_factor * original_image_height), 1)
+    scaled = shape_pixels(np.asarray(img.resize((scaled_width, scaled_height))), img.mode)
+
+    #The rotation keeps the size of the image, so the scaled image is
+    #centred on an image of the rotated bounds first
+    padded = np.zeros((height, width) + scaled.shape[2:], dtype=np.uint8)
+    left = (width - scaled_width) // 2
+    top = (height - scaled_height) // 2
+    padded[top : top + scaled_height, left : left + scaled_width] = scaled
+
+    # Rotate the scaled image
+    return np.asarray(Image.fromarray(padded).rotate(random_angle))
+
+
+"""Helper Method to scale and rotate the image by the given values (OpenCV backend).
+Scaling and rotation are folded into one affine matrix and applied with a
+single cv.warpAffine call into a destination of the exact output size
+
+    Args: img : PIL image of mode L, RGB or RGBA
+          scaling_factor : Scaling factor between 0.75 and 1
+          random_angle : Rotation angle between 0 and 90 degrees
+    Returns : Augmented sprite, NumPy array with the channels of img
+
+"""
+def warp_affine_image(img, scaling_factor, random_angle):
+    original_image_width, original_image_height = img.size
+    width, height = augmented_sizes(original_image_width, original_image_height, scaling_factor, random_angle)
+    source = shape_pixels(np.asarray(img), img.mode)
+
+    #Rotation about the centre of the shape, which is then moved to the
+    #centre of the output. Pixel centres are at integer co-ordinates
+    matrix = cv.getRotationMatrix2D(((original_image_width - 1) / 2, (original_image_height - 1) / 2),
+                                    float(random_angle), float(scaling_factor))
+    matrix[0, 2] += (width - original_image_width) / 2
+    matrix[1, 2] += (height - original_image_height) / 2
+
+    sprite = np.empty((int(height), int(width)) + source.shape[2:], dtype=np.uint8)
+    cv.warpAffine(source, matrix, (int(width), int(height)), dst=sprite, flags=cv.INTER_LINEAR,
+                  borderMode=cv.BORDER_CONSTANT, borderValue=0)
+
+    #Interpolated edge pixels that became fully transparent are not part of the shape
+    if img.mode == "RGBA":
+        np.multiply(sprite, sprite[..., 3:] > 0, out=sprite, casting="unsafe")
+    return sprite
+
+
+# Augmentation backends selectable with --augment-backend
+AUGMENT_BACKENDS = {"pil": scale_rotate_image, "opencv": warp_affine_image}
+
+
 """Helper Method to define random scaling and random rotation of the image
 
     Args: img : PIL image
           x : Random x co-ordinate
           y : Random y co-ordinate
+          cache : Optional SpriteCache, the augmented image is then taken
+                  from the cache of the quantized scale and angle
+          shape_id : Key of the shape in the cache
+          rand : Source of random numbers, the random module or a random.Random instance
+          transform : Augmentation backend without a cache, a function of AUGMENT_BACKENDS
           
-    Returns : Augmented PIL image
+    Returns : Augmented sprite (NumPy array), rotation angle of the augmented image
         
 """
 
-def augment_image(x, y, img):
+def augment_image(x, y, img, cache=None, shape_id=None, rand=random, transform=scale_rotate_image):
     try:
         # Randomly choose a scaling factor between 0.75 and 1
-        scaling_factor = random.uniform(0.75, 1)
-
-        original_image_width, original_image_height = img.size
+        scaling_factor = rand.uniform(0.75, 1)
 
-        # Scale the x co-ordinate and y co-ordinate by the scaling factor
-        scaled_width = int(scaling_factor * original_image_width)
-        scaled_height = int(scaling_factor * original_image_height)
-        
         # Randomly choose a rotation angle between 0 and 90 degrees
-        random_angle = random.uniform(0, 90)
-        
-        # x<=0 or y<=0 corner case is handled below
-        # if the value of the scaled x-co-ordinate or y-cordinate becomes less
-        # than or equal to 0 the coordinate is updated with 1 
-        # Also the x update and y update is done as per rotation by
-        # by mutliplying x with cos(random_angle) and y with sin(random_angle) 
-        scaled_width = max(int (scaled_width * np.cos(random_angle)), 1)
-        scaled_height = max(int (scaled_height * np.sin(random_angle)), 1)
-        
-        # Resize the image with the scaled dimensions
-        scaled_img = img.resize((original_image_width - scaled_width , original_image_height - scaled_height))
-        
-        # Rotate the scaled image
-        rotated_img = scaled_img.rotate(random_angle)
-        return rotated_img
+        random_angle = rand.uniform(0, 90)
+
+        if cache is not None:
+            return (cache.augment(shape_id, scaling_factor, random_angle),
+                    cache.angle_value(random_angle))
+        return transform(img, scaling_factor, random_angle), random_angle
     
     except OSError:
         print("augment_image: Error in augmentation")
 
 """Helper Method to define the logic of addition of foreground image on background image without overlapping with each other
 
-    Args: positions : list of non-overlapping PIL images
+    Args: positions : list of non-overlapping sprites
           img : PIL image
           pixel_x : Co-ordinate specified by user
           pixel_y : Co-ordinate specified by user
-          bg : Background Image
-    Returns : Augmented PIL image
+          index : Optional OccupancyGrid used for the overlap queries
+          cache : Optional SpriteCache of pre-augmented images
+          shape_id : Key of the shape in the cache
+          canvas : Background image the shape is drawn into
+          rand : Source of random numbers, the random module or a random.Random instance
+          plan : Optional PlacementPlan with the target and attempt budget of the shape.
+                 Without a plan, K placement attempts are made
+          stats : Optional dictionary, filled with target, attempts, placed and stop
+          transform : Augmentation backend without a cache, a function of AUGMENT_BACKENDS
+    Returns : Updated list of x, y, sprites, shape_id, angle
         
 """
 
 # Defines logic of addition of foreground image on background image without any foreground images overlapping with each other
-def add_obj(positions, img, pixel_x, pixel_y):
+def add_obj(positions, img, pixel_x, pixel_y, index=None, cache=None, shape_id=None, canvas=None, rand=random,
+            plan=None, stats=None, transform=scale_rotate_image):
     """
     K is computed based on the below calculation.
     Background image is of 1024*1024 pixels.
@@ -163,30 +374,570 @@ def add_obj(positions, img, pixel_x, pixel_y):
     background image.
 
     Since, there are 4 shapes that are present of size 50 * 50,
-    value of K would be 19 * 19 / 4 = 90."""
-    K = 19*19
-    
-    shape_width, shape_height = img.size
+    value of K would be 19 * 19 / 4 = 90.
 
-    #x>=0 and y>=0 corner case is handled
-    max_x = pixel_x - shape_width
-    max_y = pixel_y - shape_height
+    K is only used without a placement plan. A PlacementPlan computes the
+    number of objects from the real canvas and sprite sizes instead."""
 
     #The incoming messages are normalised
     #by the size 50*50 for the convenience
     #of computation
-    img = img.resize((50, 50))
+    if cache is not None:
+        img = cache.base(shape_id, img)
+    else:
+        img = img.resize((50, 50))
+
+    #x>=0 and y>=0 corner case is handled. Augmented images are never larger
+    #than the diagonal of the normalised image, so shapes of any input size
+    #fit on the canvas without getting cut
+    max_size = max_augmented_size(*img.size)
+    max_x = pixel_x - max_size
+    max_y = pixel_y - max_size
+
+    target, max_attempts = (None, K) if plan is None else plan.budget(shape_id)
+    attempts = placed = 0
+    stop = "attempts"
+
+    #Attempts are made in rounds, a round that accepts (almost) nothing
+    #means that there is no free space left for this shape
+    while attempts < max_attempts and (target is None or placed < target):
+        round_size = max_attempts if plan is None else plan.round_size(target - placed, max_attempts - attempts)
+        round_start = placed
+        for i in range(0, round_size):
+            #print(i, "th iteration")
+            x = rand.randint(0, max_x)
+            y = rand.randint(0, max_y)
+
+            augmented_image, angle = augment_image(x, y, img, cache, shape_id, rand, transform)
+            count = len(positions)
+            positions = check_overlap_coordinates(augmented_image, positions, x, y, index, shape_id, angle,
+                                                  canvas)
+            attempts += 1
+            placed += len(positions) - count
+            if target is not None and placed >= target:
+                break
+
+        if plan is not None and plan.collapsed(placed - round_start, round_size):
+            stop = "acceptance"
+            break
+
+    if target is not None and placed >= target:
+        stop = "target"
+    if stats is not None:
+        stats.update(target=target, attempts=attempts, placed=placed, stop=stop)
+    return positions
+
+
+"""Helper Method to test one round of placement attempts of a shape at once
+
+    Args: index : BatchOccupancyGrid of the shapes placed before
+          img : Normalised PIL image of the shape
+          max_x : Largest x co-ordinate of a candidate
+          max_y : Largest y co-ordinate of a candidate
+          rng : NumPy random generator of the image
+          count : Number of candidates
+          cache : Optional SpriteCache of pre-augmented images
+          shape_id : Key of the shape in the cache
+    Returns : list of (candidate number, x, y, scaling factor, angle, width, height)
+              of the accepted candidates, in the order of the candidates
+
+"""
+def place_round(index, img, max_x, max_y, rng, count, cache=None, shape_id=None):
+    xs = rng.integers(0, max_x + 1, count)
+    ys = rng.integers(0, max_y + 1, count)
+    scaling_factors = rng.uniform(0.75, 1, count)
+    angles = rng.uniform(0, 90, count)
 
-    for i in range(0, K):
-        #print(i, "th iteration")
-        x = random.randint(0, max_x)
-        y = random.randint(0, max_y)
+    if cache is not None:
+        scale_bins, angle_bins = cache.bins(scaling_factors, angles)
+        sizes = cache.size_table(shape_id)[scale_bins, angle_bins]
+        widths, heights = sizes[:, 0], sizes[:, 1]
+    else:
+        widths, heights = augmented_sizes(img.size[0], img.size[1], scaling_factors, angles)
+    boxes = np.stack([xs, ys, xs + widths, ys + heights], axis=1)
 
-        augmented_image  = augment_image(x, y, img)
-        positions = check_overlap_coordinates(augmented_image, positions, x, y)
+    #Candidates overlapping a shape placed before are rejected, only the
+    #shapes registered in the grid cells of a candidate are tested
+    survivors = np.flatnonzero(~index.overlaps_many(boxes))
+
+    #Overlapping pairs of the remaining candidates, touching edges count as
+    #overlap like in do_rectangles_overlap. A candidate is accepted unless it
+    #overlaps an accepted candidate that comes before it
+    alive = np.ones(len(survivors), dtype=bool)
+    earlier, later = index.conflicts(boxes[survivors])
+    if len(later) > 0:
+        order = np.argsort(later, kind="stable")
+        earlier, later = earlier[order], later[order]
+        starts = np.flatnonzero(np.r_[True, later[1:] != later[:-1]])
+        for start, stop in zip(starts.tolist(), np.r_[starts[1:], len(later)].tolist()):
+            alive[later[start]] = not alive[earlier[start:stop]].any()
+
+    return [(int(i), int(xs[i]), int(ys[i]), scaling_factors[i], angles[i], int(widths[i]), int(heights[i]))
+            for i in survivors[alive]]
+
+
+"""Helper Method to place a shape with all placement attempts of a round tested at once
+
+All candidate rectangles of a round are drawn as NumPy arrays. A candidate is
+rejected if it overlaps a shape placed before or an accepted candidate that
+comes before it, which is the same greedy rule as add_obj. Both tests go
+through the cells of a BatchOccupancyGrid, so the cost of a round depends on
+the number of its attempts and not on the number of shapes placed before.
+Only accepted candidates are augmented and added to the background image.
+Without a plan there is a single round of K attempts.
+
+    Args: positions : list of non-overlapping sprites
+          img : PIL image
+          pixel_x : Co-ordinate specified by user
+          pixel_y : Co-ordinate specified by user
+          rng : NumPy random generator of the image
+          cache : Optional SpriteCache of pre-augmented images
+          shape_id : Key of the shape in the cache
+          canvas : Background image the shape is drawn into
+          plan : Optional PlacementPlan with the target and attempt budget of the shape
+          stats : Optional dictionary, filled with target, attempts, placed and stop
+          transform : Augmentation backend without a cache, a function of AUGMENT_BACKENDS
+          index : Optional BatchOccupancyGrid holding the rectangles of positions,
+                  the accepted shapes are registered in it. If it is None, a grid
+                  is built from positions
+    Returns : Updated list of x, y, sprites, shape_id, angle
+
+"""
+def add_obj_batch(positions, img, pixel_x, pixel_y, rng, cache=None, shape_id=None, canvas=None,
+                  plan=None, stats=None, transform=scale_rotate_image, index=None):
+    if cache is not None:
+        img = cache.base(shape_id, img)
+    else:
+        img = img.resize((50, 50))
+
+    if index is None:
+        index = BatchOccupancyGrid(pixel_x, pixel_y, capacity=max(len(positions), 1024))
+        index.insert_many(np.array([(px, py, px + sprite.shape[1], py + sprite.shape[0])
+                                    for px, py, sprite, *_ in positions], dtype=np.int64).reshape(-1, 4))
+
+    #Same position range as add_obj
+    max_size = max_augmented_size(*img.size)
+    max_x = pixel_x - max_size
+    max_y = pixel_y - max_size
+
+    target, max_attempts = (None, K) if plan is None else plan.budget(shape_id)
+    attempts = placed = 0
+    stop = "attempts"
+
+    while attempts < max_attempts and (target is None or placed < target):
+        round_size = max_attempts if plan is None else plan.round_size(target - placed, max_attempts - attempts)
+        accepted = place_round(index, img, max_x, max_y, rng, round_size, cache, shape_id)
+
+        #Accepted candidates after the target are dropped, the attempts
+        #after the last kept candidate are not counted
+        if target is not None and placed + len(accepted) >= target:
+            accepted = accepted[: target - placed]
+            round_size = accepted[-1][0] + 1 if accepted else round_size
+        attempts += round_size
+        placed += len(accepted)
+        index.insert_many(np.array([(x, y, x + width, y + height) for i, x, y, s, a, width, height in accepted],
+                                   dtype=np.int64).reshape(-1, 4))
+
+        for i, x, y, scaling_factor, random_angle, width, height in accepted:
+            if cache is not None:
+                augmented_image = cache.augment(shape_id, scaling_factor, random_angle)
+                angle = cache.angle_value(random_angle)
+            else:
+                augmented_image = transform(img, scaling_factor, random_angle)
+                angle = float(random_angle)
+
+            positions.append((x, y, augmented_image, shape_id, angle))
+            composite_image(canvas, augmented_image, x, y)
+
+        if plan is not None and plan.collapsed(len(accepted), round_size):
+            stop = "acceptance"
+            break
+
+    if target is not None and placed >= target:
+        stop = "target"
+    if stats is not None:
+        stats.update(target=target, attempts=attempts, placed=placed, stop=stop)
     return positions
 
 
+"""Helper Method to get the sizes that the augmented sprites of a shape can have
+
+    Args: img : Cropped PIL image of the shape
+          cache : Optional SpriteCache, the sizes of its sprite bins are used
+          shape_id : Key of the shape in the cache
+    Returns : (width array, height array)
+
+"""
+def sprite_sizes(img, cache=None, shape_id=None):
+    if cache is not None:
+        cache.base(shape_id, img)
+        table = cache.size_table(shape_id)
+        return table[..., 0].ravel(), table[..., 1].ravel()
+
+    #Same normalisation and random ranges as add_obj and augment_image
+    width, height = img.resize((50, 50)).size
+    scaling_factors, angles = np.meshgrid(np.linspace(0.75, 1, 16, endpoint=False), np.arange(0, 91))
+    return augmented_sizes(width, height, scaling_factors.ravel(), angles.ravel())
+
+
+"""Helper Method to plan the placement of the shapes from the canvas and sprite sizes
+
+    Args: shapes : list of cropped PIL images
+          image_dimensions : Output image dimensions (width height)
+          cache : Optional SpriteCache, the list index of a shape is its shape_id
+          options : Further arguments of PlacementPlan (target_count, fill_density,
+                    min_acceptance, attempts_per_object)
+    Returns : PlacementPlan
+
+"""
+def plan_placement(shapes, image_dimensions, cache=None, **options):
+    sizes = [sprite_sizes(shape, cache, shape_id) for shape_id, shape in enumerate(shapes)]
+    return PlacementPlan(image_dimensions, sizes, **options)
+
+
+"""Helper Method to get the array shape of an output image
+
+    Args: image_dimensions : Output image dimensions (width height)
+          mode : Color mode, "L", "RGB" or "RGBA"
+    Returns : (height, width) for L, (height, width, channels) otherwise
+
+"""
+def canvas_shape(image_dimensions, mode="L"):
+    if mode == "L":
+        return (image_dimensions[1], image_dimensions[0])
+    return (image_dimensions[1], image_dimensions[0], COLOR_MODES[mode])
+
+
+"""Helper Method to derive a deterministic random seed for a single output image
+
+    Args: base_seed : Seed given with --seed
+          image_index : Index of the output image
+    Returns : Seed of the image, independent of the number of workers
+
+"""
+def image_seed(base_seed, image_index):
+    return int(np.random.SeedSequence([base_seed, image_index]).generate_state(1)[0])
+
+
+"""Helper Method to render one output image with all the shapes on it
+
+    Args: shapes : list of cropped PIL images, all of the color mode of the output image
+          image_dimensions : Output image dimensions (width height)
+          seed : Random seed of this image
+          overlap_index : "grid", "scan" or "mask"
+          cache : Optional SpriteCache, the list index of a shape is its shape_id
+          placement : "batch" tests all placement attempts of a shape at once,
+                      "sequential" tests them one by one with overlap_index.
+                      overlap_index "mask" always uses the sequential placement
+          out : Optional preallocated uint8 array of canvas_shape(). It is
+                cleared and used as the background image instead of a new array
+          plan : Optional PlacementPlan, see plan_placement. Without a plan every
+                 shape gets K placement attempts
+          stats : Optional dictionary, filled with the statistics of the image (see frame_stats)
+          augment_backend : "pil" or "opencv", used when there is no cache. A
+                            cache augments with its own transform
+    Returns : Background image with the shapes added to it, list of placed shapes
+
+"""
+def render_image(shapes, image_dimensions, seed, overlap_index="grid", cache=None, placement="batch",
+                 out=None, plan=None, stats=None, augment_backend="pil"):
+    shape = canvas_shape(image_dimensions, shapes[0].mode if shapes else "L")
+    if out is None:
+        canvas = np.zeros(shape, dtype="uint8")
+    else:
+        if out.shape != shape or out.dtype != np.uint8:
+            raise ValueError("render_image : out must be a uint8 array of shape " + str(shape))
+        canvas = out
+        canvas.fill(0)
+    positions = []
+    shape_stats = [{} for shape in shapes]
+    transform = AUGMENT_BACKENDS[augment_backend]
+
+    #Pixel masks are tested one placement attempt at a time
+    if placement == "batch" and overlap_index != "mask":
+        rng = np.random.default_rng(seed)
+        index = BatchOccupancyGrid(image_dimensions[0], image_dimensions[1])
+        for shape_id, shape in enumerate(shapes):
+            positions = add_obj_batch(positions, shape, image_dimensions[0], image_dimensions[1],
+                                      rng, cache, shape_id, canvas, plan, shape_stats[shape_id], transform, index)
+    else:
+        render_sequential(positions, shapes, image_dimensions, seed, overlap_index, cache, canvas, plan,
+                          shape_stats, transform)
+
+    if stats is not None:
+        stats.update(frame_stats(shape_stats, positions, image_dimensions,
+                                 None if plan is None else plan.capacity))
+    return canvas, positions
+
+
+"""Helper Method to place the shapes one placement attempt at a time
+
+    Args: positions : list of placed shapes, appended to
+          shapes : list of cropped PIL images
+          image_dimensions : Output image dimensions (width height)
+          seed : Random seed of this image
+          overlap_index : "grid", "scan" or "mask"
+          cache : Optional SpriteCache
+          canvas : Background image the shapes are drawn into
+          plan : Optional PlacementPlan
+          shape_stats : list of dictionaries, one per shape, filled by add_obj
+          transform : Augmentation backend without a cache, a function of AUGMENT_BACKENDS
+    Returns : None
+
+"""
+def render_sequential(positions, shapes, image_dimensions, seed, overlap_index, cache, canvas, plan,
+                      shape_stats, transform=scale_rotate_image):
+    #Each image has its own random state, so several images can be
+    #rendered at the same time
+    rand = random.Random(seed)
+
+    #Grid index answers overlap queries in near-constant time, scan
+    #compares every candidate with every shape placed so far
+    index = None
+    if overlap_index == "grid":
+        index = OccupancyGrid(image_dimensions[0], image_dimensions[1])
+    elif overlap_index == "mask":
+        index = PixelOccupancy(image_dimensions[0], image_dimensions[1])
+
+    for shape_id, shape in enumerate(shapes):
+        add_obj(positions, shape, image_dimensions[0], image_dimensions[1],
+                index, cache, shape_id, canvas, rand, plan, shape_stats[shape_id], transform)
+
+
+"""Helper Method to build the annotations of the shapes placed on an output image
+
+    Args: positions : list of x, y, sprites, shape_id, angle from render_image
+          shape_names : Class names of the shapes, indexed by shape_id
+    Returns : list of dictionaries with class, bbox (x, y, width, height) and angle
+
+"""
+def build_annotations(positions, shape_names):
+    objects = []
+    for x, y, sprite, shape_id, angle in positions:
+        height, width = sprite.shape[:2]
+        objects.append({"class": shape_names[shape_id], "bbox": [x, y, width, height],
+                        "angle": round(angle, 3)})
+    return objects
+
+
+class ShapeSceneGenerator:
+
+    """Helper Method : Initialisation of the scene generator
+
+The generator holds everything that is needed to render output images, so it
+can be used as a library, for example inside an IterableDataset. Instances do
+not share state, use one instance per thread.
+
+    Args: shapes : list of cropped PIL images, all of the same color mode (L, RGB or RGBA)
+          shape_names : Class names of the shapes, same order as shapes
+          image_dimensions : Output image dimensions (width height)
+          seed : Base random seed, image i is rendered with image_seed(seed, i)
+          placement : "batch" or "sequential"
+          overlap_index : "grid", "scan" or "mask"
+          cache : Optional SpriteCache, owned by this generator. It should use the
+                  function of augment_backend as its transform
+          augment_backend : "pil" or "opencv", see AUGMENT_BACKENDS
+          plan_options : Arguments of PlacementPlan (target_count, fill_density,
+                         min_acceptance, attempts_per_object)
+    Returns : None
+
+    """
+    def __init__(self, shapes, shape_names, image_dimensions, seed=0, placement="batch",
+                 overlap_index="grid", cache=None, augment_backend="pil", **plan_options):
+        if augment_backend not in AUGMENT_BACKENDS:
+            raise ValueError("ShapeSceneGenerator : unknown augment_backend " + str(augment_backend))
+        if len(set(shape.mode for shape in shapes)) > 1:
+            raise ValueError("ShapeSceneGenerator : all shapes must have the same color mode")
+
+        self.shapes = shapes
+        self.shape_names = shape_names
+        self.image_dimensions = tuple(image_dimensions)
+        self.seed = seed
+        self.placement = placement
+        self.overlap_index = overlap_index
+        self.cache = cache
+        self.augment_backend = augment_backend
+        self.plan_options = plan_options
+        self.plan = None
+        self.color_mode = shapes[0].mode if shapes else "L"
+
+    """Helper Method : Placement plan of the generator, computed on first use
+
+    Args: None
+    Returns : PlacementPlan
+    Raises : ValueError if the canvas is smaller than a shape or an option is invalid
+
+    """
+    def placement_plan(self):
+        if self.plan is None:
+            self.plan = plan_placement(self.shapes, self.image_dimensions, self.cache, **self.plan_options)
+        return self.plan
+
+    """Helper Method : Creates a generator for all the shapes of an input folder
+
+    Args: input_folder : Path to the input images folder
+          image_dimensions : Output image dimensions (width height)
+          cache_folder : Optional folder of the cropped shape cache
+          color_mode : "L", "RGB" or "RGBA"
+          kwargs : Further arguments of ShapeSceneGenerator
+    Returns : ShapeSceneGenerator
+
+    """
+    @classmethod
+    def from_folder(cls, input_folder, image_dimensions, cache_folder=None, color_mode="L", **kwargs):
+        shapes, shape_names = load_shapes(input_folder, cache_folder, mode=color_mode)
+        return cls(shapes, shape_names, image_dimensions, **kwargs)
+
+    """Helper Method : Parameters that change the output images, for the manifest fingerprint
+
+    Args: None
+    Returns : JSON serialisable dictionary
+
+    """
+    def params(self):
+        sprite_cache = None
+        if self.cache is not None:
+            sprite_cache = {"scale_bins": self.cache.scale_bins, "angle_bins": self.cache.angle_bins}
+        return {"image_dimensions": list(self.image_dimensions), "color_mode": self.color_mode,
+                "placement": self.placement, "overlap_index": self.overlap_index,
+                "augment_backend": self.augment_backend, "sprite_cache": sprite_cache,
+                "plan": self.plan_options,
+                "shapes": [{"class": name, "sha1": hashlib.sha1(shape.tobytes()).hexdigest()}
+                           for name, shape in zip(self.shape_names, self.shapes)]}
+
+    """Helper Method : Renders one output image
+
+    Args: image_index : Index of the output image
+          out : Optional preallocated uint8 array of canvas_shape(). The
+                returned image is then out itself, overwritten by the next call
+          stats : Optional dictionary, filled with the statistics of the image
+                  (see frame_stats) and the render time in seconds
+    Returns : (image, annotations)
+
+    """
+    def render(self, image_index, out=None, stats=None):
+        start = time.perf_counter()
+        image, positions = render_image(self.shapes, self.image_dimensions,
+                                        image_seed(self.seed, image_index), self.overlap_index,
+                                        self.cache, self.placement, out, self.placement_plan(), stats,
+                                        self.augment_backend)
+        if stats is not None:
+            stats["seconds"] = time.perf_counter() - start
+        return image, build_annotations(positions, self.shape_names)
+
+    """Helper Method : Yields output images of the indices start, start + step, ... below stop
+
+    Args: start : First image index
+          stop : Index to stop at, None for an endless stream
+          step : Index step, e.g. the number of data loader workers
+          out : Optional preallocated buffer that every frame is rendered into
+    Returns : Yields (image, annotations)
+
+    """
+    def frames(self, start=0, stop=None, step=1, out=None):
+        image_index = start
+        while stop is None or image_index < stop:
+            yield self.render(image_index, out)
+            image_index += step
+
+    def __iter__(self):
+        return self.frames()
+
+
+"""Helper Method to write one output image to the output folder
+
+    Args: output_folder : Path to the output images folder
+          image_index : Index of the output image
+          image : Background image with the shapes added to it
+    Returns : None
+
+"""
+def save_image(output_folder, image_index, image):
+    cv.imwrite(output_folder +"/Output_Image_" + str(image_index) + ".png", opencv_image(image))
+
+
+"""Helper Method to show an output image in a window while it is generated
+
+    Args: image : Background image with the shapes added to it
+    Returns : None
+
+"""
+def preview_image(image):
+    cv.imshow('Problem 1', opencv_image(image))
+    cv.waitKey(1)
+
+
+#Per process state of the pool workers, set once by init_worker so that the
+#shapes are not sent again with every task
+worker_state = {}
+
+
+"""Helper Method : Initialisation of a pool worker process
+
+    Args: generator : ShapeSceneGenerator, copied into every worker
+          output_format : "png", "tar" or "npy"
+          compression : PNG compression level
+    Returns : None
+
+"""
+def init_worker(generator, output_format, compression):
+    worker_state.update(generator=generator, output_format=output_format,
+                        compression=compression)
+
+
+"""Helper Method : Task of a pool worker, renders and encodes one output image
+
+    Args: image_index : Index of the output image
+    Returns : (image_index, encoded image, annotations, statistics)
+
+"""
+def generate_task(image_index):
+    stats = {}
+    image, objects = worker_state["generator"].render(image_index, stats=stats)
+    return (image_index,
+            encode_image(image, worker_state["output_format"], worker_state["compression"]),
+            objects, stats)
+
+
+"""Generator of the encoded output images and their annotations in the order of their index
+
+With more than one worker, the images are rendered and encoded by a process
+pool. Only the images in flight between the pool and the writer are held in
+memory.
+
+    Args: generator : ShapeSceneGenerator
+          indices : Indices of the output images to generate, in increasing order
+          args : Parsed command line arguments
+    Returns : Yields (image_index, encoded image, annotations, statistics)
+
+"""
+def generate_images(generator, indices, args):
+    #Each output image is an independent task of the process pool
+    if args.workers > 1:
+        import multiprocessing
+
+        #The cache and the placement plan are computed once here and every
+        #worker gets a copy of them
+        if generator.cache is not None:
+            generator.cache.warm(generator.shapes)
+        generator.placement_plan()
+        initargs = (generator, args.output_format, args.png_compression)
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=initargs) as pool:
+            chunksize = max(1, min(args.shard_size, len(indices) // (args.workers * 4)))
+            yield from pool.imap(generate_task, indices, chunksize)
+        return
+
+    #A single buffer is reused for all the images
+    out = np.empty(canvas_shape(generator.image_dimensions, generator.color_mode), dtype="uint8")
+    for i in indices:
+        stats = {}
+        image, objects = generator.render(i, out, stats)
+        #The GUI is only touched when a preview is requested
+        if args.preview:
+            preview_image(image)
+        yield i, encode_image(image, args.output_format, args.png_compression), objects, stats
+
+
 # Defining main function
 def main(args):
     #print('Enter python gen_images.py to know more about the input format \n')
@@ -201,55 +952,140 @@ def main(args):
     if image_dimensions[0] != image_dimensions[1]:
         print("Invalid image size")
         exit()
-    
-    background=np.zeros((image_dimensions[0], image_dimensions[1]),  dtype="uint8")
 
-    global bg
-    bg = np.array(background)
-    positions = []
+    if args.workers < 1:
+        print("Invalid number of workers")
+        exit()
 
-    try:
-        cropped_cube_img = Image.open('./input_images/cube_shape.png')
-        cropped_cube_img = cropped_cube_img.crop((55, 1, 225, 178))
-    
-        cropped_dodecahedon_img = Image.open('./input_images/Pyramid_augmented_dodecahedron.png')
-        cropped_dodecahedon_img = cropped_dodecahedon_img.crop((30, 7, 710, 718))
+    if args.shard_size < 1 or not 0 <= args.png_compression <= 9:
+        print("Invalid shard size or PNG compression level")
+        exit()
 
-        cropped_rectangle_img = Image.open('./input_images/Extended_Rectangle.png')
-        cropped_rectangle_img = cropped_rectangle_img.crop((46, 32, 104, 227))
+    if args.preview and args.workers > 1:
+        print("Invalid option, --preview can only be used with --workers 1")
+        exit()
 
-        cropped_prism_img = Image.open('./input_images/prism.png')
-        cropped_prism_img = cropped_prism_img.crop((15, 23, 335, 320))
+    if (args.target_count is not None and args.target_count < 0) or \
+       (args.fill_density is not None and not 0 < args.fill_density <= 1):
+        print("Invalid target count or fill density")
+        exit()
+
+    if not 0 <= args.min_acceptance < 1 or args.attempts_per_object < 1:
+        print("Invalid minimum acceptance rate or attempts per object")
+        exit()
+
+    if args.resume and args.output_format != "png":
+        print("Invalid option, --resume can only be used with --output-format png")
+        exit()
 
+    #Images completed by a previous run in the output folder
+    records = {}
+    if args.resume:
+        records = read_records(os.path.join(output_folder, MANIFEST_FILE))
+
+    #Every image gets its own seed derived from the base seed, so the
+    #output does not depend on the number of workers
+    base_seed = args.seed
+    if base_seed is None and records:
+        #A resumed run continues with the seed of the previous run
+        base_seed = records[max(records)]["base_seed"]
+        print("Resuming with seed", base_seed)
+    if base_seed is None:
+        base_seed = random.SystemRandom().randrange(2**32)
+        print("Using seed", base_seed)
+
+    #Every image of the input folder is a shape, cropped to its content.
+    #Cropped shapes are cached on disk so that later runs start instantly
+    cache_folder = None
+    if not args.no_asset_cache:
+        cache_folder = args.asset_cache or os.path.join(input_folder, ".shape_cache")
+
+    try:
+        shapes, shape_names = load_shapes(input_folder, cache_folder, args.crop_threshold, args.color_mode)
     except Exception as err:
             print(f"Unexpected {err=}, {type(err)=}")
             raise
+
+    if len(shapes) == 0:
+        print("No input images found in", input_folder)
+        exit()
+
+    #Pre-augmented sprites are reused across all images instead of resizing
+    #and rotating the shape on every placement attempt
+    cache = None
+    if args.sprite_cache_mb > 0:
+        cache = SpriteCache(AUGMENT_BACKENDS[args.augment_backend], scale_bins=args.scale_bins,
+                            angle_bins=args.angle_bins,
+                            max_bytes=args.sprite_cache_mb * 1024 * 1024)
+
+    generator = ShapeSceneGenerator(shapes, shape_names, image_dimensions, base_seed,
+                                    args.placement, args.overlap_index, cache, args.augment_backend,
+                                    target_count=args.target_count, fill_density=args.fill_density,
+                                    min_acceptance=args.min_acceptance,
+                                    attempts_per_object=args.attempts_per_object)
+
+    #The number of shapes per image is planned from the canvas and sprite sizes
+    try:
+        plan = generator.placement_plan()
+    except ValueError as err:
+        print("Invalid image size :", err)
+        exit()
+    print("Estimated capacity", plan.capacity, "objects, target", sum(plan.targets), "objects per image")
+
+    #Images whose seed, parameters and file are unchanged are not generated again.
+    #The annotations are part of the parameters, so they are never missing
+    params = dict(generator.params(), png_compression=args.png_compression, annotations=args.annotations)
+    indices = range(0, num_images)
+    if args.resume:
+        completed = completed_images(output_folder, records, fingerprint(params),
+                                     lambda i: image_seed(base_seed, i), num_images, args.verify)
+        for file_name in (MANIFEST_FILE, "annotations.jsonl", "stats.jsonl"):
+            compact_records(os.path.join(output_folder, file_name), completed)
+        indices = [i for i in range(0, num_images) if i not in completed]
+        print("Resuming,", len(completed), "of", num_images, "images are already complete")
+
+    manifest = None
+    if args.output_format == "png":
+        manifest = ManifestWriter(output_folder, params, base_seed, append=args.resume)
+
+    #Images are streamed into the writer one at a time, sharded writers
+    #only keep the current shard open
+    try :
+        with open_writer(args.output_format, output_folder, args.shard_size, num_images) as writer, \
+             open_annotation_writer(args.annotations, output_folder, image_dimensions, args.resume) as annotation_writer, \
+             open_stats_writer(args.stats, output_folder, args.resume) as stats_writer:
+            for i, payload, objects, stats in generate_images(generator, indices, args):
+                writer.write(i, payload)
+                annotation_writer.write(i, objects)
+                stats_writer.write(i, stats)
+
+                #An image is only recorded as complete once its file and its
+                #annotations are written
+                if manifest is not None:
+                    annotation_writer.flush()
+                    stats_writer.flush()
+                    manifest.write(i, image_seed(base_seed, i), image_name(i), payload)
+    except cv.error as e:
+        print('An Exception Occurred')
+        print('Exception Details ->', e)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    if args.stats:
+        print(stats_writer.summary())
+
+    if args.preview:
+        cv.destroyAllWindows()
     
-    for i in range(0, num_images):
-        positions = add_obj(positions, cropped_prism_img, image_dimensions[0], image_dimensions[1])
-        #print("Finished 1st execution and positions size", len(positions))
-        positions = add_obj(positions, cropped_cube_img, image_dimensions[0], image_dimensions[1])
-        #print("Finished 2nd execution and positions size", len(positions))
-        positions = add_obj(positions, cropped_dodecahedon_img, image_dimensions[0], image_dimensions[1])
-        #print("Finished 3rd execution and positions size", len(positions))
-        positions = add_obj(positions, cropped_rectangle_img, image_dimensions[0], image_dimensions[1])
-        #print("Finished last execution and positions size", len(positions))
-
-        try :
-            fig = plt.figure(figsize=(15, 15))
-            cv.imshow('Problem 1', cv.UMat(bg))
-            cv.imwrite(output_folder +"/Output_Image_" + str(i) + ".png", bg)
-            plt.close(fig)
-        except cv.error as e:
-            print('An Exception Occurred')
-            print('Exception Details ->', e)
-
-        positions = []
-        bg = np.array(background)
-    
-# Using the special variable 
-# __name__
-if __name__=="__main__":
+"""Helper Method to build the command line parser of the script
+
+    Args: None
+    Returns : argparse.ArgumentParser
+
+"""
+def build_parser():
+    import argparse
 
     #Enter python gen_images.py to know more about the input format
     parser = argparse.ArgumentParser(description="Generate images with non-overlapping shapes.",
@@ -272,4 +1108,108 @@ if __name__=="__main__":
         help="Number of output images to generate."
     )
 
-    main(parser.parse_args())
\ No newline at end of file
+    parser.add_argument("--color-mode", choices=["L", "RGB", "RGBA"], default="L",
+        help="Color mode of the output images: grayscale, RGB or RGBA (transparent background)."
+    )
+
+    parser.add_argument("--crop-threshold", type=int, default=48,
+        help="Minimum difference to the background value for a pixel to count as shape content when cropping."
+    )
+
+    parser.add_argument("--asset-cache", default=None,
+        help="Folder of the cache of cropped input shapes. Default: .shape_cache in the input folder."
+    )
+
+    parser.add_argument("--no-asset-cache", action="store_true",
+        help="Decode and crop the input shapes on every run."
+    )
+
+    parser.add_argument("--output-format", choices=["png", "tar", "npy"], default="png",
+        help="Output backend: one PNG file per image, PNG images in tar shards, or memory-mapped .npy shards."
+    )
+
+    parser.add_argument("--shard-size", type=int, default=1000,
+        help="Number of images per shard of the tar and npy output formats."
+    )
+
+    parser.add_argument("--png-compression", type=int, default=1,
+        help="PNG compression level between 0 (fastest) and 9 (smallest)."
+    )
+
+    parser.add_argument("--annotations", choices=["jsonl", "none"], default="jsonl",
+        help="Write the class, bounding box and rotation angle of every placed shape to annotations.jsonl."
+    )
+
+    parser.add_argument("--placement", choices=["batch", "sequential"], default="batch",
+        help="Placement engine: all attempts of a shape tested at once with NumPy, or one attempt at a time."
+    )
+
+    parser.add_argument("--overlap-index", choices=["grid", "scan", "mask"], default="grid",
+        help="Overlap detection method of the sequential placement: uniform grid index or linear scan over all placed shapes, "
+             "or mask to test the shape pixels against a packed occupancy bitmap (always uses the sequential placement)."
+    )
+
+    parser.add_argument("--target-count", type=int, default=None,
+        help="Number of objects per output image, shared equally by the shapes. Default: fill the canvas up to its estimated capacity."
+    )
+
+    parser.add_argument("--fill-density", type=float, default=None,
+        help="Fraction of the output image covered by shape bounding boxes, instead of --target-count."
+    )
+
+    parser.add_argument("--min-acceptance", type=float, default=0.02,
+        help="A shape stops early when fewer of its placement attempts in a round are accepted."
+    )
+
+    parser.add_argument("--attempts-per-object", type=int, default=8,
+        help="Placement attempt budget of a shape per object of its target."
+    )
+
+    parser.add_argument("--stats", action="store_true",
+        help="Write per-image placement statistics (objects, attempts, acceptance rate, fill density) to stats.jsonl."
+    )
+
+    parser.add_argument("--resume", action="store_true",
+        help="Continue a previous run in the output folder. Only images that are missing from manifest.jsonl "
+             "or were generated with other parameters are generated (png output format only)."
+    )
+
+    parser.add_argument("--verify", action="store_true",
+        help="With --resume, compare the checksum of every completed image instead of its file size."
+    )
+
+    parser.add_argument("--workers", type=int, default=1,
+        help="Number of worker processes that generate images in parallel."
+    )
+
+    parser.add_argument("--seed", type=int, default=None,
+        help="Base random seed. The same seed gives the same images for any number of workers."
+    )
+
+    parser.add_argument("--preview", action="store_true",
+        help="Show every generated image in a window. Images are generated headless by default."
+    )
+
+    parser.add_argument("--augment-backend", choices=["pil", "opencv"], default="opencv",
+        help="Scale and rotate shapes with PIL (resize, then rotate) or with a single OpenCV warpAffine."
+    )
+
+    parser.add_argument("--sprite-cache-mb", type=int, default=64,
+        help="Memory bound of the pre-augmented sprite cache in MB. 0 disables the cache."
+    )
+
+    parser.add_argument("--scale-bins", type=int, default=8,
+        help="Number of quantized scaling factors of the sprite cache."
+    )
+
+    parser.add_argument("--angle-bins", type=int, default=90,
+        help="Number of quantized rotation angles of the sprite cache."
+    )
+
+    return parser
+
+
+# Using the special variable 
+# __name__
+if __name__=="__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,193 @@
+"""This is the manifest script of Problem 1
+
+Keeps track of the output images that gen_images.py has completed, so that
+a run that was killed can be resumed and a run with changed parameters only
+regenerates what changed:
+i) manifest.jsonl in the output folder gets one line per completed image
+   with its seed, the fingerprint of the generation parameters and the size
+   and SHA-1 checksum of the written file. A line is only appended (and
+   flushed) after the image and its annotations are written.
+ii) The fingerprint is a hash of all parameters that change the output images,
+    including the pixels of the cropped input shapes. The parameters of every
+    fingerprint are kept in manifest_params.json.
+iii) With --resume, an image is skipped if its last manifest line has the
+     current fingerprint and seed and its file is still there with the same
+     size (or the same checksum with --verify). Every other image is generated
+     again, so a changed shape or parameter regenerates the whole dataset while
+     a larger --num-images only adds the missing images.
+iv) Before resuming, manifest.jsonl, annotations.jsonl and stats.jsonl are
+    compacted to the lines of the skipped images, which drops lines of images
+    that were not completed and lines cut off by the kill.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "manifest.jsonl"
+PARAMS_FILE = "manifest_params.json"
+
+
+"""Helper Method to compute the fingerprint of the generation parameters
+
+    Args: params : JSON serialisable dictionary of the parameters
+    Returns : Hex digest (16 characters)
+
+"""
+def fingerprint(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+"""Helper Method to read the JSON lines of a file by image index
+
+    Args: path : Path of a JSON lines file with an image_id in every line
+    Returns : Dictionary image index -> last record of that index. Lines that
+              are not valid JSON (e.g. cut off by a kill) are ignored
+
+"""
+def read_records(path):
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "image_id" in record:
+                records[record["image_id"]] = record
+    return records
+
+
+"""Helper Method to compute the SHA-1 checksum of a file
+
+    Args: path : Path of the file
+    Returns : Hex digest
+
+"""
+def file_checksum(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+"""Helper Method to find the images of a previous run that do not need to be generated again
+
+    Args: output_folder : Path to the output images folder
+          records : Manifest records from read_records
+          run_fingerprint : Fingerprint of the current parameters
+          seeds : Function image index -> seed of the current run
+          num_images : Number of output images of the current run
+          verify : Compare the checksum of every file instead of its size only
+    Returns : Set of completed image indices
+
+"""
+def completed_images(output_folder, records, run_fingerprint, seeds, num_images, verify=False):
+    completed = set()
+    for image_index, record in records.items():
+        if not 0 <= image_index < num_images:
+            continue
+        if record.get("fingerprint") != run_fingerprint or record.get("seed") != seeds(image_index):
+            continue
+
+        path = os.path.join(output_folder, record["file"])
+        try:
+            if os.path.getsize(path) != record["bytes"]:
+                continue
+        except OSError:
+            continue
+        if verify and file_checksum(path) != record["sha1"]:
+            continue
+        completed.add(image_index)
+    return completed
+
+
+"""Helper Method to keep only the last line of the given images in a JSON lines file
+
+The file is read twice and rewritten line by line into a temporary file,
+which then replaces it, so only the line numbers are held in memory.
+
+    Args: path : Path of a JSON lines file with an image_id in every line
+          keep : Set of image indices to keep
+    Returns : None
+
+"""
+def compact_records(path, keep):
+    if not os.path.exists(path):
+        return
+
+    #Line number of the last valid line of every kept image
+    last_lines = {}
+    with open(path) as f:
+        for line_number, line in enumerate(f):
+            try:
+                image_index = json.loads(line)["image_id"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if image_index in keep:
+                last_lines[image_index] = line_number
+    wanted = set(last_lines.values())
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(path) as source, open(temp_path, "w") as target:
+        for line_number, line in enumerate(source):
+            if line_number in wanted:
+                target.write(line if line.endswith("\n") else line + "\n")
+    os.replace(temp_path, path)
+
+
+class ManifestWriter:
+
+    """Helper Method : Initialisation of the manifest writer, opens manifest.jsonl
+
+    Args: output_folder : Path to the output images folder
+          params : Dictionary of the generation parameters
+          base_seed : Base seed of the run
+          append : Append to the manifest of a resumed run instead of starting a new one
+    Returns : None
+
+    """
+    def __init__(self, output_folder, params, base_seed, append=False):
+        self.output_folder = output_folder
+        self.base_seed = base_seed
+        self.fingerprint = fingerprint(params)
+
+        #The parameters of all fingerprints that were used in this folder
+        params_path = os.path.join(output_folder, PARAMS_FILE)
+        known = {}
+        if os.path.exists(params_path):
+            with open(params_path) as f:
+                known = json.load(f)
+        if self.fingerprint not in known:
+            known[self.fingerprint] = params
+            with open(params_path, "w") as f:
+                json.dump(known, f, indent=1, sort_keys=True)
+
+        self.file = open(os.path.join(output_folder, MANIFEST_FILE), "a" if append else "w")
+
+    """Helper Method : Records a completed image
+
+    Args: image_index : Index of the output image
+          seed : Seed of the image
+          file_name : Name of the written file in the output folder
+          payload : Bytes that were written to the file
+    Returns : None
+
+    """
+    def write(self, image_index, seed, file_name, payload):
+        record = {"image_id": image_index, "seed": seed, "base_seed": self.base_seed,
+                  "fingerprint": self.fingerprint, "file": file_name, "bytes": len(payload),
+                  "sha1": hashlib.sha1(payload).hexdigest()}
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,336 @@
+"""This is the occupancy_index script of Problem 1
+
+Provides the occupancy indexes of the shapes that have already been placed
+on the background image.
+
+OccupancyGrid is a uniform-grid spatial index of the placed rectangles:
+i) The canvas is divided into square cells of cell_size pixels and every
+   placed rectangle is registered in each cell it covers.
+ii) An overlap query only tests the rectangles registered in the cells that
+    the candidate covers, so the cost of a query does not grow with the
+    number of shapes already placed in the image.
+iii) Overlap semantics are identical to do_rectangles_overlap in
+     gen_images.py (touching edges count as overlap).
+
+BatchOccupancyGrid is the same grid with NumPy storage for the batch placement
+of gen_images.py:
+iv) The placed rectangles are kept in a preallocated array and every cell has
+    a fixed number of rectangle slots, both grow by doubling when they are full.
+v) overlaps_many() tests a whole round of candidates against the rectangles
+   registered in the cells they cover, and conflicts() finds the overlapping
+   pairs among the candidates from the candidates sharing a cell. The cost of
+   both depends on the number of candidates only, not on the number of
+   rectangles already placed.
+
+PixelOccupancy is a packed bitmap (one bit per pixel) of the pixels covered
+by placed shapes. A candidate only overlaps if its mask shares a pixel with
+a placed shape, which is tested with bitwise AND on the packed rows.
+"""
+import numpy as np
+
+
+class OccupancyGrid:
+
+    # Overlap is decided on rectangles, no mask is needed
+    uses_mask = False
+
+    """Helper Method : Initialisation of the grid
+
+    Args: width : Width of the canvas in pixels
+          height : Height of the canvas in pixels
+          cell_size : Edge length of one grid cell in pixels. Should be close
+                      to the size of a typical shape (50 px by default)
+    Returns : None
+
+    """
+    def __init__(self, width, height, cell_size=50):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.rects = []
+        self.cells = {}
+
+    """Helper Method : Range of cells covered by a rectangle (both ends inclusive)
+
+    Args: rect : (x1, y1, x2, y2)
+    Returns : (first column, first row, last column, last row)
+
+    """
+    def _cell_range(self, rect):
+        x1, y1, x2, y2 = rect
+        cell_size = self.cell_size
+        return (max(x1, 0) // cell_size, max(y1, 0) // cell_size,
+                max(x2, 0) // cell_size, max(y2, 0) // cell_size)
+
+    """Helper Method : Registers a placed rectangle in every cell that it covers
+
+    Args: rect : (x1, y1, x2, y2)
+          mask : Unused, rectangles are indexed
+    Returns : None
+
+    """
+    def insert(self, rect, mask=None):
+        rect_id = len(self.rects)
+        self.rects.append(rect)
+
+        cx1, cy1, cx2, cy2 = self._cell_range(rect)
+        for cy in range(cy1, cy2 + 1):
+            for cx in range(cx1, cx2 + 1):
+                self.cells.setdefault((cx, cy), []).append(rect_id)
+
+    """Helper Method : Checks whether a candidate rectangle overlaps any registered rectangle
+
+    Args: rect : (x1, y1, x2, y2)
+          mask : Unused, rectangles are tested
+    Returns : True : Overlap with at least one placed rectangle, False : Free area
+
+    """
+    def overlaps(self, rect, mask=None):
+        x1, y1, x2, y2 = rect
+        rects = self.rects
+        cells = self.cells
+
+        cx1, cy1, cx2, cy2 = self._cell_range(rect)
+        for cy in range(cy1, cy2 + 1):
+            for cx in range(cx1, cx2 + 1):
+                for rect_id in cells.get((cx, cy), ()):
+                    px1, py1, px2, py2 = rects[rect_id]
+                    if not (x1 > px2 or x2 < px1 or y1 > py2 or y2 < py1):
+                        return True
+        return False
+
+    """Helper Method : Removes all registered rectangles so the grid can be reused for the next image
+
+    Args: None
+    Returns : None
+
+    """
+    def clear(self):
+        self.rects = []
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+
+class BatchOccupancyGrid(OccupancyGrid):
+
+    """Helper Method : Initialisation of the grid, all arrays are preallocated
+
+    Args: width : Width of the canvas in pixels
+          height : Height of the canvas in pixels
+          cell_size : Edge length of one grid cell in pixels
+          capacity : Number of rectangles before the rectangle array grows
+          depth : Number of rectangle slots per cell before the slots grow
+    Returns : None
+
+    """
+    def __init__(self, width, height, cell_size=50, capacity=1024, depth=4):
+        super().__init__(width, height, cell_size)
+        self.columns = max(width, 0) // cell_size + 1
+        self.rows = max(height, 0) // cell_size + 1
+        self.boxes = np.empty((max(capacity, 1), 4), dtype=np.int64)
+        self.count = 0
+        #Rectangle ids of every cell (row major), -1 for a free slot
+        self.slots = np.full((self.rows * self.columns, max(depth, 1)), -1, dtype=np.int64)
+        self.fill = np.zeros(self.rows * self.columns, dtype=np.int64)
+        self.depth_used = 0
+
+    """Helper Method : Cells covered by every rectangle
+
+    Args: boxes : int NumPy array of shape (n, 4), rows of (x1, y1, x2, y2)
+    Returns : (cell numbers, valid), int and bool arrays of shape (n, cells per rectangle).
+              Cells that a smaller rectangle does not cover are not valid
+
+    """
+    def _cells(self, boxes):
+        cell_size = self.cell_size
+        first = np.maximum(boxes[:, :2], 0) // cell_size
+        last = np.minimum(np.maximum(boxes[:, 2:], 0) // cell_size, (self.columns - 1, self.rows - 1))
+        span = int((last - first).max()) + 1 if len(boxes) else 1
+        offsets = np.arange(span)
+        cx = first[:, 0, None, None] + offsets[None, None, :]
+        cy = first[:, 1, None, None] + offsets[None, :, None]
+        valid = (cx <= last[:, 0, None, None]) & (cy <= last[:, 1, None, None])
+        cells = np.where(valid, cy * self.columns + cx, 0)
+        return cells.reshape(len(boxes), span * span), valid.reshape(len(boxes), span * span)
+
+    """Helper Method : Checks every candidate rectangle against the registered rectangles
+
+    Args: boxes : int NumPy array of shape (n, 4), rows of (x1, y1, x2, y2)
+    Returns : bool NumPy array, True for the candidates overlapping a registered rectangle
+
+    """
+    def overlaps_many(self, boxes):
+        if self.depth_used == 0 or len(boxes) == 0:
+            return np.zeros(len(boxes), dtype=bool)
+        cells, valid = self._cells(boxes)
+        ids = self.slots[cells, : self.depth_used]
+        #Free slots (-1) read the last row of the array and are masked out
+        placed = self.boxes[ids]
+        candidates = boxes[:, None, None, :]
+        hits = ((candidates[..., 0] <= placed[..., 2]) & (candidates[..., 2] >= placed[..., 0]) &
+                (candidates[..., 1] <= placed[..., 3]) & (candidates[..., 3] >= placed[..., 1]))
+        return (hits & valid[:, :, None] & (ids >= 0)).any(axis=(1, 2))
+
+    """Helper Method : Overlapping pairs among candidate rectangles.
+    Two rectangles can only overlap if they cover a common cell, so only the
+    candidates registered in the same cell are compared
+
+    Args: boxes : int NumPy array of shape (n, 4), rows of (x1, y1, x2, y2)
+    Returns : (earlier, later) int arrays of the row numbers of the overlapping pairs,
+              earlier < later. A pair may be listed more than once
+
+    """
+    def conflicts(self, boxes):
+        cells, valid = self._cells(boxes)
+        cell = cells[valid]
+        box_ids = np.broadcast_to(np.arange(len(boxes))[:, None], cells.shape)[valid]
+        order = np.lexsort((box_ids, cell))
+        cell, box_ids = cell[order], box_ids[order]
+
+        #Entries of a cell are contiguous, the pairs d entries apart are
+        #compared until no cell holds more than d candidates
+        earlier, later = [], []
+        distance = 1
+        while distance < len(cell):
+            same = cell[distance:] == cell[:-distance]
+            if not same.any():
+                break
+            earlier.append(box_ids[:-distance][same])
+            later.append(box_ids[distance:][same])
+            distance += 1
+        if not earlier:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        earlier = np.concatenate(earlier)
+        later = np.concatenate(later)
+        a, b = boxes[earlier], boxes[later]
+        hits = (a[:, 0] <= b[:, 2]) & (a[:, 2] >= b[:, 0]) & (a[:, 1] <= b[:, 3]) & (a[:, 3] >= b[:, 1])
+        return earlier[hits], later[hits]
+
+    """Helper Method : Registers placed rectangles in every cell that they cover
+
+    Args: boxes : int NumPy array of shape (n, 4), rows of (x1, y1, x2, y2)
+    Returns : None
+
+    """
+    def insert_many(self, boxes):
+        count = len(boxes)
+        if count == 0:
+            return
+        if self.count + count > len(self.boxes):
+            grown = np.empty((max(2 * len(self.boxes), self.count + count), 4), dtype=self.boxes.dtype)
+            grown[: self.count] = self.boxes[: self.count]
+            self.boxes = grown
+        self.boxes[self.count : self.count + count] = boxes
+        rect_ids = np.arange(self.count, self.count + count)
+        self.count += count
+
+        cells, valid = self._cells(boxes)
+        cell = cells[valid]
+        rect_ids = np.broadcast_to(rect_ids[:, None], cells.shape)[valid]
+        order = np.argsort(cell, kind="stable")
+        cell, rect_ids = cell[order], rect_ids[order]
+
+        #Slot of every new entry : the filled slots of its cell plus its rank
+        #among the new entries of the same cell
+        starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+        sizes = np.diff(np.r_[starts, len(cell)])
+        slot = self.fill[cell] + np.arange(len(cell)) - np.repeat(starts, sizes)
+        depth = int(slot.max()) + 1
+        if depth > self.slots.shape[1]:
+            grown = np.full((len(self.slots), max(2 * self.slots.shape[1], depth)), -1, dtype=self.slots.dtype)
+            grown[:, : self.slots.shape[1]] = self.slots
+            self.slots = grown
+        self.slots[cell, slot] = rect_ids
+        self.fill[cell[starts]] += sizes
+        self.depth_used = max(self.depth_used, depth)
+
+    def insert(self, rect, mask=None):
+        self.insert_many(np.array([rect], dtype=np.int64))
+
+    def overlaps(self, rect, mask=None):
+        return bool(self.overlaps_many(np.array([rect], dtype=np.int64))[0])
+
+    def clear(self):
+        self.slots[:, : self.depth_used] = -1
+        self.fill[:] = 0
+        self.depth_used = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+
+class PixelOccupancy:
+
+    # Overlap is decided on the pixels of the shape mask
+    uses_mask = True
+
+    """Helper Method : Initialisation of the packed occupancy bitmap
+
+    Args: width : Width of the canvas in pixels
+          height : Height of the canvas in pixels
+    Returns : None
+
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        #One spare byte per row for masks that are shifted into the next byte
+        self.bits = np.zeros((height, (width + 7) // 8 + 1), dtype=np.uint8)
+        self.count = 0
+
+    """Helper Method : Packs a mask into bytes aligned with the bitmap columns
+
+    Args: x : x co-ordinate of the mask on the canvas
+          mask : 2D bool NumPy array
+    Returns : (first byte column, packed mask)
+
+    """
+    @staticmethod
+    def _packed(x, mask):
+        shift = x % 8
+        if shift:
+            shifted = np.zeros((mask.shape[0], mask.shape[1] + shift), dtype=bool)
+            shifted[:, shift:] = mask
+            mask = shifted
+        return x // 8, np.packbits(mask, axis=1)
+
+    """Helper Method : Checks whether a mask shares a pixel with any placed shape
+
+    Args: rect : (x1, y1, x2, y2), only x1 and y1 are used
+          mask : 2D bool NumPy array, True for the pixels of the shape
+    Returns : True : Overlap with at least one placed shape, False : Free area
+
+    """
+    def overlaps(self, rect, mask):
+        x, y = rect[0], rect[1]
+        column, packed = self._packed(x, mask)
+        region = self.bits[y : y + packed.shape[0], column : column + packed.shape[1]]
+        return bool(np.bitwise_and(region, packed[: region.shape[0], : region.shape[1]]).any())
+
+    """Helper Method : Marks the pixels of a placed shape as occupied
+
+    Args: rect : (x1, y1, x2, y2), only x1 and y1 are used
+          mask : 2D bool NumPy array, True for the pixels of the shape
+    Returns : None
+
+    """
+    def insert(self, rect, mask):
+        x, y = rect[0], rect[1]
+        column, packed = self._packed(x, mask)
+        region = self.bits[y : y + packed.shape[0], column : column + packed.shape[1]]
+        np.bitwise_or(region, packed[: region.shape[0], : region.shape[1]], out=region)
+        self.count += 1
+
+    def clear(self):
+        self.bits[:] = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
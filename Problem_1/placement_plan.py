@@ -0,0 +1,129 @@
+"""This is the placement_plan script of Problem 1
+
+Plans how many shapes gen_images.py places on an output image instead of a
+fixed number of placement attempts per shape:
+i) The capacity of the canvas is estimated from the real canvas size and the
+   sizes of the augmented sprites of every shape. Randomly placed
+   non-overlapping rectangles stop fitting at about JAMMING_DENSITY of the
+   canvas area, touching edges count as overlap.
+ii) Every shape gets the same number of objects. By default the canvas is
+    filled up to its capacity, a target object count per image or a target
+    fill density (fraction of the canvas covered by bounding boxes) can be
+    given instead. A fill density is converted into a number of objects with
+    the mean sprite area of every shape.
+iii) Placement attempts are made in rounds. A shape stops when its target is
+     reached, when the acceptance rate of a round drops below min_acceptance
+     (the canvas is full for this shape) or when its attempt budget is used up.
+iv) The placement functions report per-shape statistics, which frame_stats
+    combines into the statistics of one output image.
+"""
+import math
+
+import numpy as np
+
+# Area fraction at which random sequential placement of squares saturates
+JAMMING_DENSITY = 0.55
+
+# Smallest number of placement attempts in one round
+MIN_ROUND = 16
+
+
+class PlacementPlan:
+
+    """Helper Method : Initialisation of the placement plan of an output image
+
+    Args: image_dimensions : Output image dimensions (width height)
+          sprite_sizes : list with one (width array, height array) per shape,
+                         the sizes the augmented sprites of the shape can have
+          target_count : Optional number of objects per image
+          fill_density : Optional fraction of the canvas covered by bounding boxes,
+                         ignored if target_count is given
+          min_acceptance : A shape stops when a round accepts fewer of its attempts
+          attempts_per_object : Attempt budget of a shape per object of its target
+    Returns : None
+
+    """
+    def __init__(self, image_dimensions, sprite_sizes, target_count=None, fill_density=None,
+                 min_acceptance=0.02, attempts_per_object=8):
+        if target_count is not None and target_count < 0:
+            raise ValueError("target_count must not be negative")
+        if fill_density is not None and not 0 < fill_density <= 1:
+            raise ValueError("fill_density must be between 0 and 1")
+        if not 0 <= min_acceptance < 1 or attempts_per_object < 1:
+            raise ValueError("min_acceptance must be between 0 and 1 and attempts_per_object at least 1")
+
+        self.image_dimensions = tuple(image_dimensions)
+        self.min_acceptance = min_acceptance
+        self.attempts_per_object = attempts_per_object
+
+        canvas_area = image_dimensions[0] * image_dimensions[1]
+        for widths, heights in sprite_sizes:
+            if widths.max() > image_dimensions[0] or heights.max() > image_dimensions[1]:
+                raise ValueError("PlacementPlan : the canvas is smaller than a shape")
+
+        #Touching edges count as overlap, so a placed shape blocks one more
+        #pixel in each direction
+        areas = [float(np.mean(widths * heights)) for widths, heights in sprite_sizes]
+        footprints = [float(np.mean((widths + 1) * (heights + 1))) for widths, heights in sprite_sizes]
+
+        per_shape_capacity = int(JAMMING_DENSITY * canvas_area / sum(footprints)) if footprints else 0
+        self.capacity = per_shape_capacity * len(sprite_sizes)
+
+        if target_count is not None:
+            share, extra = divmod(target_count, max(len(sprite_sizes), 1))
+            self.targets = [share + (shape_id < extra) for shape_id in range(0, len(sprite_sizes))]
+        elif fill_density is not None:
+            share = int(round(fill_density * canvas_area / sum(areas))) if areas else 0
+            self.targets = [share] * len(sprite_sizes)
+        else:
+            self.targets = [per_shape_capacity] * len(sprite_sizes)
+
+    """Helper Method : Target and attempt budget of a shape
+
+    Args: shape_id : Index of the shape
+    Returns : (target number of objects, maximum number of placement attempts)
+
+    """
+    def budget(self, shape_id):
+        target = self.targets[shape_id]
+        return target, max(int(math.ceil(self.attempts_per_object * target)), MIN_ROUND if target else 0)
+
+    """Helper Method : Number of placement attempts of the next round
+
+    Args: remaining : Objects still missing to reach the target
+          attempts_left : Attempts left in the budget of the shape
+    Returns : Number of attempts
+
+    """
+    def round_size(self, remaining, attempts_left):
+        return min(max(2 * remaining, MIN_ROUND), attempts_left)
+
+    """Helper Method : Decides whether a shape stops after a round
+
+    Args: accepted : Objects accepted in the round
+          attempts : Attempts made in the round
+    Returns : True if the acceptance rate of the round collapsed
+
+    """
+    def collapsed(self, accepted, attempts):
+        return attempts > 0 and accepted < self.min_acceptance * attempts
+
+
+"""Helper Method to combine the per-shape statistics of one output image
+
+    Args: shape_stats : list of dictionaries with target, attempts, placed and stop
+          positions : list of x, y, sprites, shape_id, angle of the placed shapes
+          image_dimensions : Output image dimensions (width height)
+          capacity : Estimated capacity of the canvas, None if unknown
+    Returns : Dictionary with the statistics of the image
+
+"""
+def frame_stats(shape_stats, positions, image_dimensions, capacity=None):
+    attempts = sum(stats["attempts"] for stats in shape_stats)
+    covered = sum(sprite.shape[0] * sprite.shape[1] for _, _, sprite, *_ in positions)
+    return {"objects": len(positions),
+            "attempts": attempts,
+            "acceptance_rate": len(positions) / attempts if attempts else 0.0,
+            "fill_density": covered / (image_dimensions[0] * image_dimensions[1]),
+            "capacity": capacity,
+            "shapes": shape_stats}
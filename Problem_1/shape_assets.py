@@ -0,0 +1,149 @@
+"""This is the shape_assets script of Problem 1
+
+Loads the input shapes of gen_images.py from the input folder:
+i) Every image file in the input folder is a shape, its file name (without
+   extension) is the class name used in the annotations.
+ii) Each shape is converted to the color mode of the output (grayscale L, RGB
+    or RGBA) and cropped to the bounds of its content in a single vectorized
+    NumPy pass. Pixels of the grayscale image that differ from the background
+    (median of the border pixels) by more than a threshold are content.
+iii) The cropped shapes are kept in an on-disk cache keyed by the hash of the
+     file and the color mode, so later runs skip decoding and cropping.
+"""
+import hashlib
+import os
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# Supported color modes and their number of channels
+COLOR_MODES = {"L": 1, "RGB": 3, "RGBA": 4}
+
+# Version of the cached format, part of the cache key
+CACHE_VERSION = 1
+
+
+"""Helper Method to find the bounds of the content of a grayscale image
+
+    Args: array : 2D uint8 NumPy array
+          threshold : Minimum difference to the background value for a content pixel
+    Returns : (left, upper, right, lower) box for PIL crop, or None if the image is empty
+
+"""
+def content_bounds(array, threshold):
+    border = np.concatenate((array[0], array[-1], array[:, 0], array[:, -1]))
+    background = int(np.median(border))
+
+    content = np.abs(array.astype(np.int16) - background) > threshold
+    rows = np.flatnonzero(content.any(axis=1))
+    columns = np.flatnonzero(content.any(axis=0))
+    if len(rows) == 0:
+        return None
+    return (int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1)
+
+
+"""Helper Method to decode a shape image, convert it to a color mode and crop it to its content
+
+    Args: path : Path of the image file
+          threshold : Minimum difference to the background value for a content pixel
+          mode : "L", "RGB" or "RGBA"
+    Returns : Cropped NumPy array of shape (height, width) or (height, width, channels)
+
+"""
+def crop_shape(path, threshold, mode="L"):
+    img = Image.open(path)
+    rgba = None
+
+    #Transparent pixels are treated as white background, except in RGBA
+    #where the alpha channel is kept
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        img = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        img.alpha_composite(rgba)
+
+    #Content is always found on the grayscale image
+    box = content_bounds(np.asarray(img.convert("L")), threshold)
+
+    if mode == "RGBA" and rgba is not None:
+        array = np.asarray(rgba)
+    else:
+        array = np.asarray(img.convert(mode))
+    if box is None:
+        return array
+    left, upper, right, lower = box
+    return np.ascontiguousarray(array[upper:lower, left:right])
+
+
+"""Helper Method to compute the cache key of a shape image
+
+    Args: path : Path of the image file
+          threshold : Crop threshold, shapes cropped with another threshold are cached separately
+          mode : Color mode, cached separately as well
+    Returns : Hex digest
+
+"""
+def file_key(path, threshold, mode="L"):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"{CACHE_VERSION}:{threshold}:{mode}".encode())
+    return digest.hexdigest()
+
+
+"""Helper Method to load one shape through the on-disk cache
+
+    Args: path : Path of the image file
+          cache_folder : Folder of the cached shapes, None disables the cache
+          threshold : Crop threshold
+          mode : "L", "RGB" or "RGBA"
+    Returns : Cropped PIL image of the given mode
+
+"""
+def load_shape(path, cache_folder, threshold, mode="L"):
+    if cache_folder is None:
+        return Image.fromarray(crop_shape(path, threshold, mode))
+
+    cache_path = os.path.join(cache_folder, file_key(path, threshold, mode) + ".npy")
+    try:
+        return Image.fromarray(np.load(cache_path))
+    except (OSError, ValueError):
+        pass
+
+    array = crop_shape(path, threshold, mode)
+
+    #Written to a temporary file first so that concurrent runs never read a partial file
+    os.makedirs(cache_folder, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_path, cache_path)
+    return Image.fromarray(array)
+
+
+"""Helper Method to load all the shapes of the input folder
+
+    Args: input_folder : Path to the input images folder
+          cache_folder : Folder of the cached shapes, None disables the cache
+          threshold : Crop threshold
+          mode : Color mode of the shapes, "L", "RGB" or "RGBA"
+    Returns : (list of cropped PIL images, list of class names)
+
+"""
+def load_shapes(input_folder, cache_folder=None, threshold=48, mode="L"):
+    if mode not in COLOR_MODES:
+        raise ValueError("load_shapes : unsupported color mode " + str(mode))
+
+    shapes = []
+    shape_names = []
+    for file_name in sorted(os.listdir(input_folder)):
+        path = os.path.join(input_folder, file_name)
+        name, extension = os.path.splitext(file_name)
+        if extension.lower() not in IMAGE_EXTENSIONS or not os.path.isfile(path):
+            continue
+
+        shapes.append(load_shape(path, cache_folder, threshold, mode))
+        shape_names.append(name)
+    return shapes, shape_names
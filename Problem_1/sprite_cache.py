@@ -0,0 +1,186 @@
+"""This is the sprite_cache script of Problem 1
+
+Provides a cache of pre-augmented shape images (sprites) for gen_images.py:
+i) The random scaling factor and rotation angle of a placement attempt are
+   quantized into bins, and the sprite of every (shape, scale bin, angle bin)
+   is rendered only once.
+ii) The cache is bounded in memory. When the bound is reached, the least
+    recently used sprite is dropped.
+iii) Vectorized binning and a table of sprite sizes per bin let the batch
+     placement of gen_images.py test candidates before any sprite is rendered.
+iv) Sprites are read-only NumPy arrays in the color mode of the shape, they
+    are drawn onto the background image directly without a conversion or copy.
+v) The cache only holds picklable data, so it can be built once in the main
+    process and handed to every worker of the process pool.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SpriteCache:
+
+    """Helper Method : Initialisation of the sprite cache
+
+    Args: transform : Function (img, scaling_factor, angle) -> augmented sprite (NumPy array)
+          scale_range : (lowest, highest) scaling factor
+          angle_range : (lowest, highest) rotation angle in degrees
+          scale_bins : Number of scaling factor bins
+          angle_bins : Number of rotation angle bins
+          max_bytes : Upper bound of the memory used by the cached sprites
+    Returns : None
+
+    """
+    def __init__(self, transform, scale_range=(0.75, 1), angle_range=(0, 90),
+                 scale_bins=8, angle_bins=90, max_bytes=64 * 1024 * 1024):
+        if scale_bins < 1 or angle_bins < 1:
+            raise ValueError("scale_bins and angle_bins must be at least 1")
+
+        self.transform = transform
+        self.scale_range = scale_range
+        self.angle_range = angle_range
+        self.scale_bins = scale_bins
+        self.angle_bins = angle_bins
+        self.max_bytes = max_bytes
+
+        self.bases = {}
+        self.size_tables = {}
+        self.sprites = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    """Helper Method : Bin of a value and the value at the centre of that bin
+
+    Args: value : Value to quantize
+          value_range : (lowest, highest) value
+          bins : Number of bins
+    Returns : (bin number, centre value of the bin)
+
+    """
+    @staticmethod
+    def _quantize(value, value_range, bins):
+        low, high = value_range
+        width = (high - low) / bins
+        bin_number = min(max(int((value - low) / width), 0), bins - 1)
+        return bin_number, low + (bin_number + 0.5) * width
+
+    """Helper Method : Rotation angle that augment() uses for the given angle
+
+    Args: angle : Random rotation angle in degrees
+    Returns : Angle at the centre of its bin
+
+    """
+    def angle_value(self, angle):
+        return self._quantize(angle, self.angle_range, self.angle_bins)[1]
+
+    """Helper Method : Normalised base image of a shape, resized only once per shape
+
+    Args: shape_id : Key of the shape, stable across frames and processes
+          img : Cropped PIL image of the shape
+          size : Normalised size of the shape
+    Returns : Resized PIL image
+
+    """
+    def base(self, shape_id, img, size=(50, 50)):
+        base_img = self.bases.get(shape_id)
+        if base_img is None:
+            base_img = img.resize(size)
+            self.bases[shape_id] = base_img
+        return base_img
+
+    """Helper Method : Augmented sprite for the bins of the given scaling factor and angle
+
+    Args: shape_id : Key of the shape, base() must have been called for it
+          scaling_factor : Random scaling factor
+          angle : Random rotation angle in degrees
+    Returns : Augmented sprite (NumPy array)
+
+    """
+    def augment(self, shape_id, scaling_factor, angle):
+        scale_bin, scale_value = self._quantize(scaling_factor, self.scale_range, self.scale_bins)
+        angle_bin, angle_value = self._quantize(angle, self.angle_range, self.angle_bins)
+        key = (shape_id, scale_bin, angle_bin)
+
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        sprite = self.transform(self.bases[shape_id], scale_value, angle_value)
+        self._store(key, sprite)
+        return sprite
+
+    """Helper Method : Adds a sprite and evicts the least recently used ones above the memory bound
+
+    Args: key : (shape_id, scale bin, angle bin)
+          sprite : Augmented sprite (NumPy array)
+    Returns : None
+
+    """
+    def _store(self, key, sprite):
+        if sprite.nbytes > self.max_bytes:
+            return
+
+        self.sprites[key] = sprite
+        self.used_bytes += sprite.nbytes
+
+        while self.used_bytes > self.max_bytes:
+            _, evicted = self.sprites.popitem(last=False)
+            self.used_bytes -= evicted.nbytes
+
+    """Helper Method : Vectorized bins of arrays of scaling factors and angles, same binning as augment()
+
+    Args: scaling_factors : NumPy array of random scaling factors
+          angles : NumPy array of random rotation angles in degrees
+    Returns : (scale bin array, angle bin array)
+
+    """
+    def bins(self, scaling_factors, angles):
+        scale_low, scale_high = self.scale_range
+        angle_low, angle_high = self.angle_range
+        scale_width = (scale_high - scale_low) / self.scale_bins
+        angle_width = (angle_high - angle_low) / self.angle_bins
+
+        scale_bins = np.clip(((scaling_factors - scale_low) / scale_width).astype(int), 0, self.scale_bins - 1)
+        angle_bins = np.clip(((angles - angle_low) / angle_width).astype(int), 0, self.angle_bins - 1)
+        return scale_bins, angle_bins
+
+    """Helper Method : Table of the (width, height) of the sprite of every bin of a shape
+
+    Args: shape_id : Key of the shape, base() must have been called for it
+    Returns : NumPy array of shape (scale_bins, angle_bins, 2)
+
+    """
+    def size_table(self, shape_id):
+        table = self.size_tables.get(shape_id)
+        if table is None:
+            scale_low, scale_high = self.scale_range
+            angle_low, angle_high = self.angle_range
+            scale_width = (scale_high - scale_low) / self.scale_bins
+            angle_width = (angle_high - angle_low) / self.angle_bins
+
+            table = np.zeros((self.scale_bins, self.angle_bins, 2), dtype=int)
+            for scale_bin in range(0, self.scale_bins):
+                for angle_bin in range(0, self.angle_bins):
+                    sprite = self.augment(shape_id, scale_low + (scale_bin + 0.5) * scale_width,
+                                          angle_low + (angle_bin + 0.5) * angle_width)
+                    table[scale_bin, angle_bin] = (sprite.shape[1], sprite.shape[0])
+            self.size_tables[shape_id] = table
+        return table
+
+    """Helper Method : Renders the sprites of every bin of the given shapes in advance
+
+    Args: shapes : list of cropped PIL images, the list index is used as shape_id
+    Returns : None
+
+    """
+    def warm(self, shapes):
+        for shape_id, shape in enumerate(shapes):
+            self.base(shape_id, shape)
+            self.size_table(shape_id)
+
+    def __len__(self):
+        return len(self.sprites)
@@ -0,0 +1,127 @@
+"""This is the test_gen_images script
+
+Host tests of the placement and the output of gen_images.py with the shapes
+of input_images/ and fixed seeds, run with "python test_gen_images.py" or
+with pytest:
+i) The sequential placement with the grid index places exactly the shapes of
+   the linear scan and draws the same image.
+ii) The batch placement never places overlapping shapes, and with
+    overlap_index "mask" no two shapes share a pixel.
+iii) A run that was killed and continued with --resume writes the same image
+     files, annotations and manifest, byte for byte, as a run that was not
+     interrupted, without writing the completed images again.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from gen_images import build_parser, do_rectangles_overlap, main, render_image, sprite_mask
+from shape_assets import load_shapes
+
+INPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_images")
+DIMENSIONS = (256, 256)
+SEEDS = [3, 17, 2024]
+
+
+def load_test_shapes():
+    return load_shapes(INPUT_FOLDER)[0]
+
+
+def rectangles(positions):
+    return [(x, y, x + sprite.shape[1], y + sprite.shape[0]) for x, y, sprite, *_ in positions]
+
+
+def test_grid_matches_scan():
+    shapes = load_test_shapes()
+    for seed in SEEDS:
+        grid_image, grid_positions = render_image(shapes, DIMENSIONS, seed, "grid", placement="sequential")
+        scan_image, scan_positions = render_image(shapes, DIMENSIONS, seed, "scan", placement="sequential")
+        assert [(x, y, shape_id, angle) for x, y, sprite, shape_id, angle in grid_positions] == \
+               [(x, y, shape_id, angle) for x, y, sprite, shape_id, angle in scan_positions]
+        assert np.array_equal(grid_image, scan_image)
+
+
+def test_batch_placement_does_not_overlap():
+    shapes = load_test_shapes()
+    for seed in SEEDS:
+        image, positions = render_image(shapes, DIMENSIONS, seed)
+        rects = rectangles(positions)
+        assert len(rects) >= 5
+        for i in range(0, len(rects)):
+            for j in range(i + 1, len(rects)):
+                assert not do_rectangles_overlap(rects[i], rects[j])
+
+
+def test_mask_shapes_share_no_pixel():
+    shapes = load_test_shapes()
+    for seed in SEEDS:
+        image, positions = render_image(shapes, DIMENSIONS, seed, "mask")
+        covered = np.zeros((DIMENSIONS[1], DIMENSIONS[0]), dtype=np.int64)
+        for x, y, sprite, *_ in positions:
+            covered[y : y + sprite.shape[0], x : x + sprite.shape[1]] += sprite_mask(sprite)
+        assert covered.max() == 1
+        #Shapes of the mask index can share the area of their rectangles
+        rects = rectangles(positions)
+        assert any(do_rectangles_overlap(rects[i], rects[j])
+                   for i in range(0, len(rects)) for j in range(i + 1, len(rects)))
+
+
+"""Helper Method to run gen_images.main
+
+    Args: output_folder : Output folder of the run
+          options : Further command line options
+    Returns : None
+
+"""
+def run(output_folder, *options):
+    main(build_parser().parse_args(["--input", INPUT_FOLDER, "--output", output_folder, "--dimensions", "128", "128",
+                                    "--num-images", "5", "--seed", "7", "--no-asset-cache", *options]))
+
+
+def read_files(folder):
+    contents = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            contents[name] = f.read()
+    return contents
+
+
+def test_resume_is_byte_identical():
+    with tempfile.TemporaryDirectory() as complete, tempfile.TemporaryDirectory() as killed:
+        run(complete)
+        run(killed)
+
+        #The run is killed while the fourth image is written : images 3 and 4 are missing,
+        #the manifest and the annotations end with a cut line
+        for name in ("Output_Image_3.png", "Output_Image_4.png"):
+            os.remove(os.path.join(killed, name))
+        for name in ("manifest.jsonl", "annotations.jsonl"):
+            path = os.path.join(killed, name)
+            with open(path) as f:
+                lines = f.readlines()
+            with open(path, "w") as f:
+                f.writelines(lines[:3])
+                f.write(lines[3][: len(lines[3]) // 2])
+        written = {name: os.stat(os.path.join(killed, name)).st_mtime_ns
+                   for name in ("Output_Image_0.png", "Output_Image_1.png", "Output_Image_2.png")}
+
+        run(killed, "--resume")
+        assert read_files(killed) == read_files(complete)
+        assert all(os.stat(os.path.join(killed, name)).st_mtime_ns == mtime for name, mtime in written.items())
+
+
+if __name__ == "__main__":
+    tests = [(name, function) for name, function in sorted(globals().items()) if name.startswith("test_")]
+    failures = 0
+    for name, function in tests:
+        try:
+            function()
+            print(f"{name} : passed")
+        except AssertionError as e:
+            failures += 1
+            print(f"{name} : FAILED {e}")
+    print(f"All {len(tests)} tests passed" if failures == 0 else f"{failures} tests FAILED")
+    sys.exit(1 if failures else 0)
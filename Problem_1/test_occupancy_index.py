@@ -0,0 +1,164 @@
+"""This is the test_occupancy_index script
+
+Host tests of occupancy_index.py and of the batch placement round of
+gen_images.py with fixed seeds, run with "python test_occupancy_index.py" or
+with pytest:
+i) OccupancyGrid and BatchOccupancyGrid find the same overlaps as a scan of
+   every placed rectangle with do_rectangles_overlap, also while the arrays of
+   BatchOccupancyGrid grow and after clear().
+ii) BatchOccupancyGrid.conflicts finds every overlapping pair of candidates.
+iii) place_round accepts the same candidates as the greedy scan of add_obj : a
+     candidate is accepted unless it overlaps a placed shape or an accepted
+     candidate before it.
+iv) PixelOccupancy finds an overlap only when two masks share a pixel, at any
+    bit offset, like a plain bool bitmap, and not for overlapping rectangles
+    with disjoint pixels.
+"""
+
+import sys
+
+import numpy as np
+from PIL import Image
+
+from gen_images import augmented_sizes, do_rectangles_overlap, max_augmented_size, place_round
+from occupancy_index import BatchOccupancyGrid, OccupancyGrid, PixelOccupancy
+
+SEED = 1234
+WIDTH = HEIGHT = 300
+
+
+"""Helper Method to draw random rectangles that start on the canvas
+
+    Args: rng : NumPy random generator
+          count : Number of rectangles
+          max_size : Largest width and height
+    Returns : int NumPy array of shape (count, 4), rows of (x1, y1, x2, y2)
+
+"""
+def random_boxes(rng, count, max_size=80):
+    xs = rng.integers(0, WIDTH, count)
+    ys = rng.integers(0, HEIGHT, count)
+    sizes = rng.integers(0, max_size, (count, 2))
+    return np.stack([xs, ys, xs + sizes[:, 0], ys + sizes[:, 1]], axis=1).astype(np.int64)
+
+
+def scan(rect, placed):
+    return any(do_rectangles_overlap(rect, tuple(p)) for p in placed)
+
+
+def test_grid_matches_scan():
+    rng = np.random.default_rng(SEED)
+    grid = OccupancyGrid(WIDTH, HEIGHT)
+    placed = []
+    for rect in random_boxes(rng, 400):
+        rect = tuple(int(v) for v in rect)
+        assert grid.overlaps(rect) == scan(rect, placed)
+        if not grid.overlaps(rect) or rng.random() < 0.1:
+            grid.insert(rect)
+            placed.append(rect)
+    assert len(grid) == len(placed)
+
+
+def test_batch_grid_matches_scan():
+    rng = np.random.default_rng(SEED)
+    #Small arrays, so the rectangles and the cell slots grow during the test
+    grid = BatchOccupancyGrid(WIDTH, HEIGHT, capacity=4, depth=1)
+    for image in range(0, 2):
+        placed = []
+        for round_number in range(0, 20):
+            boxes = random_boxes(rng, 30)
+            expected = [scan(box, placed) for box in boxes]
+            assert grid.overlaps_many(boxes).tolist() == expected
+            grid.insert_many(boxes[:5])
+            placed.extend(boxes[:5])
+        assert len(grid) == len(placed)
+        grid.clear()
+        assert len(grid) == 0 and not grid.overlaps_many(random_boxes(rng, 10)).any()
+
+
+def test_conflicts_finds_every_pair():
+    rng = np.random.default_rng(SEED)
+    grid = BatchOccupancyGrid(WIDTH, HEIGHT)
+    for round_number in range(0, 10):
+        boxes = random_boxes(rng, 60)
+        earlier, later = grid.conflicts(boxes)
+        expected = {(i, j) for i in range(0, len(boxes)) for j in range(i + 1, len(boxes))
+                    if do_rectangles_overlap(boxes[i], boxes[j])}
+        assert set(zip(earlier.tolist(), later.tolist())) == expected
+
+
+def test_place_round_matches_greedy_scan():
+    img = Image.new("L", (50, 50))
+    #Same position range as add_obj_batch
+    max_x = max_y = WIDTH - max_augmented_size(50, 50)
+    grid = BatchOccupancyGrid(WIDTH, HEIGHT, capacity=8, depth=2)
+    placed = [tuple(box) for box in random_boxes(np.random.default_rng(SEED), 3)]
+    grid.insert_many(np.array(placed, dtype=np.int64))
+    for round_number in range(0, 6):
+        seed = SEED + round_number
+        accepted = place_round(grid, img, max_x, max_y, np.random.default_rng(seed), 60)
+
+        #The candidates of the round, drawn like place_round does
+        rng = np.random.default_rng(seed)
+        xs = rng.integers(0, max_x + 1, 60)
+        ys = rng.integers(0, max_y + 1, 60)
+        widths, heights = augmented_sizes(50, 50, rng.uniform(0.75, 1, 60), rng.uniform(0, 90, 60))
+        expected = []
+        for i in range(0, 60):
+            box = (int(xs[i]), int(ys[i]), int(xs[i] + widths[i]), int(ys[i] + heights[i]))
+            if not scan(box, placed):
+                placed.append(box)
+                expected.append((i,) + box)
+
+        assert [(i, x, y, x + width, y + height) for i, x, y, s, a, width, height in accepted] == expected
+        grid.insert_many(np.array([box[1:] for box in expected], dtype=np.int64).reshape(-1, 4))
+
+
+def test_pixel_mask_matches_bitmap():
+    rng = np.random.default_rng(SEED)
+    occupancy = PixelOccupancy(WIDTH, HEIGHT)
+    bitmap = np.zeros((HEIGHT, WIDTH), dtype=bool)
+    placed = 0
+    for attempt in range(0, 300):
+        height, width = rng.integers(1, 40, 2)
+        mask = rng.random((height, width)) < 0.4
+        x = int(rng.integers(0, WIDTH - width + 1))
+        y = int(rng.integers(0, HEIGHT - height + 1))
+        rect = (x, y, x + width, y + height)
+        expected = bool((bitmap[y : y + height, x : x + width] & mask).any())
+        assert occupancy.overlaps(rect, mask) == expected
+        if not expected:
+            occupancy.insert(rect, mask)
+            bitmap[y : y + height, x : x + width] |= mask
+            placed += 1
+    assert len(occupancy) == placed and placed > 10
+
+
+def test_pixel_mask_ignores_bounding_box():
+    #Two triangles in the same square, one below and one above the diagonal
+    lower = np.tril(np.ones((20, 20), dtype=bool))
+    upper = np.triu(np.ones((20, 20), dtype=bool), 1)
+    for x in (0, 3, 8, 13):
+        occupancy = PixelOccupancy(64, 64)
+        grid = OccupancyGrid(64, 64)
+        rect = (x, 5, x + 20, 25)
+        occupancy.insert(rect, lower)
+        grid.insert(rect)
+        assert grid.overlaps(rect)
+        assert not occupancy.overlaps(rect, upper)
+        #One row lower, the diagonal of the upper triangle covers the lower one
+        assert occupancy.overlaps((x, 6, x + 20, 26), upper)
+
+
+if __name__ == "__main__":
+    tests = [(name, function) for name, function in sorted(globals().items()) if name.startswith("test_")]
+    failures = 0
+    for name, function in tests:
+        try:
+            function()
+            print(f"{name} : passed")
+        except AssertionError as e:
+            failures += 1
+            print(f"{name} : FAILED {e}")
+    print(f"All {len(tests)} tests passed" if failures == 0 else f"{failures} tests FAILED")
+    sys.exit(1 if failures else 0)
@@ -9,14 +9,32 @@ iii) Displays the format at which the input angle needs to be provided and ignor
 the invalid inputs are provided. 
 iv) This script does not break and not breaks Raspberry Pi Pico even if any random invalid input provided.
 v) Consists of good exception handling mechanism.
+vi) The port of the Pico is found by its USB vendor and product id on Linux too and
+cached between launches, see serial_session.py. The connection is kept open by a
+SerialSession, which reconnects automatically when the Pico is unplugged or restarted.
+vii) --port accepts a port name or pyserial URL (e.g. the pty of a simulator or loop://)
+and --usb-id other USB ids to discover.
+viii) --batch FILE (- for stdin) reads a sequence of angle commands, validates all of them
+before anything is sent and streams them with flow control: up to --window commands (at
+most 128, half the 8 bit sequence numbers) are outstanding, the next one is sent as soon
+as the Pico acknowledges a completed move.
+The fixed sleep after every command is replaced by waiting for the acknowledgement.
+ix) The angles are sent as frames of uart_protocol.py with a sequence number and a CRC,
+the Pico answers with ACK/NACK frames. Commands that the Pico never completed (a corrupted
+frame) are reported as lost and are not sent again, so no move is executed twice.
 
 """
 
+import argparse
 import os
 import sys
 import time
 import serial as pyserial
 import re
+from collections import deque
+
+import uart_protocol
+from serial_session import PICO_USB_IDS, PortCache, SerialSession, discover_port, parse_usb_id
 
 
 """Helper Method to check if special characters exist in the input
@@ -35,34 +53,187 @@ def check_special_characters(data):
         return False
 
 
-"""Helper Method to detect the serial port to which Raspberry Pi is connected and automatically detects
-whether it is Linux system or Windows System.
+"""Helper Method to validate an angle command in the format the Pico parses
+
+    Args: angle : input string, e.g. "+45 deg"
+    Returns : None if the command is valid, otherwise the reason why it is invalid
+
+"""
+def check_angle_command(angle):
+    if angle.find(' deg') == -1:
+        return "Invalid input, Re-enter the value in the format : angle deg."
+    if angle.find('.') >= 0:
+        return "Invalid input. Float values cannot be provided. Re-enter the value in the format angle deg."
+    if check_special_characters(angle) == False:
+        return "Invalid input, Re-enter the value in the format : angle deg."
+    #The Pico reads a command up to the 'g' of deg and splits it at the only space
+    if re.fullmatch(r'[+-]?[0-9]+ deg', angle) is None:
+        return "Invalid input, Re-enter the value in the format : angle deg."
+    return None
+
+
+"""Helper Method to read and validate all angle commands of a batch before any of them is sent
+
+    Args: lines : Iterable of lines, blank lines and lines starting with # are skipped
+    Returns : (list of commands, list of (line number, line, reason) of the invalid lines)
+
+"""
+def read_batch(lines):
+    commands = []
+    errors = []
+    for line_number, line in enumerate(lines, 1):
+        angle = line.strip()
+        if not angle or angle.startswith('#'):
+            continue
+        reason = check_angle_command(angle)
+        if reason is None:
+            commands.append(angle)
+        else:
+            errors.append((line_number, angle, reason))
+    return commands, errors
+
+
+"""Helper Method to get the angle of a validated angle command
+
+    Args: angle : Angle command, e.g. "+45 deg"
+    Returns : Angle
+
+"""
+def command_angle(angle):
+    return int(angle.split(' ')[0])
+
+
+"""Helper Method to wait for the next reply frame of the Pico, other output is skipped
+
+    Args: ser : SerialSession or Serial instance
+          decoder : uart_protocol.FrameDecoder of the connection
+          replies : deque of the frames decoded but not yet handled, kept between calls
+          timeout : Seconds to wait for a reply
+    Returns : (command, sequence, payload) or None on timeout
+
+"""
+def wait_for_reply(ser, decoder, replies, timeout):
+    deadline = time.monotonic() + timeout
+    while not replies:
+        if time.monotonic() > deadline:
+            return None
+        replies.extend(decoder.feed(ser.read(max(ser.in_waiting, 1))))
+    return replies.popleft()
+
+
+class CommandLink:
+
+    """Helper Method : Initialisation of the state of a connection that is kept between commands.
+    Interactive commands are streamed one at a time with the same frame decoder and a running
+    sequence number, so a late reply to an earlier command is not taken for the reply to the
+    current one, and the bytes of a frame that is still arriving are kept
+
+    Args: None
+    Returns : None
 
-    Args:  
+    """
+    def __init__(self):
+        self.decoder = uart_protocol.FrameDecoder()
+        self.replies = deque()
+        self.sequence = 0
+
+
+"""Helper Method to stream angle commands with flow control by acknowledgements
+
+The Pico handles the commands in the order they are sent, so when a command
+is completed, every command sent before it that is still outstanding was lost,
+and a NACK of a corrupted frame belongs to the first command not accepted yet.
+
+    Args: ser : SerialSession or Serial instance
+          commands : list of valid angle commands
+          window : Maximum number of commands sent but not yet completed
+          ack_timeout : Seconds to wait for a reply before giving up
+          link : Optional CommandLink of the connection, its decoder, pending replies and
+                 sequence number are used and updated. A new one is used if it is None
+    Returns : Dictionary with the number of sent and completed commands, the rejected
+              and lost commands, the number of link errors and the seconds taken
+    Raises : TimeoutError if no reply arrives within ack_timeout
+             ValueError if window is not between 1 and 128
+
+"""
+def stream_commands(ser, commands, window=4, ack_timeout=30, link=None):
+    if window < 1 or window > 128:
+        raise ValueError("window must be between 1 and 128")
+    start = time.monotonic()
+    link = link or CommandLink()
+    decoder = link.decoder
+    replies = link.replies
+    decoder_errors = decoder.errors
+    outstanding = deque()
+    accepted = set()
+    completed = 0
+    rejected = []
+    lost = []
+    link_errors = 0
+    next_command = 0
+
+    while next_command < len(commands) or outstanding:
+        #Fill the window, the frames are written in one go
+        burst = bytearray()
+        while next_command < len(commands) and len(outstanding) < window:
+            sequence = link.sequence
+            link.sequence = (link.sequence + 1) & 0xFF
+            outstanding.append((sequence, commands[next_command]))
+            burst += uart_protocol.encode_move(sequence, command_angle(commands[next_command]))
+            next_command += 1
+        if burst:
+            ser.write(burst)
+
+        reply = wait_for_reply(ser, decoder, replies, ack_timeout)
+        if reply is None:
+            raise TimeoutError(f"No reply for {outstanding[0][1]!r} within {ack_timeout} s")
+        command, sequence, payload = reply
+
+        if command == uart_protocol.CMD_ACK:
+            status, steps = uart_protocol.decode_ack(payload)
+            if all(sequence != s for s, _ in outstanding):
+                continue
+            if status != uart_protocol.STATUS_DONE:
+                accepted.add(sequence)
+                continue
+            while outstanding[0][0] != sequence:
+                lost.append(outstanding.popleft()[1])
+            outstanding.popleft()
+            accepted.discard(sequence)
+            completed += 1
+        elif command == uart_protocol.CMD_NACK:
+            #The sequence number of a corrupted frame cannot be trusted. The Pico answers
+            #the frames in order, so it is the first command that was not accepted yet
+            if payload[0] in (uart_protocol.ERR_CRC, uart_protocol.ERR_LENGTH):
+                link_errors += 1
+                for i, (s, angle) in enumerate(outstanding):
+                    if s not in accepted:
+                        del outstanding[i]
+                        lost.append(angle)
+                        break
+            else:
+                #A rejected command can be anywhere in the window, the commands before it still run
+                for i, (s, angle) in enumerate(outstanding):
+                    if s == sequence:
+                        del outstanding[i]
+                        accepted.discard(sequence)
+                        rejected.append(angle)
+                        break
+
+    return {"sent": next_command, "completed": completed, "rejected": rejected, "lost": lost,
+            "link_errors": link_errors + decoder.errors - decoder_errors, "seconds": time.monotonic() - start}
+
+
+"""Helper Method to detect the serial port to which Raspberry Pi is connected, on Linux and Windows
+the port is found by the USB id of the Pico and cached between launches.
+
+    Args: usb_ids : list of (vendor id, product id) of the Pico
+          use_cache : Use the cached port of a previous launch
     Returns : Port number or None 
         
 """
-def detect_serial_port():
-    system_platform = sys.platform
-    serial_ports = []
-
-     # Detect serial ports based on the operating system
-    if 'linux' in system_platform:
-        serial_ports = ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyACM2" , "/dev/ttyACM3", "/dev/ttyACM4", "/dev/ttyACM5", "/dev/ttyUSB0", "/dev/ttyUSB1"]
-    elif 'win' in system_platform:
-        import serial.tools.list_ports
-        ports = list(serial.tools.list_ports.comports())
-        serial_ports = [port.device for port in ports]
-
-     # Check each serial port for connectivity
-    for port in serial_ports:
-        try:
-            with pyserial.Serial(port, 9600, timeout=1):
-                return port
-        except (OSError, pyserial.SerialException):
-            pass
-
-    return None
+def detect_serial_port(usb_ids=PICO_USB_IDS, use_cache=True):
+    return discover_port(usb_ids, PortCache() if use_cache else None)
 
 
 """main function to detect the serial port to which Raspberry Pi is connected and send the user input request to Raspberry Pi
@@ -70,37 +241,85 @@ Pico to drive the stepper motor accurately.
 """
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", help="Port name or pyserial URL, the port is detected if not given")
+    parser.add_argument("--usb-id", action="append", type=parse_usb_id,
+                        help="USB id VID:PID (hexadecimal) of the device, can be repeated")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the cached port")
+    parser.add_argument("--batch", help="File with one angle command per line, - for stdin")
+    parser.add_argument("--window", type=int, default=4,
+                        help="Maximum number of commands sent to the device but not yet acknowledged")
+    parser.add_argument("--ack-timeout", type=float, default=30,
+                        help="Seconds to wait for the device to acknowledge a command")
+    args = parser.parse_args()
+
+    #Sequence numbers are 8 bit, a larger window would reuse the number of an outstanding command
+    if not 1 <= args.window <= 128 or args.ack_timeout <= 0:
+        print("--window must be between 1 and 128 and --ack-timeout positive")
+        exit()
+
+    #All commands of a batch are validated before the port is opened
+    batch = None
+    if args.batch is not None:
+        if args.batch == '-':
+            batch, errors = read_batch(sys.stdin)
+        else:
+            with open(args.batch) as f:
+                batch, errors = read_batch(f)
+        for line_number, angle, reason in errors:
+            print(f"Line {line_number} : {angle!r} : {reason}")
+        if errors:
+            print(f"{len(errors)} invalid commands, nothing is sent")
+            exit()
+
+    usb_ids = args.usb_id or PICO_USB_IDS
+
     # Detect the serial port
-    port = detect_serial_port()
+    port = args.port or detect_serial_port(usb_ids, not args.no_cache)
     print("Detected port :", port)    
 
 
     if port:
-        # Establish a serial connection
-        with pyserial.Serial(port, 9600) as ser:
+        # Establish a serial connection, it is reopened if the Pico is reconnected
+        session = SerialSession(None if args.port is None else port, args.baudrate, usb_ids=usb_ids,
+                                cache=None if args.no_cache else PortCache())
+        with session as ser:
             try:
+                if batch is not None:
+                    result = stream_commands(ser, batch, args.window, args.ack_timeout)
+                    seconds = max(result["seconds"], 1e-9)
+                    print(f"Sent {result['sent']} commands in {seconds:.2f} s ({result['sent'] / seconds:.1f} commands/s), "
+                          f"{result['completed']} completed, {len(result['rejected'])} rejected, "
+                          f"{len(result['lost'])} lost, {result['link_errors']} link errors")
+                    for command in result["rejected"]:
+                        print("Rejected by the device :", command)
+                    for command in result["lost"]:
+                        print("Lost on the link, not executed :", command)
+                    return
+
+                #One decoder and sequence counter for the whole session
+                link = CommandLink()
                 while True:
                     # Get user input for the angle
-                    angle = input('Enter the value in the format : angle deg. e.g: 45 deg = +45, -45 deg = -45 \n')
-                    pos = angle.find(' deg')
-                    float_pos = angle.find('.')
-                    print(pos)
-                    if pos == -1:
-                        print ("Invalid input, Re-enter the value in the format : angle deg.")
-                        continue
-                    if float_pos >= 0:
-                        print ("Invalid input. Float values cannot be provided. Re-enter the value in the format angle deg.")
-                        continue
-                    if check_special_characters(angle) == False:
-                        print ("Invalid input, Re-enter the value in the format : angle deg.")
+                    try:
+                        angle = input('Enter the value in the format : angle deg. e.g: 45 deg = +45, -45 deg = -45 \n')
+                    except EOFError:
+                        break
+                    reason = check_angle_command(angle)
+                    if reason is not None:
+                        print(reason)
                         continue
                     print("Sending angle:", angle)
-                     # Send the input value over UART
-                    ser.write(angle.encode())  # send the input value over UART
-                    print("Value is sent to the device")
-                    time.sleep(0.5)
 
-            except pyserial.SerialException as e:
+                    #Wait until the Pico has completed the move instead of a fixed sleep
+                    result = stream_commands(ser, [angle], 1, args.ack_timeout, link)
+                    if result["completed"]:
+                        print("Value is sent to the device")
+                    else:
+                        print("The device rejected the value")
+
+            except (TimeoutError, pyserial.SerialException) as e:
                 print('An Exception Occurred')
                 print('Exception Details ->', e)
     else:
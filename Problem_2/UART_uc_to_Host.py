@@ -7,6 +7,12 @@ i) Provides member function to wait for serial input
 ii) Exception handling is done to ensure the script does
     not break and still coninues to keep system stable
     and wait for user input
+iii) Provides member functions to receive the framed commands of
+     uart_protocol.py and to send their ACK/NACK replies. A command is
+     read with reads of known size and acknowledged as soon as its
+     CRC is checked. receive_command is the same for a uasyncio task, so
+     the Pico receives the next commands while a move runs. Moves larger
+     than max_angle are rejected with a NACK ERR_PAYLOAD
 
 """
 
@@ -14,18 +20,27 @@ from machine import Pin,UART
 import time
 import select
 import sys
+import uart_protocol
 
 class serial_io:
     
     
     """Helper Method : UART initialisations of serial_io
 
-    Args: None  
+    Args: max_angle : Largest angle of a move in degrees, a larger move is answered with a NACK ERR_PAYLOAD  
     Returns : None
         
     """
-    def __init__(self):
+    def __init__(self, max_angle=36000):
         self.uart = UART(1, baudrate=9600)
+        self.max_angle = max_angle
+        
+        #Frames are binary, a 0x03 byte must not raise KeyboardInterrupt
+        try:
+            import micropython
+            micropython.kbd_intr(-1)
+        except ImportError:
+            pass
 
     
     """Helper Method : Parser is written to parse the input angle and unit_marker
@@ -57,13 +72,74 @@ class serial_io:
                 print("UART_uc_to_Host::wait_for_input - Invalid unit marker:", unit_marker)
                 return "Invalid Input"
         except ValueError:
-            print('UART_uc_to_Host::wait_for_input - Invalid data format:', received_data)
+            print('UART_uc_to_Host::wait_for_input - Invalid data format:', input_str)
             return "Invalid Input"
         
         time.sleep(1)
         return input_str
         
         
+    """Helper Method : Waits for the next framed command and acknowledges it
+
+    Args: None  
+    Returns : (sequence, angle) of a CMD_MOVE, None if the frame was rejected or a CMD_PING
+        
+    """
+    def wait_for_command(self):
+        try:
+            return self.accept_frame(*uart_protocol.read_frame(sys.stdin.buffer.read))
+        except uart_protocol.FrameError as e:
+            self.send_frame(uart_protocol.encode_nack(e.sequence, e.error))
+            return None
+    
+    
+    """Helper Method : Waits for the next framed command in a uasyncio task and acknowledges it,
+                       the other tasks run while the frame is received
+
+    Args: reader : uasyncio.StreamReader of sys.stdin.buffer  
+    Returns : (sequence, angle) of a CMD_MOVE, None if the frame was rejected or a CMD_PING
+        
+    """
+    async def receive_command(self, reader):
+        try:
+            return self.accept_frame(*(await uart_protocol.read_frame_async(reader.readexactly)))
+        except uart_protocol.FrameError as e:
+            self.send_frame(uart_protocol.encode_nack(e.sequence, e.error))
+            return None
+    
+    
+    """Helper Method : Checks a received frame and acknowledges it, a CMD_PING is answered at once
+
+    Args: command, sequence, payload : Frame of uart_protocol.read_frame  
+    Returns : (sequence, angle) of a CMD_MOVE, None for a CMD_PING
+    Raises : uart_protocol.FrameError ERR_COMMAND or ERR_PAYLOAD
+        
+    """
+    def accept_frame(self, command, sequence, payload):
+        if command == uart_protocol.CMD_PING:
+            self.send_frame(uart_protocol.encode_ack(sequence, uart_protocol.STATUS_DONE))
+            return None
+        if command != uart_protocol.CMD_MOVE:
+            raise uart_protocol.FrameError(uart_protocol.ERR_COMMAND, sequence)
+        angle = uart_protocol.decode_move(payload, sequence)
+        #The steps of the move must fit the step engine and the planning memory
+        if abs(angle) > self.max_angle:
+            raise uart_protocol.FrameError(uart_protocol.ERR_PAYLOAD, sequence)
+        
+        self.send_frame(uart_protocol.encode_ack(sequence, uart_protocol.STATUS_ACCEPTED))
+        return sequence, angle
+    
+    
+    """Helper Method : Sends a frame to Host system
+
+    Args: frame : Encoded frame  
+    Returns : None
+        
+    """ 
+    def send_frame(self, frame):
+        sys.stdout.buffer.write(frame)
+        
+        
     """Helper Method : Sends data to Host system
 
     Args: data  
@@ -0,0 +1,329 @@
+"""This is the async_host script
+
+asyncio client of the Raspberry Pi Pico, it overlaps sending commands with
+receiving replies and telemetry instead of serialising them:
+i) A reader task decodes the frames of uart_protocol.py as they arrive. It
+   completes the pending moves on their ACK/NACK and puts telemetry frames
+   into a bounded telemetry queue (the oldest record is dropped when nobody
+   consumes them).
+ii) A writer task takes moves from a bounded command queue and sends them as
+    long as fewer than window moves are in flight, so callers wait when the
+    queue is full instead of buffering without limit.
+iii) await client.move(angle) returns the number of steps when the Pico has
+     completed the move, it raises CommandRejected on a NACK and CommandLost
+     when the frame of the move was corrupted on the link. The Pico answers the
+     frames in order, so a corrupted frame is the first move in flight that was
+     not accepted yet when the NACK arrives.
+iv) Serial reads and writes run on two dedicated threads with pyserial, so
+    the client works with every port or pyserial URL of serial_session.py,
+    e.g. the pseudo terminal of pico_simulator.py.
+v) The CMD_TELEMETRY_BATCH records of the Pico are collected in a
+   telemetry_log.TelemetryLog when one is given (--telemetry-csv).
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import serial as pyserial
+
+import uart_protocol
+from serial_session import PICO_USB_IDS, PortCache, SerialSession
+from telemetry_log import TelemetryLog
+
+
+class CommandRejected(Exception):
+    pass
+
+
+class CommandLost(Exception):
+    pass
+
+
+class PicoClient:
+
+    """Helper Method : Initialisation of the client, the connection is opened by open() or async with
+
+    Args: port : Port name or pyserial URL, None to discover the port
+          baudrate : Baud rate of the UART
+          window : Maximum number of moves sent but not yet completed
+          queue_size : Size of the command queue
+          telemetry_size : Size of the telemetry queue
+          ack_timeout : Seconds to wait for a move to complete
+          telemetry_log : TelemetryLog for the CMD_TELEMETRY_BATCH records, None to skip them
+    Returns : None
+
+    """
+    def __init__(self, port=None, baudrate=9600, window=4, queue_size=64, telemetry_size=1024, ack_timeout=30,
+                 telemetry_log=None):
+        if window < 1 or window > 128:
+            raise ValueError("window must be between 1 and 128")
+
+        self.session = SerialSession(port, baudrate, timeout=0.05, usb_ids=PICO_USB_IDS,
+                                     cache=None if port else PortCache())
+        self.window = window
+        self.queue_size = queue_size
+        self.telemetry_size = telemetry_size
+        self.ack_timeout = ack_timeout
+        self.telemetry_log = telemetry_log
+        self.decoder = uart_protocol.FrameDecoder()
+        self.pending = OrderedDict()
+        self.accepted = set()
+        self.sequence = 0
+        self.telemetry_dropped = 0
+        self.link_errors = 0
+        self.tasks = []
+
+    """Helper Method : Opens the connection and starts the reader and writer tasks
+
+    Args: None
+    Returns : None
+
+    """
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.read_executor = ThreadPoolExecutor(1)
+        self.write_executor = ThreadPoolExecutor(1)
+        await loop.run_in_executor(self.write_executor, self.session.connect)
+
+        self.commands = asyncio.Queue(self.queue_size)
+        self.telemetry_queue = asyncio.Queue(self.telemetry_size)
+        self.in_flight = asyncio.Semaphore(self.window)
+        self.tasks = [asyncio.create_task(self._reader()), asyncio.create_task(self._writer())]
+
+    """Helper Method : Stops the tasks and closes the connection, pending moves are cancelled
+
+    Args: None
+    Returns : None
+
+    """
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for future, _ in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.read_executor.shutdown()
+        self.write_executor.shutdown()
+        self.session.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    """Helper Method : Moves the motor by an angle
+
+    Args: angle : Angle in degrees, negative angles rotate in the other direction
+    Returns : Number of steps of the completed move
+    Raises : CommandRejected, CommandLost or asyncio.TimeoutError
+
+    """
+    async def move(self, angle):
+        loop = asyncio.get_running_loop()
+        sent = loop.create_future()
+        future = loop.create_future()
+        await self.commands.put((int(angle), sent, future))
+
+        #The timeout starts when the move is sent, not while it waits in the queue
+        await sent
+        try:
+            return await asyncio.wait_for(future, self.ack_timeout)
+        except asyncio.TimeoutError:
+            #The window slot of a move that never completes is freed
+            for sequence, (pending_future, _) in list(self.pending.items()):
+                if pending_future is future:
+                    self._complete(sequence)
+            raise
+
+    """Helper Method : Waits for the next telemetry record
+
+    Args: None
+    Returns : Dictionary with ticks_ms, position and the values of the pins of uart_protocol.PIN_NAMES
+
+    """
+    async def telemetry(self):
+        return await self.telemetry_queue.get()
+
+    """Helper Method : Telemetry records as they arrive, for async for
+
+    Args: None
+    Returns : Asynchronous iterator of telemetry records
+
+    """
+    async def telemetry_stream(self):
+        while True:
+            yield await self.telemetry_queue.get()
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            angle, sent, future = await self.commands.get()
+            if sent.cancelled():
+                continue
+            await self.in_flight.acquire()
+
+            sequence = self.sequence & 0xFF
+            self.sequence += 1
+            self.pending[sequence] = (future, angle)
+            try:
+                await loop.run_in_executor(self.write_executor, self.session.write,
+                                           uart_protocol.encode_move(sequence, angle))
+            except (OSError, pyserial.SerialException) as e:
+                self._complete(sequence, exception=e)
+            sent.set_result(None)
+
+    async def _reader(self):
+        loop = asyncio.get_running_loop()
+        read = lambda: self.session.read(max(self.session.in_waiting, 1))
+        while True:
+            data = await loop.run_in_executor(self.read_executor, read)
+            for command, sequence, payload in self.decoder.feed(data):
+                self._dispatch(command, sequence, payload)
+
+    """Helper Method : Completes the pending move of a sequence number and frees its window slot
+
+    Args: sequence : Sequence number of the move
+          result : Result of the move
+          exception : Exception of the move instead of a result
+    Returns : None
+
+    """
+    def _complete(self, sequence, result=None, exception=None):
+        future, _ = self.pending.pop(sequence)
+        self.accepted.discard(sequence)
+        self.in_flight.release()
+        if future.done():
+            return
+        if exception is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exception)
+
+    def _dispatch(self, command, sequence, payload):
+        if command == uart_protocol.CMD_TELEMETRY:
+            ticks_ms, position, pins = uart_protocol.decode_telemetry(payload)
+            record = {"ticks_ms": ticks_ms, "position": position}
+            for i, name in enumerate(uart_protocol.PIN_NAMES):
+                record[name] = (pins >> i) & 1
+            if self.telemetry_queue.full():
+                self.telemetry_queue.get_nowait()
+                self.telemetry_dropped += 1
+            self.telemetry_queue.put_nowait(record)
+
+        elif command == uart_protocol.CMD_TELEMETRY_BATCH and self.telemetry_log is not None:
+            self.telemetry_log.feed(payload)
+
+        elif command == uart_protocol.CMD_ACK and sequence in self.pending:
+            status, steps = uart_protocol.decode_ack(payload)
+            if status != uart_protocol.STATUS_DONE:
+                self.accepted.add(sequence)
+                return
+            #The Pico handles the moves in order, moves sent before this one were lost
+            while next(iter(self.pending)) != sequence:
+                lost = next(iter(self.pending))
+                self._complete(lost, exception=CommandLost(self.pending[lost][1]))
+            self._complete(sequence, steps)
+
+        elif command == uart_protocol.CMD_NACK:
+            #The sequence number of a corrupted frame cannot be trusted. The Pico answers
+            #the frames in order, so it is the first move that was not accepted yet
+            if payload[0] in (uart_protocol.ERR_CRC, uart_protocol.ERR_LENGTH):
+                self.link_errors += 1
+                for lost in self.pending:
+                    if lost not in self.accepted:
+                        self._complete(lost, exception=CommandLost(self.pending[lost][1]))
+                        break
+            elif sequence in self.pending:
+                self._complete(sequence, exception=CommandRejected(self.pending[sequence][1]))
+
+
+"""Helper Method to run a sequence of moves while printing the telemetry
+
+    Args: client : Open PicoClient
+          angles : list of angles
+    Returns : Dictionary with the number of completed, rejected and lost moves, telemetry records and seconds
+
+"""
+async def run_moves(client, angles, show_telemetry=True):
+    start = time.monotonic()
+    records = 0
+
+    async def consume():
+        nonlocal records
+        async for record in client.telemetry_stream():
+            records += 1
+            if show_telemetry:
+                print("Telemetry :", record)
+
+    consumer = asyncio.create_task(consume())
+    results = await asyncio.gather(*(client.move(angle) for angle in angles), return_exceptions=True)
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+
+    return {"completed": sum(not isinstance(r, BaseException) for r in results),
+            "rejected": sum(isinstance(r, CommandRejected) for r in results),
+            "lost": sum(isinstance(r, CommandLost) for r in results),
+            "telemetry": records, "seconds": time.monotonic() - start}
+
+
+def main():
+    from UART_Host_to_uc import command_angle, read_batch
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", help="Port name or pyserial URL, the port is detected if not given")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--batch", default="-", help="File with one angle command per line, - for stdin")
+    parser.add_argument("--window", type=int, default=4,
+                        help="Maximum number of commands sent to the device but not yet completed")
+    parser.add_argument("--ack-timeout", type=float, default=30,
+                        help="Seconds to wait for the device to complete a command")
+    parser.add_argument("--quiet", action="store_true", help="Do not print the telemetry records")
+    parser.add_argument("--telemetry-csv", help="Write the telemetry batch records of the run to this CSV file")
+    args = parser.parse_args()
+
+    if not 1 <= args.window <= 128 or args.ack_timeout <= 0:
+        print("--window must be between 1 and 128 and --ack-timeout positive")
+        exit()
+
+    if args.batch == '-':
+        commands, errors = read_batch(sys.stdin)
+    else:
+        with open(args.batch) as f:
+            commands, errors = read_batch(f)
+    for line_number, angle, reason in errors:
+        print(f"Line {line_number} : {angle!r} : {reason}")
+    if errors:
+        print(f"{len(errors)} invalid commands, nothing is sent")
+        exit()
+
+    log = TelemetryLog() if args.telemetry_csv else None
+
+    async def run():
+        async with PicoClient(args.port, args.baudrate, args.window, ack_timeout=args.ack_timeout,
+                              telemetry_log=log) as client:
+            return await run_moves(client, [command_angle(c) for c in commands], not args.quiet)
+
+    try:
+        result = asyncio.run(run())
+    except pyserial.SerialException as e:
+        print('An Exception Occurred')
+        print('Exception Details ->', e)
+        return
+    seconds = max(result["seconds"], 1e-9)
+    print(f"{result['completed']} moves completed in {seconds:.2f} s ({result['completed'] / seconds:.1f} moves/s), "
+          f"{result['rejected']} rejected, {result['lost']} lost, {result['telemetry']} telemetry records")
+    if log is not None:
+        log.write_csv(args.telemetry_csv)
+        print(f"{log.records} telemetry batch records ({log.lost} lost) written to {args.telemetry_csv}")
+
+
+if __name__ == "__main__":
+    main()
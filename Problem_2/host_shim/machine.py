@@ -0,0 +1,183 @@
+"""This is the machine script of the host shim
+
+CPython stand-in for the MicroPython machine module on the virtual clock of
+the utime shim:
+i) Pin records every change of an output pin with its virtual time in
+   history. Input pins are driven by the simulation with drive(), which calls
+   the handler registered with irq() on matching edges.
+ii) Timer calls its callback at exact multiples of its period on the virtual
+    clock, PERIODIC until deinit() or once for ONE_SHOT.
+iii) UART only keeps its settings, the firmware talks to the Host through
+     stdin and stdout.
+iv) disable_irq and enable_irq do nothing, the callbacks of the shims never
+    interrupt running code.
+"""
+
+import utime
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    """Helper Method : Initialisation of a simulated pin
+
+    Args: id : GPIO number
+          mode : Pin.IN or Pin.OUT
+          pull : Ignored
+          value : Initial value
+    Returns : None
+
+    """
+    def __init__(self, id, mode=IN, pull=None, value=0):
+        self.id = id
+        self.mode = mode
+        self._value = value
+        self.history = []
+        self._handler = None
+        self._trigger = 0
+        self._watcher = None
+
+    """Helper Method : Reads or sets the pin value, changes of outputs are recorded in history
+
+    Args: value : New value, None to read the value
+    Returns : Pin value when reading
+
+    """
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self._value = value
+            self.history.append((utime.ticks_us(), value))
+            if self._watcher is not None:
+                self._watcher(self)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self._value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    """Helper Method : Registers the handler of pin edges
+
+    Args: handler : Function of the pin
+          trigger : Pin.IRQ_RISING, Pin.IRQ_FALLING or both
+    Returns : None
+
+    """
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    """Helper Method : Drives a simulated input pin, the edge handler is called like an interrupt
+
+    Args: value : New value
+    Returns : None
+
+    """
+    def drive(self, value):
+        value = 1 if value else 0
+        if value == self._value:
+            return
+        self._value = value
+        self.history.append((utime.ticks_us(), value))
+        edge = Pin.IRQ_RISING if value else Pin.IRQ_FALLING
+        if self._handler is not None and self._trigger & edge:
+            self._handler(self)
+
+    """Helper Method : Registers a function of the simulation that is called after every change of an output pin
+
+    Args: function : Function of the pin, None to stop watching
+    Returns : None
+
+    """
+    def watch(self, function):
+        self._watcher = function
+
+    """Helper Method : Number of rising edges recorded in history
+
+    Args: None
+    Returns : Number of pulses
+
+    """
+    def pulses(self):
+        return sum(1 for _, value in self.history if value)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    """Helper Method : Starts the timer on the virtual clock
+
+    Args: mode : Timer.PERIODIC or Timer.ONE_SHOT
+          freq : Frequency in Hz, or
+          period : Period in milliseconds
+          callback : Function of the timer
+    Returns : None
+
+    """
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.deinit()
+        if freq is not None:
+            self._period_us = 1000000 / freq
+        else:
+            self._period_us = period * 1000
+        if self._period_us <= 0:
+            raise ValueError("Timer : period must be positive")
+
+        self._mode = mode
+        self._callback = callback
+        self._start_us = utime._now_us
+        self._count = 1
+        self._next_us = self._start_us + self._period_us
+        utime._timers.append(self)
+
+    def deinit(self):
+        if self in utime._timers:
+            utime._timers.remove(self)
+
+    def _fire(self):
+        if self._mode == Timer.PERIODIC:
+            #Multiples of the period from the start, rounding errors do not add up
+            self._count += 1
+            self._next_us = self._start_us + self._count * self._period_us
+        else:
+            self.deinit()
+        if self._callback is not None:
+            self._callback(self)
+
+
+class UART:
+
+    def __init__(self, id, baudrate=115200, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def __repr__(self):
+        return "UART(%d, baudrate=%d)" % (self.id, self.baudrate)
@@ -0,0 +1,20 @@
+"""This is the micropython script of the host shim
+
+CPython stand-in for the MicroPython micropython module.
+"""
+
+
+def const(value):
+    return value
+
+
+def kbd_intr(char):
+    pass
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(function, argument):
+    function(argument)
@@ -0,0 +1,116 @@
+"""This is the uasyncio script of the host shim
+
+CPython stand-in for the MicroPython uasyncio module, built on asyncio with
+an event loop that runs on the virtual clock of the utime shim:
+i) When every task waits, the loop advances the virtual clock to the next
+   sleep instead of sleeping, and the machine.Timer callbacks that fall due
+   on the way run in time order. Tasks, timers and pins of a simulation keep
+   exact and repeatable times.
+ii) sleep_ms, create_task, run, Event and gather have the uasyncio signatures.
+iii) StreamReader polls a stream whose read(n) returns the bytes that are
+     available (b'' when there are none) every millisecond of virtual time,
+     the simulation feeds the bytes of the Host into such a stream.
+"""
+
+import asyncio
+import selectors
+
+import utime
+
+from asyncio import CancelledError, Event, Lock, create_task, gather, sleep, wait_for
+
+# Virtual milliseconds between two polls of StreamReader
+POLL_MS = 1
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+
+    """Helper Method : Polls the file descriptors of the loop, advances the virtual clock instead of waiting
+
+    Args: timeout : Seconds until the next sleep of a task falls due, None if no task sleeps
+    Returns : Ready file descriptors
+    Raises : RuntimeError if no task sleeps and no machine.Timer runs, the tasks would wait forever
+
+    """
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            if not utime._timers:
+                raise RuntimeError("uasyncio : all tasks wait and no timer runs")
+            #A timer callback may set an Event, the loop looks at the tasks again after it
+            utime.advance(max(min(timer._next_us for timer in utime._timers) - utime._now_us, 0))
+        else:
+            utime.advance(timeout * 1000000)
+        return events
+
+
+class _VirtualLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self):
+        return utime._now_us / 1000000
+
+
+def sleep_ms(ms):
+    return asyncio.sleep(ms / 1000)
+
+
+"""Helper Method to run a coroutine on the virtual clock until it returns, the other tasks are cancelled then
+
+    Args: coroutine
+    Returns : Return value of the coroutine
+
+"""
+def run(coroutine):
+    loop = _VirtualLoop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class StreamReader:
+
+    """Helper Method : Initialisation of the stream reader
+
+    Args: stream : Object with a non-blocking read(n)
+    Returns : None
+
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    """Helper Method : Reads up to n bytes, waits until at least one byte is available
+
+    Args: n : Maximum number of bytes
+    Returns : bytes
+
+    """
+    async def read(self, n):
+        while True:
+            data = self.stream.read(n)
+            if data:
+                return data
+            await sleep_ms(POLL_MS)
+
+    """Helper Method : Reads exactly n bytes
+
+    Args: n : Number of bytes
+    Returns : bytes
+
+    """
+    async def readexactly(self, n):
+        data = b''
+        while len(data) < n:
+            data += await self.read(n - len(data))
+        return data
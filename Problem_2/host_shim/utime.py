@@ -0,0 +1,73 @@
+"""This is the utime script of the host shim
+
+CPython stand-in for the MicroPython utime module, so that the firmware can
+run on the Host. Time is virtual: the sleep functions advance the clock
+instantly and run the callbacks of the machine.Timer instances that fall due
+on the way, in time order. A move of several seconds is simulated in
+milliseconds and the timing of every pin change is exact and repeatable.
+"""
+
+# Virtual time in microseconds since start up
+_now_us = 0.0
+
+# Timers of the machine shim that are running
+_timers = []
+
+
+def ticks_us():
+    return int(_now_us)
+
+
+def ticks_ms():
+    return int(_now_us // 1000)
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(ticks1, ticks2):
+    return ticks1 - ticks2
+
+
+"""Helper Method to advance the virtual clock and run the timer callbacks that fall due
+
+    Args: us : Microseconds
+    Returns : None
+
+"""
+def advance(us):
+    global _now_us
+    target = _now_us + us
+    while True:
+        due = [timer for timer in _timers if timer._next_us <= target]
+        if not due:
+            break
+        timer = min(due, key=lambda t: t._next_us)
+        _now_us = max(_now_us, timer._next_us)
+        timer._fire()
+    _now_us = target
+
+
+def sleep_us(us):
+    advance(us)
+
+
+def sleep_ms(ms):
+    advance(ms * 1000)
+
+
+def sleep(seconds):
+    advance(seconds * 1000000)
+
+
+"""Helper Method to reset the virtual clock and stop all timers
+
+    Args: None
+    Returns : None
+
+"""
+def reset():
+    global _now_us
+    _now_us = 0.0
+    del _timers[:]
@@ -4,13 +4,39 @@ This scripts configures the stepper motor and controls the stepper motor,
 based on the input that it recevies from the system.
 This script interfaced with the "UART_uc_to_Host"
 python code for serial input output capability.
+The angles are received as framed commands (uart_protocol.py, which is
+copied to the Pico together with this script). Every command is answered
+with an ACK when it is received and an ACK with STATUS_DONE when its move
+is completed, or a NACK when it is invalid, so that the host sends the
+next command as soon as the previous one is done instead of sleeping.
+The step pulses are generated by step_engine.py, which emits exactly the
+number of steps of the move (on a PIO state machine of the Pico), along the
+acceleration ramps planned by motion_planner.py.
+The firmware runs as uasyncio tasks: command_task receives and acknowledges
+the commands into a command queue, motion_task runs the queued moves back to
+back (the next move is planned while the current one runs) and
+telemetry_task streams the telemetry records, so receiving, moving and
+reporting overlap instead of blocking each other.
+The encoder is decoded in pin interrupts by quadrature.py. At start up the
+motor is homed to the index Z of the encoder, and with closed_loop every move
+ends with correction moves until the encoder confirms the step position.
+A timer samples the position, the encoder count and the fault and encoder
+pins at telemetry_rate_hz into the preallocated ring buffer of telemetry.py,
+which telemetry_task sends in binary batches (CMD_TELEMETRY_BATCH).
 """
 
 """Pins of Raspberry Pico are configured to drive stepper motor"""
 
 
-from machine import Pin, Timer
+from machine import Pin, Timer, disable_irq, enable_irq
+import sys
 import utime
+import uasyncio
+import uart_protocol
+from motion_planner import plan_move
+from quadrature import QuadratureDecoder
+from telemetry import TelemetryRing
+from step_engine import make_step_engine
 from UART_uc_to_Host import serial_io
 dir_pin = Pin(27, Pin.OUT)
 step_pin = Pin(26, Pin.OUT)
@@ -38,53 +64,94 @@ pin_A_minus = Pin(12, mode=Pin.IN)
 pin_B_minus = Pin(13, mode=Pin.IN)
 
 one_whole_revolution = 360
-# Initialize timer
-tim = Timer()
+# Initialize step engine
+step_engine = make_step_engine(step_pin)
 
+# Velocity profile of the moves ("trapezoid" or "scurve"), velocities in degrees/s and
+# acceleration in degrees/s^2. The start velocity is the fixed step rate of the previous
+# versions (1000 steps/s), at which the motor starts without a ramp
+motion_profile = "trapezoid"
+start_velocity = 56.25
+max_velocity = 180
+acceleration = 360
 
-"""Callback function that is executed whenever the timer is elapsed. Step() : Step pin is controlled".
+# Largest angle of a move in degrees (100 revolutions), larger moves are answered with a NACK
+max_angle = 36000
 
-    Args: t 
-    Returns : None
-        
-""" 
+# Step position since start up, sent to the host in the telemetry frames
+position = 0
+
+# Incremental encoder : counts per revolution (4 x the lines of the encoder), homing on the
+# index at start up (at most homing_revolutions forward), and correction of lost steps at the
+# end of every move with at most closed_loop_attempts correction moves
+encoder = QuadratureDecoder(pin_A_plus, pin_B_plus, pin_Z_plus)
+encoder_counts_per_revolution = 4000
+index_homing = True
+homing_revolutions = 1.1
+closed_loop = False
+closed_loop_attempts = 3
 
-def step(t):
-    global step_pin
-    step_pin.value(not step_pin.value())
+# Moves that are accepted and wait for the current move
+command_queue_size = 8
 
+# Telemetry : samples per second, milliseconds between the batches and records of the ring
+# buffer (5 s). A record and its share of the frame take about 14 bytes, at 9600 baud the
+# link carries about 68 records per second besides the replies
+telemetry_rate_hz = 50
+telemetry_batch_ms = 200
+telemetry = TelemetryRing(256)
+telemetry_timer = Timer()
 
-"""Helper Method : Stepper motor is rotated based as per the given angle
+# Sequence number and direction (1 or -1) of the running move, None when the motor stands still
+moving_sequence = None
+moving_direction = 1
 
-    Args: delay  
+
+"""Helper Method : Stepper motor is rotated based as per the given angle, returns at once
+
+    Args: steps : Number of steps of the move, from angle_to_step_per_revolution_conversion
     Returns : None 
         
 """ 
 
-def rotate_motor(delay):
+def rotate_motor(steps):
     try:
-        # Set up timer for stepping
-        tim.init(freq=1000000//delay, mode=Timer.PERIODIC, callback=step)
+        # Exactly steps pulses are emitted, with the intervals of the planned velocity profile
+        step_engine.start_move(step_engine.prepare(plan_profile(steps)))
     except:
-        print("rotate_motor : delay could be large")
+        print("rotate_motor : invalid motion profile")
         pass        
 
+"""Helper Method : Plans the velocity profile of a move
+
+    Args: steps : Number of steps of the move, from angle_to_step_per_revolution_conversion
+    Returns : motion_planner.MotionProfile, its ramp is replayed by the step engine
+        
+"""
+
+def plan_profile(steps):
+    steps_per_degree = steps_per_revolution / one_whole_revolution
+    return plan_move(steps, max_velocity * steps_per_degree, acceleration * steps_per_degree,
+                     motion_profile, start_velocity * steps_per_degree)
+
 """Helper Method : Conversion of angle into its respective steps_per_revolution is implemented
 
     Args: angle  
+          set_direction : Sets the direction pin, False to plan a move while another one runs
     Returns : Respective steps per revolution
         
 """
 
 
-def angle_to_step_per_revolution_conversion(angle):
+def angle_to_step_per_revolution_conversion(angle, set_direction=True):
     try:
         #If negative angle is received as input, direction pin is set to 1
         if (angle < 0):
            angle = angle * (-1)
-           dir_pin.value(1)
-           print('dir_pin value is 1')
-        else:
+           if set_direction:
+               dir_pin.value(1)
+               print('dir_pin value is 1')
+        elif set_direction:
             #If positive angle is received as input, direction pin is set to 0
            dir_pin.value(0)
            print('dir_pin value is 0')
@@ -101,74 +168,293 @@ def angle_to_step_per_revolution_conversion(angle):
         pass        
 
 
-"""Helper Method : Enters into infinite loop and drives the stepper motor and provide encoder values as per the input from host system
+"""Helper Method : Difference between the encoder position and the step position
+
+    Args: None  
+    Returns : Steps, positive if the motor is ahead of the step position, 0 within one encoder count
+        
+"""
+
+def position_error():
+    counts = encoder.count - round(position * encoder_counts_per_revolution / steps_per_revolution)
+    if abs(counts) <= 1:
+        return 0
+    return round(counts * steps_per_revolution / encoder_counts_per_revolution)
+
+
+"""Helper Method : Starts a move at the start velocity, without ramps, returns at once
+
+    Args: steps : Number of steps, negative for the negative direction  
+    Returns : None
+        
+"""
+
+def start_slow_move(steps):
+    dir_pin.value(1 if steps < 0 else 0)
+    step_engine.start(abs(int(steps)), start_velocity * steps_per_revolution / one_whole_revolution)
+
+
+"""Helper Method : Homes the motor to the index Z of the encoder, the index becomes position 0
+
+    Args: None  
+    Returns : True if the index was found
+        
+"""
+
+def home_to_index():
+    global position
+    encoder.arm_index()
+    start_slow_move(homing_revolutions * steps_per_revolution)
+    while step_engine.busy() and not encoder.index_seen:
+        utime.sleep_ms(1)
+    step_engine.stop()
+    if not encoder.index_seen:
+        print("home_to_index : index not found")
+        return False
+    
+    #The count at the index edge is the origin, the motor moves back to it
+    encoder.reset(encoder.count - encoder.index_count)
+    position = round(encoder.count * steps_per_revolution / encoder_counts_per_revolution)
+    start_slow_move(-position)
+    step_engine.wait()
+    position = 0
+    print('home_to_index : encoder count at home', encoder.count)
+    return True
+
+
+"""Helper Method : Corrects the lost steps of a move with slow moves until the encoder confirms the step position
+
+    Args: None  
+    Returns : Remaining error in steps
+        
+"""
+
+async def correct_position():
+    for attempt in range(0, closed_loop_attempts):
+        error = position_error()
+        if error == 0:
+            break
+        start_slow_move(-error)
+        while step_engine.busy():
+            await uasyncio.sleep_ms(1)
+    return position_error()
+
+
+# Pins of the pin byte of the telemetry, in the order of uart_protocol.PIN_NAMES
+status_pins = (pin_fault, pin_A_plus, pin_B_plus, pin_Z_plus, pin_A_minus, pin_B_minus, pin_Z_minus)
+
+
+"""Helper Method : Packs the fault and encoder pin values into one byte, bit i is uart_protocol.PIN_NAMES[i]
+
+    Args: None  
+    Returns : Pin byte
+        
+"""
+
+def pin_bits():
+    bits = 0
+    for i in range(0, len(status_pins)):
+        bits |= status_pins[i].value() << i
+    return bits
+
+
+"""Callback function of the telemetry timer : adds a record to the ring buffer, without allocation.
+During a move the position is the start position plus the steps emitted so far, step_engine.steps_done()
+counts them from the step counter of the state machine on the PIO engine and from the timer edges on the
+timer engine. motion_task publishes a move after start_move and ends it together with the update of position
+
+    Args: timer  
+    Returns : None
+        
+"""
+
+def sample_telemetry(timer):
+    current = position
+    if moving_sequence is not None:
+        current += moving_direction * step_engine.steps_done()
+    telemetry.put(utime.ticks_us(), current, encoder.count, pin_bits())
+
 
-    Args: serial communication instance  
+class CommandQueue:
+
+    """Helper Method : Initialisation of the command queue (uasyncio has no Queue)
+
+    Args: size : Maximum number of commands, put() waits while the queue is full  
+    Returns : None
+        
+    """
+    def __init__(self, size):
+        self.items = []
+        self.size = size
+        self.changed = uasyncio.Event()
+
+    async def put(self, item):
+        while len(self.items) >= self.size:
+            self.changed.clear()
+            await self.changed.wait()
+        self.items.append(item)
+        self.changed.set()
+
+    async def get(self):
+        while not self.items:
+            self.changed.clear()
+            await self.changed.wait()
+        return self.get_nowait()
+
+    def get_nowait(self):
+        item = self.items.pop(0)
+        self.changed.set()
+        return item
+
+
+"""Helper Method : Converts a command into a planned move, the direction pin is not changed.
+The step engine converts the profile into its own units (PIO delays) here, while the previous
+move still runs, so start_move does not hold up the next move
+
+    Args: command : (sequence, angle)  
+    Returns : (sequence, angle, steps, move of step_engine.prepare)
+        
+"""
+
+def plan_command(command):
+    sequence, angle = command
+    steps = angle_to_step_per_revolution_conversion(angle, set_direction=False)
+    return sequence, angle, steps, step_engine.prepare(plan_profile(steps))
+
+
+"""Helper Method : Plans a command, a command that cannot be planned (MemoryError, ValueError of
+the planner) is answered with a NACK ERR_PAYLOAD instead of ending motion_task
+
+    Args: serial_com : serial communication instance  
+          command : (sequence, angle)  
+    Returns : Planned move of plan_command, None if the command was rejected
+        
+"""
+
+def try_plan_command(serial_com, command):
+    try:
+        return plan_command(command)
+    except Exception as e:
+        print("motion_task : cannot plan the move", command, e)
+        serial_com.send_frame(uart_protocol.encode_nack(command[0], uart_protocol.ERR_PAYLOAD))
+        return None
+
+
+"""Task : Receives the commands from the host system, acknowledges them and queues the moves
+
+    Args: serial_com : serial communication instance  
+          reader : uasyncio.StreamReader of the serial input
+          queue : CommandQueue of the moves
     Returns : None
         
 """
 
-def loop(serial_com):
+async def command_task(serial_com, reader, queue):
     while True:
-        print("loop : Entered inside while loop")
-        try:
-            angle = int(serial_com.wait_for_input())
-            print("loop : angle", angle)
-        except:
-            print("loop : Exception, pass")
-            pass
-        
-        if angle == "Invalid Input":
-            print("loop : Invalid Input")
+        command = await serial_com.receive_command(reader)
+        if command is None:
+            print("command_task : Invalid Input")
             continue
+        #Waits while the queue is full, the host keeps the rest of its commands until then
+        await queue.put(command)
+
+
+"""Task : Runs the queued moves back to back and reports every completed move
+
+    Args: serial_com : serial communication instance  
+          queue : CommandQueue of the moves
+    Returns : None
         
-        steps_per_revolution_result = angle_to_step_per_revolution_conversion(angle)
-        # Spin motor slowly
-        
-        try:
-            rotate_motor(500)
-            utime.sleep_ms(int(steps_per_revolution_result))
-        except:
-            pass
-        
-        #Read Encoder and pin fault Values
-        print(f'pin_fault value is {pin_fault.value()}')
-        print(f'pin_A_plus value is {pin_A_plus.value()}')
-        print(f'pin_Z_plus value is {pin_Z_plus.value()}')
-        print(f'pin_Z_minus value is {pin_Z_minus.value()}')
-        print(f'pin_B_plus value is {pin_B_plus.value()}')
-        print(f'pin_A_minus value is {pin_A_minus.value()}')
-        print(f'pin_B_minus value is {pin_B_minus.value()}')
-        
-        utime.sleep(0.25)
-            
-        # stop the timer
-        tim.deinit()  
-        utime.sleep(1)
+"""
+
+async def motion_task(serial_com, queue):
+    global position, moving_sequence, moving_direction
+    planned = None
+    while True:
+        if planned is None:
+            planned = try_plan_command(serial_com, await queue.get())
+            if planned is None:
+                continue
+        sequence, angle, steps, move = planned
+        planned = None
+        
+        dir_pin.value(1 if angle < 0 else 0)
+        #start_move resets the steps_done of the engine, sample_telemetry sees the move after that
+        step_engine.start_move(move)
+        moving_direction = -1 if angle < 0 else 1
+        moving_sequence = sequence
+        
+        #The next move is planned while this one runs
+        while step_engine.busy():
+            if planned is None and queue.items:
+                planned = try_plan_command(serial_com, queue.get_nowait())
+            await uasyncio.sleep_ms(1)
+        
+        #sample_telemetry must not see the end of the move without its steps in position
+        state = disable_irq()
+        position += moving_direction * int(steps)
+        moving_sequence = None
+        enable_irq(state)
+        if closed_loop:
+            await correct_position()
+        serial_com.send_frame(uart_protocol.encode_telemetry(sequence, utime.ticks_ms(), position, pin_bits()))
+        
+        #The move is completed, the host can send the next command
+        serial_com.send_frame(uart_protocol.encode_ack(sequence, uart_protocol.STATUS_DONE, int(steps)))
+
+
+"""Task : Sends the records of the telemetry ring buffer in CMD_TELEMETRY_BATCH frames every telemetry_batch_ms
+
+    Args: serial_com : serial communication instance  
+    Returns : None
+        
+"""
+
+async def telemetry_task(serial_com):
+    sequence = 0
+    while True:
+        await uasyncio.sleep_ms(telemetry_batch_ms)
+        length = telemetry.take()
+        while length:
+            payload = memoryview(telemetry.payload)[:length]
+            serial_com.send_frame(uart_protocol.encode_frame(uart_protocol.CMD_TELEMETRY_BATCH, sequence, payload))
+            sequence = (sequence + 1) & 0xFF
+            length = telemetry.take()
+
+
+"""Helper Method : Starts the tasks and drives the stepper motor as per the input from host system
+
+    Args: serial_com : serial communication instance  
+          reader : uasyncio.StreamReader of the serial input, sys.stdin.buffer by default
+    Returns : None
+        
+"""
+
+async def run_tasks(serial_com, reader=None):
+    if reader is None:
+        reader = uasyncio.StreamReader(sys.stdin.buffer)
+    queue = CommandQueue(command_queue_size)
+    if telemetry_rate_hz > 0:
+        telemetry_timer.init(freq=telemetry_rate_hz, mode=Timer.PERIODIC, callback=sample_telemetry)
+    uasyncio.create_task(motion_task(serial_com, queue))
+    uasyncio.create_task(telemetry_task(serial_com))
+    await command_task(serial_com, reader, queue)
 
 """main() : Main function """
 def main():
     try:
-        serial_com = serial_io()
+        serial_com = serial_io(max_angle)
         
-        home_steps_per_revolution = angle_to_step_per_revolution_conversion(100)
-        rotate_motor(500)
-        print('main : home angle', 100)
-        utime.sleep_ms(int(home_steps_per_revolution))
+        if index_homing:
+            home_to_index()
+        else:
+            home_steps_per_revolution = angle_to_step_per_revolution_conversion(100)
+            rotate_motor(home_steps_per_revolution)
+            print('main : home angle', 100)
+            step_engine.wait()
         
-        #Read Home Encoder Values
-         
-        print(f'pin_A_plus value is {pin_A_plus.value()}')
-        print(f'pin_Z_plus value is {pin_Z_plus.value()}')
-        print(f'pin_Z_minus value is {pin_Z_minus.value()}')
-        print(f'pin_B_plus value is {pin_B_plus.value()}')
-        print(f'pin_A_minus value is {pin_A_minus.value()}')
-        print(f'pin_B_minus value is {pin_B_minus.value()}')
-        
-        utime.sleep(0.25)
-        tim.deinit()  # stop the timer
-        utime.sleep(1)
-        loop(serial_com)
+        #The encoder and pin values are sent in the telemetry records from here on
+        uasyncio.run(run_tasks(serial_com))
     except:
         pass
          
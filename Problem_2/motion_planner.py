@@ -0,0 +1,162 @@
+"""This is the motion_planner script of main.py
+
+Plans the velocity profile of a move of the stepper motor, so that the motor
+accelerates up to a maximum velocity and decelerates to a stop instead of
+starting and stopping at a fixed step rate. Plain Python, it runs on the Pico
+(MicroPython) and on the Host:
+i) plan_move takes the steps of angle_to_step_per_revolution_conversion, the
+   maximum velocity (steps/s) and the acceleration (steps/s^2) and returns a
+   MotionProfile : the intervals of the acceleration ramp in microseconds,
+   the number of cruise steps and their interval, the deceleration is the
+   reversed ramp. Its size depends on the ramp, not on the length of the
+   move, the step engines replay it without a table of every step.
+ii) "trapezoid" accelerates with constant acceleration. "scurve" accelerates
+    with a sine shaped acceleration, which starts and ends at zero (limited
+    jerk) and peaks at the given acceleration.
+iii) The ramps start and end at start_velocity, the step rate at which the
+     motor starts and stops without losing steps. Moves too short to reach the
+     maximum velocity get a triangular profile with the highest velocity that
+     can be reached and stopped from.
+iv) The step times are computed from the exact position over time of the
+    profile, the intervals are the differences of consecutive step times, so
+    rounding errors do not add up over a move. No interval is shorter than
+    the interval of the peak velocity rounded up to a whole microsecond, so
+    the step rate never exceeds max_velocity.
+"""
+
+from array import array
+import math
+
+PROFILES = ("trapezoid", "scurve")
+
+
+class MotionProfile:
+
+    """Helper Method : Initialisation of a planned move
+
+    Args: steps : Number of steps
+          ramp : array of the intervals (us) of the acceleration steps, the deceleration is the reverse
+          cruise_interval : Interval (us) of the steps at the peak velocity
+    Returns : None
+
+    """
+    def __init__(self, steps, ramp, cruise_interval):
+        self.steps = steps
+        self.ramp = ramp
+        self.cruise_steps = steps - 2 * len(ramp)
+        self.cruise_interval = cruise_interval
+
+    """Helper Method : Interval of one step
+
+    Args: i : Index of the step
+    Returns : Interval in microseconds before the step
+
+    """
+    def interval(self, i):
+        ramp_steps = len(self.ramp)
+        if i < ramp_steps:
+            return self.ramp[i]
+        if i < ramp_steps + self.cruise_steps:
+            return self.cruise_interval
+        return self.ramp[self.steps - 1 - i]
+
+    """Helper Method : Table of the intervals of all steps, for the Host tests and simulations. The step
+    engines replay the ramp instead, the table of a long move does not fit in the memory of the Pico
+
+    Args: None
+    Returns : array('I') of the intervals in microseconds
+
+    """
+    def table(self):
+        table = array('I', self.ramp)
+        table.extend(array('I', [self.cruise_interval]) * self.cruise_steps)
+        reverse = array('I', self.ramp)
+        for i in range(0, len(reverse) // 2):
+            reverse[i], reverse[-1 - i] = reverse[-1 - i], reverse[i]
+        table.extend(reverse)
+        return table
+
+    """Helper Method : Duration of the move
+
+    Args: None
+    Returns : Microseconds
+
+    """
+    def duration_us(self):
+        return 2 * sum(self.ramp) + self.cruise_steps * self.cruise_interval
+
+
+"""Helper Method to compute the times of the steps of an acceleration ramp
+
+    Args: ramp_steps : Number of steps of the ramp
+          start_velocity : Velocity at the start of the ramp (steps/s)
+          velocity : Velocity at the end of the ramp (steps/s)
+          acceleration : Constant or peak acceleration (steps/s^2)
+          profile : "trapezoid" or "scurve"
+    Returns : list of the times (s) of the steps 1 to ramp_steps, the ramp starts at time 0
+
+"""
+def _ramp_times(ramp_steps, start_velocity, velocity, acceleration, profile):
+    v0 = start_velocity
+    if profile == "trapezoid":
+        #position = v0 t + a t^2 / 2
+        return [(math.sqrt(v0 * v0 + 2 * acceleration * n) - v0) / acceleration for n in range(1, ramp_steps + 1)]
+
+    #velocity = v0 + dv / 2 (1 - cos(pi t / T)), position = v0 t + dv / 2 (t - T / pi sin(pi t / T))
+    dv = velocity - v0
+    duration = math.pi * dv / (2 * acceleration)
+    w = math.pi / duration
+    times = []
+    #Start close to the first step, position is about v0 t + dv w^2 t^3 / 12 for small t
+    t = 1.0 / v0 if v0 > 0 else (12.0 / (dv * w * w)) ** (1.0 / 3)
+    for n in range(1, ramp_steps + 1):
+        #Newton iterations from the time of the previous step
+        for i in range(0, 20):
+            error = v0 * t + dv / 2 * (t - math.sin(w * t) / w) - n
+            step = error / (v0 + dv / 2 * (1 - math.cos(w * t)))
+            t = min(max(t - step, t / 2), duration)
+            if abs(step) < 1e-9:
+                break
+        times.append(t)
+    return times
+
+
+"""Helper Method to plan a move
+
+    Args: steps : Number of steps, from angle_to_step_per_revolution_conversion
+          max_velocity : Maximum velocity in steps/s
+          acceleration : Acceleration in steps/s^2 (the peak acceleration of "scurve")
+          profile : "trapezoid" or "scurve"
+          start_velocity : Velocity in steps/s at which the motor can start and stop without a ramp
+    Returns : MotionProfile
+
+"""
+def plan_move(steps, max_velocity, acceleration, profile="trapezoid", start_velocity=0):
+    if profile not in PROFILES:
+        raise ValueError("plan_move : unknown profile")
+    if max_velocity <= 0 or acceleration <= 0 or start_velocity < 0:
+        raise ValueError("plan_move : max_velocity and acceleration must be positive, start_velocity not negative")
+    steps = int(steps)
+    if steps <= 0:
+        return MotionProfile(0, array('I'), 0)
+
+    #Distance to accelerate from v0 to v: (v^2 - v0^2) / (2 a), and pi (v^2 - v0^2) / (4 a)
+    #for the sine shaped acceleration
+    v0 = min(start_velocity, max_velocity)
+    factor = 0.5 if profile == "trapezoid" else math.pi / 4
+    velocity = max_velocity
+    if 2 * factor * (velocity * velocity - v0 * v0) / acceleration > steps:
+        velocity = math.sqrt(v0 * v0 + steps * acceleration / (2 * factor))
+    #The tolerance keeps the ramps of a triangular profile from ending a step early on rounding errors
+    ramp_steps = min(int(factor * (velocity * velocity - v0 * v0) / acceleration + 1e-6), steps // 2)
+
+    #Intervals are rounded up near the peak, so the step rate never exceeds velocity
+    min_interval = max(int(math.ceil(1000000 / velocity - 1e-9)), 1)
+    times = _ramp_times(ramp_steps, v0, velocity, acceleration, profile)
+    ramp = array('I', [0] * ramp_steps)
+    previous = 0
+    for i in range(0, ramp_steps):
+        ramp[i] = max(int(round(times[i] * 1000000)) - previous, min_interval)
+        previous += ramp[i]
+
+    return MotionProfile(steps, ramp, min_interval)
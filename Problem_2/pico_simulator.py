@@ -0,0 +1,319 @@
+"""This is the pico_simulator script
+
+Simulates the Raspberry Pi Pico running main.py on the Host, so that
+UART_Host_to_uc.py can be tested without hardware:
+i) The simulator opens a pseudo terminal and prints its name, the Host
+   connects to it with --port.
+ii) Frames are read with uart_protocol.read_frame like on the Pico and are
+    answered with the same ACK/NACK frames. A move takes as long as the
+    velocity profile of motion_planner.py with the settings of main.py,
+    divided by speedup.
+iii) Like main.py, a CMD_TELEMETRY frame is sent after every move. With
+     telemetry_interval, telemetry frames are also sent during the moves.
+     The encoder pins A and B follow the quadrature phase of the encoder count.
+iv) Like the telemetry ring buffer of main.py, with telemetry_rate the
+    position, the encoder count and the pins are sampled at a fixed rate of
+    simulated time and sent in CMD_TELEMETRY_BATCH frames every
+    telemetry_batch seconds, also between the moves.
+v) The print output of the firmware is interleaved with the frames, and
+     --corrupt-every N flips a bit in every Nth received frame to exercise
+     the error handling of the Host.
+"""
+
+import argparse
+import bisect
+import itertools
+import math
+import os
+import struct
+import threading
+import time
+import tty
+
+import uart_protocol
+from motion_planner import PROFILES, plan_move
+
+# Same as steps_per_revolution, one_whole_revolution, encoder_counts_per_revolution and the motion
+# profile settings of main.py
+STEPS_PER_REVOLUTION = 6400
+ENCODER_COUNTS_PER_REVOLUTION = 4000
+ONE_WHOLE_REVOLUTION = 360
+MOTION_PROFILE = "trapezoid"
+START_VELOCITY = 56.25
+MAX_VELOCITY = 180
+ACCELERATION = 360
+
+
+class PicoSimulator:
+
+    """Helper Method : Initialisation of the simulated Pico
+
+    Args: motion_profile : "trapezoid" or "scurve"
+          max_velocity : Maximum velocity of a move in degrees/s
+          acceleration : Acceleration of a move in degrees/s^2
+          speedup : Moves take 1 / speedup of their simulated time
+          chatter : Interleave the print output of main.py with the frames
+          corrupt_every : Flip a bit in every Nth received frame, 0 to disable
+          telemetry_interval : Seconds of simulated time between telemetry frames during a move, 0 to disable
+          telemetry_rate : Telemetry records per second of simulated time, 0 to disable
+          telemetry_batch : Seconds of simulated time between CMD_TELEMETRY_BATCH frames
+    Returns : None
+
+    """
+    def __init__(self, motion_profile=MOTION_PROFILE, max_velocity=MAX_VELOCITY, acceleration=ACCELERATION,
+                 speedup=1.0, chatter=True, corrupt_every=0, telemetry_interval=0, telemetry_rate=0,
+                 telemetry_batch=0.2):
+        self.motion_profile = motion_profile
+        self.max_velocity = max_velocity
+        self.acceleration = acceleration
+        self.speedup = speedup
+        self.chatter = chatter
+        self.corrupt_every = corrupt_every
+        self.telemetry_interval = telemetry_interval
+        self.telemetry_rate = telemetry_rate
+        self.telemetry_batch = telemetry_batch
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        #(start in us of simulated time, step times from the start, start position, direction) of the last move
+        self.move = None
+        self.position = 0
+        self.moves = []
+        self.frames = 0
+
+    """Helper Method : Reads exactly size bytes from the pseudo terminal
+
+    Args: fd : File descriptor
+          size : Number of bytes
+    Returns : bytes
+    Raises : EOFError if the pseudo terminal is closed
+
+    """
+    def _read_exact(self, fd, size):
+        data = b''
+        while len(data) < size:
+            try:
+                chunk = os.read(fd, size - len(data))
+            except OSError:
+                chunk = b''
+            if not chunk:
+                raise EOFError
+            data += chunk
+
+        #A bit of the sequence byte is flipped, the CRC check has to catch it
+        if size == uart_protocol.HEADER_SIZE - 1:
+            self.frames += 1
+            if self.corrupt_every and self.frames % self.corrupt_every == 0:
+                data = data[:2] + bytes([data[2] ^ 0x01])
+        return data
+
+    """Helper Method : Writes to the pseudo terminal, the frames of the two threads are not mixed
+
+    Args: fd : File descriptor
+          data : bytes
+    Returns : None
+
+    """
+    def _write(self, fd, data):
+        with self.lock:
+            os.write(fd, data)
+
+    def _print(self, fd, text):
+        if self.chatter:
+            self._write(fd, (text + "\r\n").encode())
+
+    def _now_us(self):
+        return (time.monotonic() - self.start) * 1000000 * self.speedup
+
+    """Helper Method : Pin byte of an encoder count, A leads B in positive direction
+
+    Args: count : Encoder count
+    Returns : Pin byte
+
+    """
+    def _pins(self, count):
+        phase = count & 3
+        return ((phase in (1, 2)) << 1) | ((phase in (2, 3)) << 2)
+
+    """Helper Method : Step position at a time of simulated time
+
+    Args: ticks_us : Microseconds of simulated time
+    Returns : Step position
+
+    """
+    def position_at(self, ticks_us):
+        move = self.move
+        if move is None:
+            return self.position
+        start, times, base, direction = move
+        if ticks_us < start:
+            return base
+        return base + direction * bisect.bisect_right(times, ticks_us - start)
+
+    """Helper Method : Sends a telemetry frame of the given step position
+
+    Args: fd : File descriptor
+          sequence : Sequence number of the current command
+          position : Step position
+    Returns : None
+
+    """
+    def _telemetry(self, fd, sequence, position):
+        pins = self._pins(position * ENCODER_COUNTS_PER_REVOLUTION // STEPS_PER_REVOLUTION)
+        ticks_ms = int(self._now_us() / 1000)
+        self._write(fd, uart_protocol.encode_telemetry(sequence, ticks_ms, position, pins))
+
+    """Helper Method : Samples the telemetry at telemetry_rate and sends the records in batches
+
+    Args: fd : File descriptor of the master side of the pseudo terminal
+    Returns : None, when the pseudo terminal is closed
+
+    """
+    def stream_telemetry(self, fd):
+        period = 1000000 / self.telemetry_rate
+        next_us = 0.0
+        number = 0
+        while True:
+            time.sleep(self.telemetry_batch / self.speedup)
+            now = self._now_us()
+            records = []
+            while next_us <= now:
+                position = self.position_at(next_us)
+                count = position * ENCODER_COUNTS_PER_REVOLUTION // STEPS_PER_REVOLUTION
+                records.append(struct.pack(uart_protocol.TELEMETRY_RECORD, int(next_us) & 0xFFFFFFFF, position,
+                                           count, self._pins(count)))
+                next_us += period
+            for i in range(0, len(records), uart_protocol.MAX_BATCH_RECORDS):
+                chunk = records[i:i + uart_protocol.MAX_BATCH_RECORDS]
+                payload = struct.pack(uart_protocol.BATCH_HEADER, number & 0xFFFF, len(chunk)) + b''.join(chunk)
+                try:
+                    self._write(fd, uart_protocol.encode_frame(uart_protocol.CMD_TELEMETRY_BATCH, number, payload))
+                except OSError:
+                    return
+                number += len(chunk)
+
+    """Helper Method : Executes one frame and writes its replies
+
+    Args: fd : File descriptor to write the replies to
+          command, sequence, payload : Frame from uart_protocol.read_frame
+    Returns : None
+
+    """
+    def handle(self, fd, command, sequence, payload):
+        if command == uart_protocol.CMD_PING:
+            self._write(fd, uart_protocol.encode_ack(sequence, uart_protocol.STATUS_DONE))
+            return
+        if command != uart_protocol.CMD_MOVE:
+            self._write(fd, uart_protocol.encode_nack(sequence, uart_protocol.ERR_COMMAND))
+            return
+        try:
+            angle = uart_protocol.decode_move(payload, sequence)
+        except uart_protocol.FrameError as e:
+            self._write(fd, uart_protocol.encode_nack(sequence, e.error))
+            return
+
+        self._write(fd, uart_protocol.encode_ack(sequence, uart_protocol.STATUS_ACCEPTED))
+        self._print(fd, f"loop : angle {angle}")
+
+        steps = int(STEPS_PER_REVOLUTION * abs(angle) / ONE_WHOLE_REVOLUTION)
+        direction = 1 if angle >= 0 else -1
+        steps_per_degree = STEPS_PER_REVOLUTION / ONE_WHOLE_REVOLUTION
+        profile = plan_move(steps, self.max_velocity * steps_per_degree, self.acceleration * steps_per_degree,
+                            self.motion_profile, START_VELOCITY * steps_per_degree)
+
+        #The move is simulated in slices of telemetry_interval, the position follows the step intervals
+        self.move = (self._now_us(), list(itertools.accumulate(profile.table())), self.position, direction)
+        duration = profile.duration_us() / 1000000
+        if self.telemetry_interval > 0:
+            slices = max(int(math.ceil(duration / self.telemetry_interval)), 1)
+        else:
+            slices = 1
+        done = 0
+        elapsed = 0
+        for i in range(1, slices + 1):
+            time.sleep(duration / slices / self.speedup)
+            while done < steps and elapsed + profile.interval(done) <= duration * 1000000 * i / slices:
+                elapsed += profile.interval(done)
+                done += 1
+            if i < slices:
+                self._telemetry(fd, sequence, self.position + direction * done)
+        self.position += direction * steps
+        self.moves.append(angle)
+
+        self._print(fd, "pin_fault value is 0")
+        self._telemetry(fd, sequence, self.position)
+        self._write(fd, uart_protocol.encode_ack(sequence, uart_protocol.STATUS_DONE, steps))
+
+    """Helper Method : Serves the Host until the pseudo terminal is closed
+
+    Args: fd : File descriptor of the master side of the pseudo terminal
+    Returns : None
+
+    """
+    def serve(self, fd):
+        read = lambda size: self._read_exact(fd, size)
+        while True:
+            try:
+                command, sequence, payload = uart_protocol.read_frame(read)
+            except uart_protocol.FrameError as e:
+                self._write(fd, uart_protocol.encode_nack(e.sequence, e.error))
+                continue
+            except EOFError:
+                return
+            self.handle(fd, command, sequence, payload)
+
+
+"""Helper Method to start a simulated Pico on a new pseudo terminal in a background thread
+
+    Args: **options : Options of PicoSimulator
+    Returns : (PicoSimulator, name of the pseudo terminal to connect to)
+
+"""
+def start_simulator(**options):
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    simulator = PicoSimulator(**options)
+    threading.Thread(target=simulator.serve, args=(master,), daemon=True).start()
+    if simulator.telemetry_rate > 0:
+        threading.Thread(target=simulator.stream_telemetry, args=(master,), daemon=True).start()
+    return simulator, os.ttyname(slave)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--motion-profile", choices=PROFILES, default=MOTION_PROFILE)
+    parser.add_argument("--max-velocity", type=float, default=MAX_VELOCITY, help="Degrees/s")
+    parser.add_argument("--acceleration", type=float, default=ACCELERATION, help="Degrees/s^2")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Run moves this many times faster")
+    parser.add_argument("--telemetry-interval", type=float, default=0.1,
+                        help="Seconds of simulated time between telemetry frames during a move")
+    parser.add_argument("--telemetry-rate", type=float, default=50,
+                        help="Telemetry records per second of simulated time, 0 to disable the batches")
+    parser.add_argument("--telemetry-batch", type=float, default=0.2,
+                        help="Seconds of simulated time between two telemetry batches")
+    parser.add_argument("--quiet", action="store_true", help="Do not interleave print output")
+    parser.add_argument("--corrupt-every", type=int, default=0,
+                        help="Flip a bit in every Nth received frame")
+    args = parser.parse_args()
+
+    if min(args.max_velocity, args.acceleration, args.speedup, args.telemetry_batch) <= 0 or \
+            min(args.corrupt_every, args.telemetry_interval, args.telemetry_rate) < 0:
+        print("--max-velocity, --acceleration, --speedup and --telemetry-batch must be positive, "
+              "--corrupt-every, --telemetry-interval and --telemetry-rate not negative")
+        exit()
+
+    simulator, port = start_simulator(motion_profile=args.motion_profile, max_velocity=args.max_velocity,
+                                      acceleration=args.acceleration, speedup=args.speedup,
+                                      chatter=not args.quiet, corrupt_every=args.corrupt_every,
+                                      telemetry_interval=args.telemetry_interval,
+                                      telemetry_rate=args.telemetry_rate, telemetry_batch=args.telemetry_batch)
+    print("Simulated Pico on port :", port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"{len(simulator.moves)} moves, position {simulator.position} steps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""This is the quadrature script of main.py
+
+Decodes the A/B/Z signals of the incremental encoder of the stepper motor,
+instead of reading the encoder pins once after every move:
+i) QuadratureDecoder counts every edge of A and B in pin interrupts (x4
+   decoding), up for A leading B and down for B leading A, so the position of
+   the motor is measured while it moves. Transitions that skip a state (both
+   signals changed between two interrupts) are counted in errors.
+ii) The rising edge of the index Z stores the count at the index, so the
+    position can be referred to the index (homing) after the move that found
+    it, without stopping the motor at the edge.
+iii) Plain MicroPython without allocation in the interrupts, it runs on the
+     Pico and on the Host shim, where Pin.drive() calls the interrupts.
+"""
+
+from machine import Pin
+
+# Count change of a transition, index (previous A, previous B, A, B) : 0 for no change and
+# for invalid transitions, which are counted separately
+_TRANSITIONS = (0, -1, 1, 0,
+                1, 0, 0, -1,
+                -1, 0, 0, 1,
+                0, 1, -1, 0)
+
+# Transitions in which both signals changed
+_INVALID = (0, 0, 0, 1,
+            0, 0, 1, 0,
+            0, 1, 0, 0,
+            1, 0, 0, 0)
+
+
+class QuadratureDecoder:
+
+    """Helper Method : Initialisation of the decoder, registers the pin interrupts
+
+    Args: pin_a : Input Pin of the A signal
+          pin_b : Input Pin of the B signal
+          pin_z : Input Pin of the index signal, None without index
+    Returns : None
+
+    """
+    def __init__(self, pin_a, pin_b, pin_z=None):
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.pin_z = pin_z
+        self.count = 0
+        self.errors = 0
+        self.index_count = 0
+        self.index_seen = False
+        self.state = (pin_a.value() << 1) | pin_b.value()
+        #The bound methods are created once, not in every interrupt
+        self._edge_callback = self._edge
+        pin_a.irq(self._edge_callback, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        pin_b.irq(self._edge_callback, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        if pin_z is not None:
+            pin_z.irq(self._index, Pin.IRQ_RISING, hard=True)
+
+    """Callback function of the A and B interrupts : counts the transition
+
+    Args: pin
+    Returns : None
+
+    """
+    def _edge(self, pin):
+        state = (self.pin_a.value() << 1) | self.pin_b.value()
+        transition = (self.state << 2) | state
+        self.state = state
+        self.count += _TRANSITIONS[transition]
+        self.errors += _INVALID[transition]
+
+    """Callback function of the Z interrupt : stores the count at the index
+
+    Args: pin
+    Returns : None
+
+    """
+    def _index(self, pin):
+        self.index_count = self.count
+        self.index_seen = True
+
+    """Helper Method : Waits for the next index, index_seen is set at its rising edge
+
+    Args: None
+    Returns : None
+
+    """
+    def arm_index(self):
+        self.index_seen = False
+
+    """Helper Method : Sets the count, e.g. 0 at the index when homing
+
+    Args: count : New count
+    Returns : None
+
+    """
+    def reset(self, count=0):
+        self.index_count += count - self.count
+        self.count = count
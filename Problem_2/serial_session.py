@@ -0,0 +1,311 @@
+"""This is the serial_session script of UART_Host_to_uc.py
+
+Provides the serial connection of the Host to the Raspberry Pi Pico:
+i) The port is discovered by the USB vendor and product id of the Pico with
+   serial.tools.list_ports on Linux and Windows alike. No port is opened to
+   find it, so discovery takes milliseconds instead of a timeout per port.
+ii) The discovered port is cached (together with the USB serial number) in a
+    small JSON file. Later launches and reconnections use the cached port
+    while its device exists and skip the search, the ports are only listed
+    when it is gone, and the Pico is then found again by its serial number
+    even under another port name.
+iii) SerialSession keeps one connection open for the lifetime of the program.
+     If the Pico is unplugged or restarted, the next read or write rediscovers
+     the port and reconnects automatically.
+iv) Any port name or pyserial URL can be given instead of discovery, e.g. a
+    pty of a device simulator or "loop://" for tests without hardware.
+"""
+
+import json
+import os
+import time
+
+import serial as pyserial
+import serial.tools.list_ports
+
+# USB (vendor id, product id) of the Raspberry Pi Pico running MicroPython and the Pico SDK USB serial
+PICO_USB_IDS = [(0x2E8A, 0x0005), (0x2E8A, 0x000A)]
+
+# Serial ports that are tried when no port with a known USB id is found (USB to UART adapters)
+FALLBACK_PORTS = ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyUSB0", "/dev/ttyUSB1"]
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "rpi_pico_host", "port.json")
+
+
+"""Helper Method to parse USB ids given on the command line
+
+    Args: text : "VID:PID" in hexadecimal, e.g. "2e8a:0005"
+    Returns : (vendor id, product id)
+
+"""
+def parse_usb_id(text):
+    vid, pid = text.split(":")
+    return int(vid, 16), int(pid, 16)
+
+
+"""Helper Method to get the cache key of a list of USB ids
+
+    Args: usb_ids : list of (vendor id, product id)
+    Returns : Key string, e.g. "2e8a:0005,2e8a:000a"
+
+"""
+def cache_key(usb_ids):
+    return ",".join("%04x:%04x" % usb_id for usb_id in usb_ids)
+
+
+"""Helper Method to list the serial ports with one of the given USB ids
+
+    Args: usb_ids : list of (vendor id, product id)
+    Returns : list of serial.tools.list_ports ListPortInfo, in the order of the port names
+
+"""
+def matching_ports(usb_ids):
+    ports = [port for port in serial.tools.list_ports.comports() if (port.vid, port.pid) in usb_ids]
+    return sorted(ports, key=lambda port: port.device)
+
+
+class PortCache:
+
+    """Helper Method : Initialisation of the port cache
+
+    Args: path : Path of the JSON cache file, None disables the cache
+    Returns : None
+
+    """
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.path = path
+
+    """Helper Method : Cached port of the given USB ids
+
+    Args: key : Cache key of the USB ids
+    Returns : Dictionary with device and serial_number, or None
+
+    """
+    def get(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f).get(key)
+        except (OSError, ValueError):
+            return None
+
+    """Helper Method : Stores the discovered port of the given USB ids
+
+    Args: key : Cache key of the USB ids
+          port : ListPortInfo of the discovered port, None removes the entry
+    Returns : None
+
+    """
+    def put(self, key, port):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+
+        if port is None:
+            entries.pop(key, None)
+        else:
+            entries[key] = {"device": port.device, "serial_number": port.serial_number}
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+
+"""Helper Method to check that a port still exists, without listing the ports
+
+    Args: device : Port name
+    Returns : True if the device file exists, or for port names that are not paths (COM3) if the port opens
+
+"""
+def port_exists(device):
+    if os.path.isabs(device):
+        return os.path.exists(device)
+    try:
+        with pyserial.Serial(device, 9600, timeout=0):
+            return True
+    except (OSError, pyserial.SerialException):
+        return False
+
+
+"""Helper Method to discover the serial port of the Raspberry Pi Pico
+
+    Args: usb_ids : list of (vendor id, product id) of the Pico
+          cache : Optional PortCache
+          fallback_ports : Ports that are probed by opening them when no port has a known USB id
+    Returns : Port name or None
+
+"""
+def discover_port(usb_ids=PICO_USB_IDS, cache=None, fallback_ports=FALLBACK_PORTS):
+    key = cache_key(usb_ids)
+
+    #The cached port is used without listing the ports while it exists
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None and port_exists(cached["device"]):
+        return cached["device"]
+
+    ports = matching_ports(usb_ids)
+    #A restarted Pico can come back with another port name, it keeps its serial number
+    if cached is not None and cached["serial_number"] is not None:
+        ports = [port for port in ports if port.serial_number == cached["serial_number"]] or ports
+
+    if ports:
+        if cache is not None:
+            cache.put(key, ports[0])
+        return ports[0].device
+
+    #Adapters without a known USB id are found by opening their port
+    for port in fallback_ports:
+        try:
+            with pyserial.Serial(port, 9600, timeout=0):
+                return port
+        except (OSError, pyserial.SerialException):
+            pass
+    return None
+
+
+class SerialSession:
+
+    """Helper Method : Initialisation of the serial session, the port is opened on first use
+
+    Args: port : Port name or pyserial URL, None to discover the port
+          baudrate : Baud rate of the UART
+          timeout : Read timeout in seconds
+          usb_ids : list of (vendor id, product id) used for discovery
+          cache : Optional PortCache used for discovery
+          reconnect_attempts : Number of reconnection attempts after the connection is lost
+          reconnect_delay : Seconds between two reconnection attempts
+    Returns : None
+
+    """
+    def __init__(self, port=None, baudrate=9600, timeout=1, usb_ids=PICO_USB_IDS, cache=None,
+                 reconnect_attempts=10, reconnect_delay=0.5):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.usb_ids = usb_ids
+        self.cache = cache
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.serial = None
+        self.device = None
+        self.reconnects = 0
+
+    """Helper Method : Opens the connection if it is not open
+
+    Args: None
+    Returns : Open pyserial Serial instance
+    Raises : pyserial.SerialException if no port is found or it cannot be opened
+
+    """
+    def connect(self):
+        if self.serial is not None and self.serial.is_open:
+            return self.serial
+
+        device = self.port or discover_port(self.usb_ids, self.cache)
+        if device is None:
+            raise pyserial.SerialException("No serial port detected")
+
+        try:
+            self.serial = pyserial.serial_for_url(device, self.baudrate, timeout=self.timeout)
+        except (OSError, pyserial.SerialException):
+            #The cached port does not open, the next attempt lists the ports
+            if self.port is None and self.cache is not None:
+                self.cache.put(cache_key(self.usb_ids), None)
+            raise
+        self.device = device
+        return self.serial
+
+    """Helper Method : Closes the connection and connects again, rediscovering the port
+
+    Args: None
+    Returns : Open pyserial Serial instance
+    Raises : pyserial.SerialException if all reconnection attempts fail
+
+    """
+    def reconnect(self):
+        self.close()
+        self.reconnects += 1
+
+        #discover_port lists the ports again when the cached port is gone
+        error = None
+        for attempt in range(0, self.reconnect_attempts):
+            try:
+                return self.connect()
+            except (OSError, pyserial.SerialException) as err:
+                error = err
+                time.sleep(self.reconnect_delay)
+        raise pyserial.SerialException(f"Reconnection failed: {error}")
+
+    """Helper Method : Runs an operation on the connection and retries it once after reconnecting
+
+    Args: operation : Function of the open Serial instance
+    Returns : Result of the operation
+
+    """
+    def _call(self, operation):
+        try:
+            return operation(self.connect())
+        except (OSError, pyserial.SerialException):
+            return operation(self.reconnect())
+
+    """Helper Method : Writes bytes to the device
+
+    Args: data : bytes
+    Returns : Number of bytes written
+
+    """
+    def write(self, data):
+        return self._call(lambda ser: ser.write(data))
+
+    """Helper Method : Reads up to size bytes, waits at most timeout seconds
+
+    Args: size : Maximum number of bytes
+    Returns : bytes
+
+    """
+    def read(self, size=1):
+        return self._call(lambda ser: ser.read(size))
+
+    """Helper Method : Reads one line, waits at most timeout seconds
+
+    Args: None
+    Returns : bytes including the line end, or the bytes read until the timeout
+
+    """
+    def readline(self):
+        return self._call(lambda ser: ser.readline())
+
+    """Helper Method : Number of received bytes that can be read without waiting
+
+    Args: None
+    Returns : Number of bytes
+
+    """
+    @property
+    def in_waiting(self):
+        return self._call(lambda ser: ser.in_waiting)
+
+    def close(self):
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except (OSError, pyserial.SerialException):
+                pass
+            self.serial = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,203 @@
+"""This is the simulate_encoder script
+
+Runs the encoder functions of main.py on the Host with the shims of
+host_shim/ (virtual time), against EncoderSimulator, which follows the step
+and direction pins like the motor and drives the A, B and Z signals of the
+encoder (and their complements) on the encoder pins. The script checks:
+i) Homing : home_to_index stops at the index, wherever the motor starts.
+ii) Decoding : the count of quadrature.py against the count of the simulated
+    encoder over planned moves in both directions, without invalid
+    transitions.
+iii) Closed loop : with a motor that loses every Nth step, the position error
+     after a batch of moves without and with closed_loop.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "host_shim"))
+
+import utime
+import uasyncio
+import uart_protocol
+from simulate_firmware import HostStream, run_firmware
+
+# A and B of the 4 counts of a cycle, A leads B in the positive direction
+_QUADRATURE = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+
+class EncoderSimulator:
+
+    """Helper Method : Initialisation of the simulated motor and encoder
+
+    Args: step_pin : Step Pin of the firmware, every rising edge is a step
+          dir_pin : Direction Pin of the firmware, 1 for the negative direction
+          pins : Encoder Pins (A+, B+, Z+, A-, B-, Z-)
+          steps_per_revolution : Steps of one revolution of the motor
+          counts_per_revolution : Counts of one revolution of the encoder
+          start_step : Position of the motor in steps
+          index_count : Count of the index in a revolution
+          lose_every : The motor loses every Nth step, 0 for none
+    Returns : None
+
+    """
+    def __init__(self, step_pin, dir_pin, pins, steps_per_revolution, counts_per_revolution,
+                 start_step=0, index_count=0, lose_every=0):
+        self.dir_pin = dir_pin
+        self.pins = pins
+        self.steps_per_revolution = steps_per_revolution
+        self.counts_per_revolution = counts_per_revolution
+        self.index_count = index_count
+        self.lose_every = lose_every
+        self.step = start_step
+        self.count = self.count_of(start_step)
+        self.steps_seen = 0
+        self.lost = 0
+        self._drive()
+        step_pin.watch(self._step)
+
+    def count_of(self, step):
+        return (step * self.counts_per_revolution) // self.steps_per_revolution
+
+    """Helper Method : Count relative to the nearest index
+
+    Args: None
+    Returns : Count
+
+    """
+    def count_from_index(self):
+        half = self.counts_per_revolution // 2
+        return (self.count - self.index_count + half) % self.counts_per_revolution - half
+
+    """Callback function of the step pin : moves the motor one step and the encoder with it
+
+    Args: pin : Step Pin
+    Returns : None
+
+    """
+    def _step(self, pin):
+        if not pin.value():
+            return
+        self.steps_seen += 1
+        if self.lose_every and self.steps_seen % self.lose_every == 0:
+            self.lost += 1
+            return
+        self.step += -1 if self.dir_pin.value() else 1
+        target = self.count_of(self.step)
+        while self.count != target:
+            self.count += 1 if target > self.count else -1
+            self._drive()
+
+    """Helper Method : Drives the encoder pins for the current count, one signal changes per count
+
+    Args: None
+    Returns : None
+
+    """
+    def _drive(self):
+        a, b = _QUADRATURE[self.count & 3]
+        z = 1 if self.count % self.counts_per_revolution == self.index_count else 0
+        for pin, value in zip(self.pins, (a, b, z, 1 - a, 1 - b, 1 - z)):
+            pin.drive(value)
+
+
+"""Helper Method to send a batch of moves to the firmware tasks and run them
+
+    Args: firmware : main module
+          serial_com : serial_io of the firmware
+          angles : Angles of the moves
+    Returns : True if every move was completed
+
+"""
+def run_batch(firmware, serial_com, angles):
+    stream = HostStream()
+    for sequence in range(0, len(angles)):
+        stream.send(utime.ticks_us(), uart_protocol.encode_move(sequence, angles[sequence]))
+    replies = uasyncio.run(run_firmware(firmware, serial_com, stream, len(angles), 600))
+    return sum(1 for r in replies if r[1] == uart_protocol.CMD_ACK
+               and uart_protocol.decode_ack(r[3])[0] == uart_protocol.STATUS_DONE) == len(angles)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moves", type=int, default=10, help="Number of random moves of every check")
+    parser.add_argument("--start-step", type=int, help="Position of the motor at start up, random by default")
+    parser.add_argument("--index", type=int, default=1234, help="Count of the index in a revolution")
+    parser.add_argument("--lose-every", type=int, default=50, help="The motor loses every Nth step in the closed loop check")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show the print output of main.py")
+    args = parser.parse_args()
+
+    if args.moves < 1 or args.lose_every < 0:
+        print("--moves must be at least 1 and --lose-every not negative")
+        exit()
+
+    random.seed(args.seed)
+    import main as firmware
+    from UART_uc_to_Host import serial_io
+
+    if not 0 <= args.index < firmware.encoder_counts_per_revolution:
+        print("--index must be a count of one revolution")
+        exit()
+    start_step = args.start_step if args.start_step is not None else random.randrange(firmware.steps_per_revolution)
+
+    output = None if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(output) if output is not None else contextlib.nullcontext():
+        serial_com = serial_io()
+        pins = (firmware.pin_A_plus, firmware.pin_B_plus, firmware.pin_Z_plus,
+                firmware.pin_A_minus, firmware.pin_B_minus, firmware.pin_Z_minus)
+        motor = EncoderSimulator(firmware.step_pin, firmware.dir_pin, pins, firmware.steps_per_revolution,
+                                 firmware.encoder_counts_per_revolution, start_step, args.index)
+        firmware.encoder.reset(0)
+        firmware.encoder.errors = 0
+
+        #i) Homing
+        homed = firmware.home_to_index()
+        home_count = motor.count_from_index()
+        home_encoder = firmware.encoder.count
+        homing_ok = homed and abs(home_count) <= 1 and home_encoder == home_count
+        home_step = motor.step
+
+        #ii) Decoding
+        decoding = []
+        for i in range(0, args.moves):
+            angle = random.choice([-1, 1]) * random.randint(1, 720)
+            encoder_count, motor_count = firmware.encoder.count, motor.count
+            firmware.rotate_motor(firmware.angle_to_step_per_revolution_conversion(angle))
+            firmware.step_engine.wait()
+            firmware.position += int(firmware.steps_per_revolution * angle / firmware.one_whole_revolution)
+            decoding.append((angle, firmware.encoder.count - encoder_count, motor.count - motor_count))
+        decoding_ok = all(decoded == counted for _, decoded, counted in decoding) and firmware.encoder.errors == 0
+
+        #iii) Closed loop, the error is the motor position against the step position of the firmware
+        motor.lose_every = args.lose_every
+        angles = [random.choice([-1, 1]) * random.randint(1, 360) for i in range(0, args.moves)]
+        errors = []
+        for closed_loop in (False, True):
+            firmware.closed_loop = closed_loop
+            lost = motor.lost
+            completed = run_batch(firmware, serial_com, angles)
+            errors.append((completed, motor.lost - lost, (motor.step - home_step) - firmware.position))
+        steps_per_count = firmware.steps_per_revolution / firmware.encoder_counts_per_revolution
+        closed_loop_ok = errors[1][0] and abs(errors[1][2]) <= 2 * steps_per_count
+
+    print(f"Homing : motor started at step {start_step}, stopped {home_count} counts from the index, "
+          f"encoder count {home_encoder} {'' if homing_ok else 'FAILED'}")
+    print(f"{'angle':>6} {'decoded':>8} {'encoder':>8}")
+    for angle, decoded, counted in decoding:
+        print(f"{angle:>6} {decoded:>8} {counted:>8} {'' if decoded == counted else 'FAILED'}")
+    print(f"Invalid transitions : {firmware.encoder.errors}")
+    for closed_loop, (completed, lost, error) in zip(("open loop", "closed loop"), errors):
+        print(f"{closed_loop:>11} : {args.moves} moves, {lost} steps lost, position error {error} steps "
+              f"{'' if completed else 'FAILED'}")
+    failures = (not homing_ok) + (not decoding_ok) + (not closed_loop_ok)
+    print("All encoder checks passed" if failures == 0 else f"{failures} checks FAILED")
+    exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""This is the simulate_firmware script
+
+Runs the uasyncio tasks of main.py on the Host with the machine, utime and
+uasyncio shims of host_shim/ (virtual time). The Host side sends a batch of
+move frames at once, as UART_Host_to_uc.py --batch does, and the script checks:
+i) Every command is acknowledged while the moves run, i.e. receiving overlaps
+   the motion, and a corrupted frame is answered with a NACK during a move.
+ii) The queued moves run back to back: the idle time between the last step of
+    a move and the first step of the next one.
+iii) The step pulses and the final position of the telemetry frames against
+     the steps of every move.
+iv) The binary telemetry stream : every sample of telemetry_rate_hz arrives,
+    without gaps in the record numbers or ring buffer overruns, and the last
+    record has the final position. --csv writes the records with
+    telemetry_log.py.
+v) For comparison, the idle time of the previous blocking loop, which waited
+    for the next command only after the move and its 0.25 s and 1 s sleeps.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "host_shim"))
+
+import utime
+import uasyncio
+import uart_protocol
+from telemetry_log import TelemetryLog
+
+# Idle seconds per command of the previous loop : sleep(0.25) and sleep(1) after every move
+LEGACY_IDLE = 1.25
+
+
+class HostStream:
+
+    """Helper Method : Initialisation of the simulated serial input of the Pico
+
+    Args: None
+    Returns : None
+
+    """
+    def __init__(self):
+        self.pending = []
+        self.data = b''
+
+    """Helper Method : Sends bytes to the Pico at a virtual time
+
+    Args: ticks_us : Virtual time of the arrival
+          data : bytes
+    Returns : None
+
+    """
+    def send(self, ticks_us, data):
+        self.pending.append((ticks_us, data))
+        self.pending.sort(key=lambda item: item[0])
+
+    """Helper Method : Non-blocking read of the bytes that arrived until now
+
+    Args: n : Maximum number of bytes
+    Returns : bytes, b'' if none arrived
+
+    """
+    def read(self, n):
+        while self.pending and self.pending[0][0] <= utime.ticks_us():
+            self.data += self.pending.pop(0)[1]
+        data, self.data = self.data[:n], self.data[n:]
+        return data
+
+
+"""Helper Method to run the firmware tasks until every move is done
+
+    Args: firmware : main module
+          serial_com : serial_io of the firmware, send_frame is recorded
+          stream : HostStream with the frames of the Host
+          moves : Number of moves to wait for
+          timeout : Virtual seconds
+    Returns : list of (ticks_us, command, sequence, payload) of the frames sent by the firmware
+
+"""
+async def run_firmware(firmware, serial_com, stream, moves, timeout):
+    replies = []
+    decoder = uart_protocol.FrameDecoder()
+
+    def record(frame):
+        for command, sequence, payload in decoder.feed(frame):
+            replies.append((utime.ticks_us(), command, sequence, payload))
+    serial_com.send_frame = record
+
+    task = uasyncio.create_task(firmware.run_tasks(serial_com, uasyncio.StreamReader(stream)))
+    start = utime.ticks_us()
+    while utime.ticks_diff(utime.ticks_us(), start) < timeout * 1000000:
+        done = [r for r in replies if r[1] == uart_protocol.CMD_ACK
+                and uart_protocol.decode_ack(r[3])[0] == uart_protocol.STATUS_DONE]
+        if len(done) >= moves:
+            break
+        await uasyncio.sleep_ms(10)
+    #The records sampled up to the last move are sent with the next batch
+    await uasyncio.sleep_ms(2 * firmware.telemetry_batch_ms)
+    task.cancel()
+    return replies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--angles", type=int, nargs="+", default=[90, -45, 360, 1, -720, 100])
+    parser.add_argument("--corrupt", type=int, default=3, help="Index of the frame sent with a wrong CRC, -1 for none")
+    parser.add_argument("--verbose", action="store_true", help="Show the print output of main.py")
+    parser.add_argument("--csv", help="Write the telemetry records to this CSV file")
+    args = parser.parse_args()
+
+    if not args.angles:
+        print("--angles needs at least one angle")
+        exit()
+
+    import main as firmware
+    from UART_uc_to_Host import serial_io
+
+    serial_com = serial_io()
+    stream = HostStream()
+    moves = []
+    sequence = 0
+    for i in range(0, len(args.angles)):
+        frame = bytearray(uart_protocol.encode_move(sequence, args.angles[i]))
+        if i == args.corrupt:
+            #The corrupted frame is sent once the first move runs and is not executed
+            frame[-1] ^= 0xFF
+            stream.send(50000, bytes(frame))
+        else:
+            stream.send(0, bytes(frame))
+            moves.append((sequence, args.angles[i]))
+        sequence += 1
+
+    output = None if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(output) if output is not None else contextlib.nullcontext():
+        replies = uasyncio.run(run_firmware(firmware, serial_com, stream, len(moves), 600))
+
+    accepted = {r[2]: r[0] for r in replies if r[1] == uart_protocol.CMD_ACK
+                and uart_protocol.decode_ack(r[3])[0] == uart_protocol.STATUS_ACCEPTED}
+    done = {r[2]: r[0] for r in replies if r[1] == uart_protocol.CMD_ACK
+            and uart_protocol.decode_ack(r[3])[0] == uart_protocol.STATUS_DONE}
+    nacks = [(r[0], r[2]) for r in replies if r[1] == uart_protocol.CMD_NACK]
+    telemetry = [uart_protocol.decode_telemetry(r[3]) for r in replies if r[1] == uart_protocol.CMD_TELEMETRY]
+    log = TelemetryLog()
+    log.feed_frames([r[1:] for r in replies])
+
+    #Split the step pulses into the moves, a move starts half an interval before its first edge
+    rising = [t for t, value in firmware.step_pin.history if value]
+    falling = [t for t, value in firmware.step_pin.history if not value]
+    failures = 0
+    first = 0
+    previous_end = None
+    idle = 0
+    position = 0
+    print(f"{'seq':>4} {'angle':>6} {'steps':>6} {'accepted ms':>12} {'start ms':>9} {'done ms':>8} {'idle ms':>8}")
+    for sequence, angle in moves:
+        steps = int(firmware.steps_per_revolution * abs(angle) / firmware.one_whole_revolution)
+        position += steps if angle >= 0 else -steps
+        profile = firmware.plan_profile(steps)
+        start = max(rising[first] - profile.interval(0) // 2, 0) if steps else None
+        end = falling[first + steps - 1] if steps else None
+        gap = (start - previous_end) / 1000 if steps and previous_end is not None else 0.0
+        idle += gap
+        ok = sequence in accepted and sequence in done and first + steps <= len(rising)
+        failures += not ok
+        print(f"{sequence:>4} {angle:>6} {steps:>6} {accepted.get(sequence, 0) / 1000:>12.1f} "
+              f"{(start or 0) / 1000:>9.1f} {done.get(sequence, 0) / 1000:>8.1f} {gap:>8.2f} {'' if ok else 'FAILED'}")
+        first += steps
+        previous_end = end if steps else previous_end
+
+    last_done = max(done.values()) if done else 0
+    overlapped = bool(accepted) and max(accepted.values()) < last_done
+    nack_ok = args.corrupt < 0 or args.corrupt >= len(args.angles) or (len(nacks) == 1 and nacks[0][0] < last_done)
+    pulses_ok = len(rising) == first
+    position_ok = bool(telemetry) and telemetry[-1][1] == position
+    failures += not (overlapped and nack_ok and pulses_ok and position_ok)
+
+    #Every sample of the timer from the start of the tasks, at exact intervals
+    samples = log.rows()
+    period = 1000000 / firmware.telemetry_rate_hz
+    stream_ok = (log.records >= int(last_done / period) and log.lost == 0 and firmware.telemetry.overruns == 0
+                 and all(abs(b[0] - a[0] - period) <= 1 for a, b in zip(samples, samples[1:]))
+                 and samples[-1][1] == position)
+    failures += not stream_ok
+    if args.csv:
+        log.write_csv(args.csv)
+
+    print(f"Commands accepted while the motor moves : {overlapped}, NACKs : {len(nacks)}")
+    print(f"Step pulses : {len(rising)} of {first}, telemetry frames : {len(telemetry)}, "
+          f"final position : {telemetry[-1][1] if telemetry else None} of {position}")
+    print(f"Telemetry stream : {log.records} records at {firmware.telemetry_rate_hz} Hz in {log.batches} batches, "
+          f"{log.lost} lost, {firmware.telemetry.overruns} overruns, last position "
+          f"{samples[-1][1] if samples else None} {'' if stream_ok else 'FAILED'}")
+    print(f"Idle time between moves : {idle:.2f} ms, previous loop : {LEGACY_IDLE * 1000 * len(moves):.0f} ms")
+    print(f"All {len(moves)} moves done in {last_done / 1000000:.2f} s" if failures == 0 else f"{failures} checks FAILED")
+    exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
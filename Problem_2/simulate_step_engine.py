@@ -0,0 +1,131 @@
+"""This is the simulate_step_engine script
+
+Runs the step generation of main.py on the Host with the machine and utime
+shims of host_shim/ (virtual time) and checks every move:
+i) The number of pulses on the step pin against the steps of
+   angle_to_step_per_revolution_conversion.
+ii) The period of every pulse of a constant rate move against the rate.
+iii) The time of every step of a planned move (rotate_motor) against the
+     interval table of motion_planner.py, exact to one tick of the timer
+     engine, and the duration of the move.
+iv) For comparison, the previous method of main.py: a periodic timer that
+     toggles the step pin, utime.sleep_ms(steps), the printing and the 0.25 s
+     sleep before tim.deinit().
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "host_shim"))
+
+from machine import Pin, Timer
+import utime
+
+
+"""Helper Method to move the motor like the previous version of main.py
+
+    Args: step_pin : Step Pin
+          steps : Steps of angle_to_step_per_revolution_conversion
+          delay : Microseconds between two edges
+    Returns : None
+
+"""
+def legacy_move(step_pin, steps, delay=500):
+    tim = Timer()
+    tim.init(freq=1000000 // delay, mode=Timer.PERIODIC, callback=lambda t: step_pin.value(not step_pin.value()))
+    utime.sleep_ms(int(steps))
+    utime.sleep(0.25)
+    tim.deinit()
+
+
+"""Helper Method to measure the pulses of one move on the step pin
+
+    Args: step_pin : Step Pin with the history of the move
+    Returns : (number of pulses, mean period in us, largest deviation of a period from the mean in us, duration in us)
+
+"""
+def pulse_stats(step_pin):
+    rising = [t for t, value in step_pin.history if value]
+    if len(rising) < 2:
+        return len(rising), 0.0, 0.0, 0
+    periods = [b - a for a, b in zip(rising, rising[1:])]
+    mean = sum(periods) / len(periods)
+    duration = step_pin.history[-1][0] - step_pin.history[0][0]
+    return len(rising), mean, max(abs(p - mean) for p in periods), duration
+
+
+"""Helper Method to compare the steps of a planned move with its interval table
+
+    Args: step_pin : Step Pin with the history of the move
+          start_us : Virtual time at which the move was started
+          table : Interval table of the move
+    Returns : (number of pulses, largest difference of a step end from the table in us, duration in us)
+
+"""
+def table_error(step_pin, start_us, table):
+    #A step ends with its falling edge, at the sum of the intervals up to it
+    falling = [t - start_us for t, value in step_pin.history if not value]
+    error = 0
+    end = 0
+    for i in range(0, min(len(falling), len(table))):
+        end += table[i]
+        error = max(error, abs(falling[i] - end))
+    return len(falling), error, falling[-1] if falling else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--angles", type=int, nargs="+", default=[1, 45, -85, 100, 360, -720])
+    parser.add_argument("--delay", type=int, default=500, help="Microseconds between two edges of the step signal")
+    parser.add_argument("--motion-profile", choices=["trapezoid", "scurve"], help="Profile of the planned moves")
+    args = parser.parse_args()
+
+    if args.delay < 1:
+        print("--delay must be at least 1")
+        exit()
+
+    #The firmware is imported with the shims, its main() is not run
+    import main as firmware
+    from motion_planner import plan_move
+    if args.motion_profile is not None:
+        firmware.motion_profile = args.motion_profile
+    steps_per_degree = firmware.steps_per_revolution / firmware.one_whole_revolution
+
+    print(f"{'angle':>6} {'steps':>6} {'legacy':>7} {'fixed':>7} {'jitter us':>10} {'fixed ms':>9} "
+          f"{'planned':>8} {'error us':>9} {'planned ms':>11}")
+    failures = 0
+    for angle in args.angles:
+        steps = int(firmware.angle_to_step_per_revolution_conversion(angle))
+
+        step_pin = Pin(26, Pin.OUT)
+        legacy_move(step_pin, steps, args.delay)
+        legacy_pulses = step_pin.pulses()
+
+        #Constant rate
+        firmware.step_pin.history = []
+        firmware.step_engine.start(steps, 1000000 / (2 * args.delay))
+        firmware.step_engine.wait()
+        pulses, period, jitter, duration = pulse_stats(firmware.step_pin)
+        ok = pulses == steps and (steps < 2 or abs(period - 2 * args.delay) < 1)
+
+        #Planned velocity profile
+        table = plan_move(steps, firmware.max_velocity * steps_per_degree, firmware.acceleration * steps_per_degree,
+                          firmware.motion_profile, firmware.start_velocity * steps_per_degree).table()
+        firmware.step_pin.history = []
+        start_us = utime.ticks_us()
+        firmware.rotate_motor(steps)
+        firmware.step_engine.wait()
+        planned_pulses, error, planned_duration = table_error(firmware.step_pin, start_us, table)
+        ok = ok and planned_pulses == steps and error <= firmware.step_engine.tick_us
+
+        failures += not ok
+        print(f"{angle:>6} {steps:>6} {legacy_pulses:>7} {pulses:>7} {jitter:>10.2f} {duration / 1000:>9.1f} "
+              f"{planned_pulses:>8} {error:>9} {planned_duration / 1000:>11.1f} {'' if ok else 'FAILED'}")
+
+    print("All moves emitted exactly their steps" if failures == 0 else f"{failures} moves FAILED")
+    exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
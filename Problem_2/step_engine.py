@@ -0,0 +1,402 @@
+"""This is the step_engine script of main.py
+
+Generates exactly the requested number of step pulses, instead of a timer
+that toggles the step pin until the move has slept long enough:
+i) PioStepEngine runs a PIO state machine of the RP2040. The number of steps
+   is written to its FIFO and DMA channels feed it the delay of every step,
+   the state machine emits the pulses without the CPU and raises an interrupt
+   when it is done. The timing is exact to one PIO cycle and not limited by
+   Python interrupts.
+ii) TimerStepEngine is the fallback for boards without PIO and for the Host
+    shim: a machine.Timer toggles the step pin and stops itself after
+    2 * steps edges, so the step count does not depend on sleeps. For a
+    planned move the timer ticks at a fixed rate (tick_us) and counts down
+    integer ticks to the next edge, its interrupt allocates nothing.
+iii) Both engines have the same interface: start(steps, rate) for a constant
+     step rate and start_move(prepare(profile)) for a
+     motion_planner.MotionProfile return at once, busy() and wait() tell when
+     the move is done and steps_done() how many steps of it were emitted. A
+     move is replayed from its ramp, its cruise steps and the reversed ramp,
+     there is no table of every step: the PIO engine chains one DMA channel
+     per part and counts the steps from the X register of the state machine.
+"""
+
+from array import array
+from machine import Timer
+import utime
+
+
+class TimerStepEngine:
+
+    """Helper Method : Initialisation of the timer step engine
+
+    Args: step_pin : Output Pin of the step signal
+          timer : machine.Timer to use, a new one by default
+          tick_us : Period of the timer of start_move in microseconds, the resolution of the step times
+    Returns : None
+
+    """
+    def __init__(self, step_pin, timer=None, tick_us=10):
+        self.step_pin = step_pin
+        self.timer = timer if timer is not None else Timer()
+        self.tick_us = tick_us
+        self.edges = 0
+        self.edges_left = 0
+        self.ticks_left = 0
+        self.carry = 0
+        self.ramp = None
+        self.ramp_steps = 0
+        self.cruise_end = 0
+        self.cruise_interval = 0
+        self.last_step = 0
+        #The bound methods are created once, not in every interrupt
+        self._edge_callback = self._edge
+        self._tick_callback = self._tick
+
+    """Helper Method : Starts a move, returns at once
+
+    Args: steps : Number of step pulses
+          rate : Steps per second
+    Returns : None
+
+    """
+    def start(self, steps, rate):
+        self.stop()
+        #steps_done counts the new move from here on, before the move is published to the telemetry
+        self.edges = 0
+        if steps <= 0:
+            return
+        self.edges = 2 * steps
+        self.edges_left = 2 * steps
+        self.timer.init(freq=2 * rate, mode=Timer.PERIODIC, callback=self._edge_callback)
+
+    """Callback function of the timer : one edge of the step signal, the timer stops itself after the last edge
+
+    Args: timer
+    Returns : None
+
+    """
+    def _edge(self, timer):
+        left = self.edges_left - 1
+        self.edges_left = left
+        #The pin is high after an odd number of edges and low after the last one
+        self.step_pin.value((self.edges - left) & 1)
+        if left == 0:
+            timer.deinit()
+
+    """Helper Method : Move of a planned profile for start_move, the intervals are already in microseconds
+
+    Args: profile : motion_planner.MotionProfile
+    Returns : (ramp, cruise_steps, cruise_interval)
+
+    """
+    def prepare(self, profile):
+        return profile.ramp, profile.cruise_steps, profile.cruise_interval
+
+    """Helper Method : Starts a planned move, returns at once. The ramp, the cruise steps and the reversed
+    ramp are replayed from the move, there is no table of every step. The timer runs at a fixed rate for
+    the whole move and counts down the ticks to the next edge, so its interrupt only does integer
+    arithmetic and allocates nothing
+
+    Args: move : Move of prepare
+    Returns : None
+
+    """
+    def start_move(self, move):
+        self.stop()
+        #steps_done counts the new move from here on, before the move is published to the telemetry
+        self.edges = 0
+        ramp, cruise_steps, cruise_interval = move
+        steps = 2 * len(ramp) + cruise_steps
+        if steps <= 0:
+            return
+        self.ramp = ramp
+        self.ramp_steps = len(ramp)
+        self.cruise_end = len(ramp) + cruise_steps
+        self.cruise_interval = cruise_interval
+        self.last_step = steps - 1
+        self.edges = 2 * steps
+        self.edges_left = 2 * steps
+        self.carry = 0
+        self._wait(self._interval(0) // 2)
+        self.timer.init(freq=1000000 // self.tick_us, mode=Timer.PERIODIC, callback=self._tick_callback)
+
+    """Helper Method : Interval of one step of the move : the ramp, the cruise interval or the reversed ramp
+
+    Args: i : Index of the step
+    Returns : Interval in microseconds
+
+    """
+    def _interval(self, i):
+        if i < self.ramp_steps:
+            return self.ramp[i]
+        if i < self.cruise_end:
+            return self.cruise_interval
+        return self.ramp[self.last_step - i]
+
+    """Helper Method : Loads the ticks to the next edge. The remainder of the microseconds is carried to
+    the next edge, so the step times do not drift and are exact to one tick
+
+    Args: us : Microseconds to the next edge
+    Returns : None
+
+    """
+    def _wait(self, us):
+        due = us + self.carry
+        ticks = due // self.tick_us
+        if ticks < 1:
+            ticks = 1
+        self.carry = due - ticks * self.tick_us
+        self.ticks_left = ticks
+
+    """Callback function of the timer : one tick, an edge of the step signal when the ticks of the edge are counted down
+
+    Args: timer
+    Returns : None
+
+    """
+    def _tick(self, timer):
+        ticks = self.ticks_left - 1
+        self.ticks_left = ticks
+        if ticks:
+            return
+        left = self.edges_left - 1
+        self.edges_left = left
+        done = self.edges - left
+        self.step_pin.value(done & 1)
+        if left == 0:
+            timer.deinit()
+            return
+        #Both edges of a step take half of its interval, the odd microsecond goes to the low half
+        interval = self._interval(done >> 1)
+        self._wait(interval - interval // 2 if done & 1 else interval // 2)
+
+    def busy(self):
+        return self.edges_left > 0
+
+    """Helper Method : Number of completed step pulses of the current move
+
+    Args: None
+    Returns : Number of steps
+
+    """
+    def steps_done(self):
+        return (self.edges - self.edges_left) // 2
+
+    def wait(self):
+        while self.busy():
+            utime.sleep_ms(1)
+
+    def stop(self):
+        self.timer.deinit()
+        self.edges_left = 0
+        self.step_pin.value(0)
+
+
+"""Helper Method to build the PIO program of PioStepEngine
+
+The program pulls the number of steps - 1, then for every step its half
+period in PIO cycles (minus the cycles of the instructions), emits the pulse
+and raises IRQ 0 of the state machine after the last step. One step takes
+2 * delay + PIO_CYCLES_PER_STEP cycles.
+
+    Args: None
+    Returns : PIO program
+
+"""
+def _step_program():
+    import rp2
+
+    @rp2.asm_pio(set_init=rp2.PIO.OUT_LOW)
+    def step_pulses():
+        pull(block)
+        mov(x, osr)
+        label("step")
+        pull(block)
+        set(pins, 1)
+        mov(y, osr)
+        label("high")
+        jmp(y_dec, "high")
+        set(pins, 0)
+        mov(y, osr)
+        label("low")
+        jmp(y_dec, "low")
+        jmp(x_dec, "step")
+        irq(rel(0))
+
+    return step_pulses
+
+
+# PIO cycles of one step that are not part of the delay loops
+PIO_CYCLES_PER_STEP = 8
+
+
+class PioStepEngine:
+
+    """Helper Method : Initialisation of the PIO step engine
+
+    Args: step_pin : Output Pin of the step signal
+          state_machine : Number of the PIO state machine
+          freq : Clock of the state machine in Hz
+    Returns : None
+    Raises : ImportError or AttributeError if the firmware has no rp2 module or no rp2.DMA
+
+    """
+    def __init__(self, step_pin, state_machine=0, freq=1000000):
+        import rp2
+        #One DMA channel for each part of a move : the ramp, the cruise steps and the reversed ramp
+        self.channels = (rp2.DMA(), rp2.DMA(), rp2.DMA())
+        self.freq = freq
+        self.steps = 0
+        self.running = False
+        self.move = None
+        self.constant = array('I', [0])
+        #Instructions that copy the step counter X of the state machine to its RX FIFO, see steps_done
+        self.snapshot = (rp2.asm_pio_encode("mov(isr, x)", 0), rp2.asm_pio_encode("push(noblock)", 0))
+        self.x = array('i', [0])
+        #DREQ of the TX FIFO: 0 to 3 for PIO0, 8 to 11 for PIO1
+        self.treq = state_machine if state_machine < 4 else state_machine + 4
+        self.sm = rp2.StateMachine(state_machine, _step_program(), freq=freq, set_base=step_pin)
+        self.sm.irq(self._done)
+        self.sm.active(1)
+
+    """Helper Method : Delay of the PIO program for a step interval
+
+    Args: interval : Step interval in microseconds
+    Returns : Delay in PIO cycles, negative if the interval is too short
+
+    """
+    def _delay(self, interval):
+        return (int(interval * self.freq) // 1000000 - PIO_CYCLES_PER_STEP) // 2
+
+    """Helper Method : Starts a move, returns at once
+
+    Args: steps : Number of step pulses
+          rate : Steps per second
+    Returns : None
+    Raises : ValueError if the rate is faster than the state machine clock allows
+
+    """
+    def start(self, steps, rate):
+        #steps_done counts the new move from here on, before the move is published to the telemetry
+        self.steps = 0
+        if steps <= 0:
+            return
+        delay = self._delay(1000000 / rate)
+        if delay < 0:
+            raise ValueError("PioStepEngine : rate too high for the state machine clock")
+        self.constant[0] = delay
+        self.start_move(((self.constant, steps, False),))
+
+    """Helper Method : Converts a planned move into the delays of the PIO program. Only the ramp is
+    converted, it is stored in both directions because the DMA only reads forward
+
+    Args: profile : motion_planner.MotionProfile
+    Returns : Move for start_move : (delays, count, increment) of the ramp, the cruise steps and the reversed ramp
+
+    """
+    def prepare(self, profile):
+        ramp_steps = len(profile.ramp)
+        ramp = array('I', profile.ramp)
+        reverse = array('I', profile.ramp)
+        for i in range(0, ramp_steps):
+            delay = max(self._delay(ramp[i]), 0)
+            ramp[i] = delay
+            reverse[ramp_steps - 1 - i] = delay
+        cruise = array('I', [max(self._delay(profile.cruise_interval), 0)])
+        return ((ramp, ramp_steps, True), (cruise, profile.cruise_steps, False), (reverse, ramp_steps, True))
+
+    """Helper Method : Starts a move, returns at once. Every part of the move has its DMA channel, which
+    starts the channel of the next part when it is done, so the state machine gets the delay of every step
+    without the CPU and without a table of every step
+
+    Args: move : (delays, count, increment) of every part of the move, increment False sends delays[0] count times
+    Returns : None
+
+    """
+    def start_move(self, move):
+        #steps_done counts the new move from here on, before the move is published to the telemetry
+        self.steps = 0
+        parts = [part for part in move if part[1] > 0]
+        steps = 0
+        for delays, count, increment in parts:
+            steps += count
+        if steps <= 0:
+            return
+        self.steps = steps
+        self.move = move
+        self.sm.put(steps - 1)
+        #The state machine waits for the count, steps_done reads X once it is pulled
+        while self.sm.tx_fifo():
+            pass
+        self.running = True
+        #The channels are configured from the last part, the first one is triggered
+        chain_to = self.channels[len(parts) - 1].channel
+        for i in range(len(parts) - 1, -1, -1):
+            delays, count, increment = parts[i]
+            dma = self.channels[i]
+            ctrl = dma.pack_ctrl(size=2, inc_read=increment, inc_write=False, treq_sel=self.treq, chain_to=chain_to)
+            dma.config(read=delays, write=self.sm, count=count, ctrl=ctrl, trigger=i == 0)
+            chain_to = dma.channel
+
+    """Callback function of the state machine interrupt : the move is done
+
+    Args: sm
+    Returns : None
+
+    """
+    def _done(self, sm):
+        self.running = False
+
+    def busy(self):
+        return self.running
+
+    """Helper Method : Number of completed step pulses of the current move, may be called from an interrupt.
+    The state machine counts the steps after the running one down in X, X is copied to the RX FIFO by two
+    instructions executed on the state machine (they delay the running step by two cycles). X is -1 after
+    the last step
+
+    Args: None
+    Returns : Number of steps
+
+    """
+    def steps_done(self):
+        if not self.running:
+            return self.steps
+        self.sm.exec(self.snapshot[0])
+        self.sm.exec(self.snapshot[1])
+        self.sm.get(self.x)
+        done = self.steps - 1 - self.x[0]
+        if done < 0:
+            return 0
+        return done if done < self.steps else self.steps
+
+    def wait(self):
+        while self.running:
+            utime.sleep_ms(1)
+
+    def stop(self):
+        #Restarting the state machine drops the rest of the move
+        for dma in self.channels:
+            dma.active(0)
+        self.sm.active(0)
+        self.sm.restart()
+        self.sm.exec("set(pins, 0)")
+        self.sm.active(1)
+        self.running = False
+
+
+"""Helper Method to create the step engine of the board
+
+    Args: step_pin : Output Pin of the step signal
+          use_pio : Use the PIO engine if the rp2 module with rp2.DMA is available
+    Returns : PioStepEngine or TimerStepEngine
+
+"""
+def make_step_engine(step_pin, use_pio=True):
+    if use_pio:
+        try:
+            return PioStepEngine(step_pin)
+        except (ImportError, AttributeError):
+            pass
+    return TimerStepEngine(step_pin)
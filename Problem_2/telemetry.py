@@ -0,0 +1,92 @@
+"""This is the telemetry script of main.py
+
+Binary telemetry of the Pico, instead of printing every pin value on its own
+line after a move:
+i) TelemetryRing is a ring buffer of packed uart_protocol.TELEMETRY_RECORD
+   records, allocated once at start up. put() is called from a timer
+   interrupt at the sampling rate, it packs one record in place and does not
+   allocate. When the Host does not keep up, the oldest record is dropped and
+   counted in overruns, the motion is never stalled by the telemetry.
+ii) take() moves up to uart_protocol.MAX_BATCH_RECORDS records into the
+    preallocated payload of a CMD_TELEMETRY_BATCH frame, with interrupts
+    disabled so that put() does not change the ring while it is copied.
+iii) The records are numbered (16 bit), the Host finds dropped records as
+     gaps between the numbers of consecutive batches.
+"""
+
+import struct
+import machine
+import uart_protocol
+
+
+class TelemetryRing:
+
+    """Helper Method : Initialisation of the ring buffer, all buffers are preallocated
+
+    Args: capacity : Number of records
+    Returns : None
+
+    """
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("TelemetryRing : capacity must be at least 1")
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * uart_protocol.TELEMETRY_RECORD_SIZE)
+        self.payload = bytearray(uart_protocol.MAX_BATCH_PAYLOAD)
+        self._buffer_view = memoryview(self.buffer)
+        self._payload_view = memoryview(self.payload)
+        self.tail = 0
+        self.count = 0
+        self.first = 0
+        self.overruns = 0
+
+    """Helper Method : Adds a record, drops the oldest one if the ring is full. Called from an interrupt
+
+    Args: ticks_us : utime.ticks_us() of the sample
+          position : Step position
+          encoder_count : Count of the encoder
+          pins : Pin byte, bit i is uart_protocol.PIN_NAMES[i]
+    Returns : None
+
+    """
+    def put(self, ticks_us, position, encoder_count, pins):
+        if self.count == self.capacity:
+            self.tail += 1
+            if self.tail == self.capacity:
+                self.tail = 0
+            self.count -= 1
+            self.first = (self.first + 1) & 0xFFFF
+            self.overruns += 1
+        head = self.tail + self.count
+        if head >= self.capacity:
+            head -= self.capacity
+        struct.pack_into(uart_protocol.TELEMETRY_RECORD, self.buffer, head * uart_protocol.TELEMETRY_RECORD_SIZE,
+                         ticks_us & 0xFFFFFFFF, position, encoder_count, pins)
+        self.count += 1
+
+    """Helper Method : Moves the oldest records into the payload of a CMD_TELEMETRY_BATCH frame
+
+    Args: max_records : Maximum number of records
+    Returns : Length of the payload in self.payload, 0 if the ring is empty
+
+    """
+    def take(self, max_records=uart_protocol.MAX_BATCH_RECORDS):
+        size = uart_protocol.TELEMETRY_RECORD_SIZE
+        state = machine.disable_irq()
+        count = min(self.count, max_records)
+        if count:
+            struct.pack_into(uart_protocol.BATCH_HEADER, self.payload, 0, self.first, count)
+            #The records may wrap around the end of the ring
+            first_part = min(count, self.capacity - self.tail)
+            offset = uart_protocol.BATCH_HEADER_SIZE
+            self._payload_view[offset:offset + first_part * size] = \
+                self._buffer_view[self.tail * size:(self.tail + first_part) * size]
+            if count > first_part:
+                offset += first_part * size
+                self._payload_view[offset:offset + (count - first_part) * size] = \
+                    self._buffer_view[0:(count - first_part) * size]
+            self.tail = (self.tail + count) % self.capacity
+            self.count -= count
+            self.first = (self.first + count) & 0xFFFF
+        machine.enable_irq(state)
+        return uart_protocol.BATCH_HEADER_SIZE + count * size if count else 0
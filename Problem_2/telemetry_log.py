@@ -0,0 +1,204 @@
+"""This is the telemetry_log script
+
+Host side of the binary telemetry of main.py (CMD_TELEMETRY_BATCH frames of
+uart_protocol.py):
+i) TelemetryLog collects the packed records of the batches as they arrive
+   and counts the records that were lost, from the gaps between the record
+   numbers of consecutive batches (ring buffer overruns on the Pico or
+   corrupted frames).
+ii) to_numpy() returns the records as a NumPy structured array, read
+    directly from the packed bytes, and write_csv() writes them with the
+    time in seconds and one column per pin.
+iii) As a script it records the telemetry of the Pico for --seconds or
+     decodes a raw capture of the serial output (--input), and writes --csv,
+     --npy and --raw files.
+"""
+
+import argparse
+import csv
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import serial as pyserial
+
+import uart_protocol
+from serial_session import PICO_USB_IDS, PortCache, SerialSession
+
+# NumPy type of a packed uart_protocol.TELEMETRY_RECORD
+RECORD_DTYPE = [("ticks_us", "<u4"), ("position", "<i4"), ("encoder", "<i4"), ("pins", "u1")]
+
+# utime.ticks_us() of MicroPython wraps around after 2^30 us
+TICKS_PERIOD = 1 << 30
+
+
+class TelemetryLog:
+
+    """Helper Method : Initialisation of an empty telemetry log
+
+    Args: None
+    Returns : None
+
+    """
+    def __init__(self):
+        self.data = bytearray()
+        self.records = 0
+        self.batches = 0
+        self.lost = 0
+        self.next_number = None
+
+    """Helper Method : Adds the records of a CMD_TELEMETRY_BATCH payload
+
+    Args: payload : Payload of the frame
+    Returns : Number of records
+    Raises : uart_protocol.FrameError ERR_PAYLOAD if the payload is malformed
+
+    """
+    def feed(self, payload):
+        first, count, records = uart_protocol.decode_telemetry_batch(payload)
+        if self.next_number is not None:
+            self.lost += (first - self.next_number) & 0xFFFF
+        self.next_number = (first + count) & 0xFFFF
+        self.data += records
+        self.records += count
+        self.batches += 1
+        return count
+
+    """Helper Method : Adds the records of the CMD_TELEMETRY_BATCH frames among decoded frames
+
+    Args: frames : list of (command, sequence, payload) of uart_protocol.FrameDecoder.feed
+    Returns : Number of records
+
+    """
+    def feed_frames(self, frames):
+        return sum(self.feed(payload) for command, sequence, payload in frames
+                   if command == uart_protocol.CMD_TELEMETRY_BATCH)
+
+    """Helper Method : Unpacks the records
+
+    Args: None
+    Returns : list of (ticks_us, position, encoder, pins)
+
+    """
+    def rows(self):
+        return list(struct.iter_unpack(uart_protocol.TELEMETRY_RECORD, self.data))
+
+    """Helper Method : Times of the records from the first one, across wrap arounds of ticks_us
+
+    Args: None
+    Returns : list of seconds
+
+    """
+    def seconds(self):
+        times = []
+        elapsed = 0
+        previous = None
+        for ticks, _, _, _ in self.rows():
+            if previous is not None:
+                elapsed += (ticks - previous) % TICKS_PERIOD
+            previous = ticks
+            times.append(elapsed / 1000000)
+        return times
+
+    """Helper Method : Records as a NumPy structured array (fields of RECORD_DTYPE)
+
+    Args: None
+    Returns : numpy.ndarray
+    Raises : ImportError if NumPy is not installed
+
+    """
+    def to_numpy(self):
+        if np is None:
+            raise ImportError("TelemetryLog.to_numpy needs NumPy")
+        return np.frombuffer(bytes(self.data), dtype=np.dtype(RECORD_DTYPE))
+
+    """Helper Method : Writes the records to a CSV file
+
+    Args: path : Path of the CSV file
+    Returns : None
+
+    """
+    def write_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["seconds", "ticks_us", "position", "encoder"] + list(uart_protocol.PIN_NAMES))
+            for seconds, (ticks, position, encoder, pins) in zip(self.seconds(), self.rows()):
+                writer.writerow([f"{seconds:.6f}", ticks, position, encoder] +
+                                [(pins >> i) & 1 for i in range(0, len(uart_protocol.PIN_NAMES))])
+
+
+"""Helper Method to record the telemetry of the Pico
+
+    Args: session : SerialSession or Serial instance
+          seconds : Duration of the recording
+          raw : bytearray that receives the raw serial output, None to discard it
+    Returns : (TelemetryLog, number of corrupted frames)
+
+"""
+def record(session, seconds, raw=None):
+    log = TelemetryLog()
+    decoder = uart_protocol.FrameDecoder()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        data = session.read(max(session.in_waiting, 1))
+        if raw is not None:
+            raw += data
+        log.feed_frames(decoder.feed(data))
+    return log, decoder.errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", help="Port name or pyserial URL, the port is detected if not given")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of the recording")
+    parser.add_argument("--input", help="Decode a raw capture of the serial output instead of recording")
+    parser.add_argument("--csv", help="Write the records to this CSV file")
+    parser.add_argument("--npy", help="Write the records to this .npy file (NumPy structured array)")
+    parser.add_argument("--raw", help="Write the raw serial output to this file")
+    args = parser.parse_args()
+
+    if args.seconds <= 0:
+        print("--seconds must be positive")
+        exit()
+    if args.npy and np is None:
+        print("--npy needs NumPy (pip install numpy)")
+        exit()
+
+    if args.input:
+        with open(args.input, "rb") as f:
+            raw = f.read()
+        log = TelemetryLog()
+        decoder = uart_protocol.FrameDecoder()
+        log.feed_frames(decoder.feed(raw))
+        errors = decoder.errors
+    else:
+        raw = bytearray()
+        try:
+            with SerialSession(args.port, args.baudrate, timeout=0.05, usb_ids=PICO_USB_IDS,
+                               cache=None if args.port else PortCache()) as session:
+                log, errors = record(session, args.seconds, raw if args.raw else None)
+        except pyserial.SerialException as e:
+            print('An Exception Occurred')
+            print('Exception Details ->', e)
+            return
+
+    if args.raw and not args.input:
+        with open(args.raw, "wb") as f:
+            f.write(raw)
+    if args.csv:
+        log.write_csv(args.csv)
+    if args.npy:
+        np.save(args.npy, log.to_numpy())
+
+    span = log.seconds()[-1] if log.records else 0
+    print(f"{log.records} records in {log.batches} batches over {span:.2f} s, "
+          f"{log.lost} records lost, {errors} corrupted frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""This is the test_motion_planner script
+
+Host tests of motion_planner.py, run with "python test_motion_planner.py" or
+with pytest:
+i) Every move has one interval per step and its duration is the sum of its
+   intervals, a move of 0 or fewer steps has an empty table.
+ii) The step rate never exceeds max_velocity.
+iii) The acceleration, measured from the average velocity of consecutive
+     windows of 20 ms, does not exceed the acceleration of the plan for the
+     trapezoid and the S-curve profile.
+iv) A move too short to reach max_velocity gets a triangular profile : it
+    does not cruise and its peak velocity stays below max_velocity.
+"""
+
+import math
+import sys
+
+from motion_planner import PROFILES, plan_move
+
+# Settings of main.py in steps : 6400 steps per revolution, 180 degrees/s, 360 degrees/s^2
+# and a start velocity of 56.25 degrees/s, and plans with other rates
+STEPS_PER_DEGREE = 6400 / 360
+SETTINGS = [(180 * STEPS_PER_DEGREE, 360 * STEPS_PER_DEGREE, 56.25 * STEPS_PER_DEGREE),
+            (180 * STEPS_PER_DEGREE, 360 * STEPS_PER_DEGREE, 0),
+            (20000, 50000, 0),
+            (777, 3000, 13)]
+
+# Moves of 1 step up to 720 degrees
+MOVES = [1, 2, 3, 50, 101, 1000, 1500, 12800]
+
+# Length of the windows of the acceleration measurement in us. Step times are rounded to
+# whole microseconds, over 20 ms this changes the measured acceleration by less than 1 %
+WINDOW_US = 20000
+ACCELERATION_TOLERANCE = 1.01
+
+
+"""Helper Method to measure the largest acceleration of a planned move
+
+The intervals are grouped into consecutive windows of at least window_us. The
+average velocity of a window is the velocity at its middle for a constant
+acceleration, so the acceleration between two windows is the change of the
+average velocity over the time between their middles.
+
+    Args: table : Intervals of the steps in microseconds
+          window_us : Shortest duration of a window
+    Returns : Largest acceleration in steps/s^2, 0 for moves shorter than two windows
+
+"""
+def windowed_acceleration(table, window_us=WINDOW_US):
+    windows = []
+    steps = span = 0
+    for interval in table:
+        steps += 1
+        span += interval
+        if span >= window_us:
+            windows.append((steps, span))
+            steps = span = 0
+    return max((abs(steps_b * 1e6 / span_b - steps_a * 1e6 / span_a) / ((span_a + span_b) / 2e6)
+                for (steps_a, span_a), (steps_b, span_b) in zip(windows, windows[1:])), default=0)
+
+
+def test_empty_move():
+    for profile in PROFILES:
+        for steps in (0, -1, -6400):
+            move = plan_move(steps, *SETTINGS[0][:2], profile, SETTINGS[0][2])
+            assert len(move.table()) == 0 and move.steps == 0 and move.duration_us() == 0
+
+
+def test_table_length_and_duration():
+    for profile in PROFILES:
+        for max_velocity, acceleration, start_velocity in SETTINGS:
+            for steps in MOVES:
+                move = plan_move(steps, max_velocity, acceleration, profile, start_velocity)
+                table = move.table()
+                assert len(table) == steps
+                assert move.duration_us() == sum(table)
+                assert [move.interval(i) for i in range(0, steps)] == list(table)
+
+
+def test_peak_velocity():
+    for profile in PROFILES:
+        for max_velocity, acceleration, start_velocity in SETTINGS:
+            for steps in MOVES:
+                table = plan_move(steps, max_velocity, acceleration, profile, start_velocity).table()
+                assert 1e6 / min(table) <= max_velocity
+
+
+def test_acceleration():
+    for profile in PROFILES:
+        for max_velocity, acceleration, start_velocity in SETTINGS:
+            for steps in MOVES:
+                table = plan_move(steps, max_velocity, acceleration, profile, start_velocity).table()
+                assert windowed_acceleration(table) <= acceleration * ACCELERATION_TOLERANCE
+
+
+def test_short_move_is_triangular():
+    for profile in PROFILES:
+        for max_velocity, acceleration, start_velocity in SETTINGS:
+            #Steps needed to accelerate to max_velocity and stop again
+            factor = 0.5 if profile == "trapezoid" else math.pi / 4
+            full_ramps = 2 * factor * (max_velocity ** 2 - start_velocity ** 2) / acceleration
+            for steps in MOVES:
+                if steps >= full_ramps:
+                    continue
+                move = plan_move(steps, max_velocity, acceleration, profile, start_velocity)
+                table = move.table()
+                assert move.cruise_steps <= 1
+                assert 1e6 / min(table) < max_velocity
+                assert list(table) == list(reversed(table))
+
+
+def test_invalid_arguments():
+    for arguments in ((100, 0, 1000), (100, 1000, 0), (100, 1000, 1000, "linear"), (100, 1000, 1000, "trapezoid", -1)):
+        try:
+            plan_move(*arguments)
+        except ValueError:
+            continue
+        raise AssertionError(f"plan_move{arguments} did not raise ValueError")
+
+
+if __name__ == "__main__":
+    tests = [(name, function) for name, function in sorted(globals().items()) if name.startswith("test_")]
+    failures = 0
+    for name, function in tests:
+        try:
+            function()
+            print(f"{name} : passed")
+        except AssertionError as e:
+            failures += 1
+            print(f"{name} : FAILED {e}")
+    print(f"All {len(tests)} tests passed" if failures == 0 else f"{failures} tests FAILED")
+    sys.exit(1 if failures else 0)
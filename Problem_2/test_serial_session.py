@@ -0,0 +1,151 @@
+"""This is the test_serial_session script
+
+Host tests of serial_session.py against the pseudo terminals of
+pico_simulator.py, run with "python test_serial_session.py" or with pytest.
+The simulated Pico is reached through a link in a temporary directory, which
+stands for its device file, and serial.tools.list_ports is replaced by a list
+of fake USB ports:
+i) A cached port whose device exists is used without listing the ports, and
+   the session exchanges frames with the simulator.
+ii) When the device of the cached port is gone, reconnect() lists the ports,
+    finds the Pico by its serial number under another port name, updates the
+    cache and the session works again.
+iii) Without a cache the first port with a Pico USB id is used.
+"""
+
+import os
+import sys
+import tempfile
+
+import serial.tools.list_ports
+
+import uart_protocol
+from pico_simulator import start_simulator
+from serial_session import PICO_USB_IDS, PortCache, SerialSession, cache_key, discover_port
+
+
+class FakePort:
+
+    """Helper Method : Initialisation of a listed USB serial port
+
+    Args: device : Port name
+          serial_number : USB serial number
+          usb_id : (vendor id, product id)
+    Returns : None
+
+    """
+    def __init__(self, device, serial_number, usb_id=PICO_USB_IDS[0]):
+        self.device = device
+        self.serial_number = serial_number
+        self.vid, self.pid = usb_id
+
+
+class ListedPorts:
+
+    """Helper Method : Replaces serial.tools.list_ports.comports while the with block runs, every call is counted
+
+    Args: ports : list of FakePort
+    Returns : None
+
+    """
+    def __init__(self, ports):
+        self.ports = ports
+        self.calls = 0
+
+    def comports(self):
+        self.calls += 1
+        return list(self.ports)
+
+    def __enter__(self):
+        self.comports_before = serial.tools.list_ports.comports
+        serial.tools.list_ports.comports = self.comports
+        return self
+
+    def __exit__(self, *exc):
+        serial.tools.list_ports.comports = self.comports_before
+
+
+"""Helper Method to start a simulated Pico behind a link in a directory
+
+    Args: directory : Directory of the link
+          name : Name of the link
+    Returns : Path of the link to the pseudo terminal of the simulator
+
+"""
+def simulated_device(directory, name):
+    simulator, pty = start_simulator(chatter=False)
+    device = os.path.join(directory, name)
+    os.symlink(pty, device)
+    return device
+
+
+"""Helper Method to ping the simulator through the session
+
+    Args: session : SerialSession
+          sequence : Sequence number of the ping
+    Returns : True if the ACK of the ping arrives
+
+"""
+def ping(session, sequence):
+    decoder = uart_protocol.FrameDecoder()
+    session.write(uart_protocol.encode_frame(uart_protocol.CMD_PING, sequence))
+    for attempt in range(0, 20):
+        for command, reply_sequence, payload in decoder.feed(session.read(64)):
+            if command == uart_protocol.CMD_ACK and reply_sequence == sequence:
+                return True
+    return False
+
+
+def test_cached_port_is_not_listed():
+    with tempfile.TemporaryDirectory() as directory:
+        device = simulated_device(directory, "ttyACM0")
+        cache = PortCache(os.path.join(directory, "port.json"))
+        cache.put(cache_key(PICO_USB_IDS), FakePort(device, "E6605838"))
+        with ListedPorts([FakePort(device, "E6605838")]) as listed:
+            with SerialSession(cache=cache, timeout=0.1) as session:
+                assert session.device == device
+                assert ping(session, 1)
+            assert listed.calls == 0
+
+
+def test_reconnect_rediscovers_moved_port():
+    with tempfile.TemporaryDirectory() as directory:
+        device = simulated_device(directory, "ttyACM0")
+        cache = PortCache(os.path.join(directory, "port.json"))
+        cache.put(cache_key(PICO_USB_IDS), FakePort(device, "E6605838"))
+        with ListedPorts([]) as listed:
+            with SerialSession(cache=cache, timeout=0.1, reconnect_delay=0) as session:
+                assert ping(session, 1)
+
+                #The Pico restarts and comes back as another port, another device has the lower name
+                os.remove(device)
+                moved = simulated_device(directory, "ttyACM2")
+                listed.ports = [FakePort(simulated_device(directory, "ttyACM1"), "0000AAAA"),
+                                FakePort(moved, "E6605838")]
+                session.reconnect()
+                assert session.device == moved and session.reconnects == 1
+                assert ping(session, 2)
+            assert listed.calls == 1
+            assert cache.get(cache_key(PICO_USB_IDS))["device"] == moved
+
+
+def test_discovery_without_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        devices = [simulated_device(directory, name) for name in ("ttyACM1", "ttyACM0")]
+        with ListedPorts([FakePort(devices[0], "B"), FakePort(devices[1], "A"),
+                          FakePort("/dev/ttyUSB0", "C", (0x0403, 0x6001))]):
+            assert discover_port(PICO_USB_IDS, None, []) == devices[1]
+
+
+if __name__ == "__main__":
+    tests = [(name, function) for name, function in sorted(globals().items()) if name.startswith("test_")]
+    failures = 0
+    for name, function in tests:
+        try:
+            function()
+            print(f"{name} : passed")
+        except AssertionError as e:
+            failures += 1
+            print(f"{name} : FAILED {e}")
+    print(f"All {len(tests)} tests passed" if failures == 0 else f"{failures} tests FAILED")
+    sys.exit(1 if failures else 0)
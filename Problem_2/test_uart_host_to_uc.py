@@ -0,0 +1,94 @@
+"""This is the test_uart_host_to_uc script
+
+Host tests of the batch streaming of UART_Host_to_uc.py against a scripted
+serial port, run with "python test_uart_host_to_uc.py" or with pytest:
+i) A batch whose replies all arrive completes every command.
+ii) A command rejected with a NACK in the middle of the window (ERR_PAYLOAD
+    after it was accepted, or ERR_COMMAND when it is received) is reported as
+    rejected, the commands around it complete and none is reported as lost.
+iii) A NACK ERR_CRC loses the first command that was not accepted yet.
+"""
+
+import sys
+
+import uart_protocol
+from UART_Host_to_uc import stream_commands
+
+COMMANDS = ["10 deg", "-20 deg", "30 deg", "40 deg"]
+
+
+class ScriptedSerial:
+
+    """Helper Method : Initialisation of a serial port that returns one reply frame per read
+
+    Args: replies : list of the frames read by the host, in order
+    Returns : None
+
+    """
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.written = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.replies[0]) if self.replies else 0
+
+    def read(self, n):
+        return self.replies.pop(0) if self.replies else b''
+
+    def write(self, data):
+        self.written += data
+
+
+def accepted(sequence):
+    return uart_protocol.encode_ack(sequence, uart_protocol.STATUS_ACCEPTED)
+
+
+def done(sequence, steps=100):
+    return uart_protocol.encode_ack(sequence, uart_protocol.STATUS_DONE, steps)
+
+
+def test_all_completed():
+    ser = ScriptedSerial([accepted(0), accepted(1), accepted(2), accepted(3), done(0), done(1), done(2), done(3)])
+    result = stream_commands(ser, COMMANDS, window=4, ack_timeout=0.5)
+    assert result["completed"] == 4 and result["rejected"] == [] and result["lost"] == []
+
+
+def test_rejected_after_accept_in_window():
+    #The third move cannot be planned on the Pico, the moves before and after it run
+    ser = ScriptedSerial([accepted(0), accepted(1), accepted(2), accepted(3),
+                          uart_protocol.encode_nack(2, uart_protocol.ERR_PAYLOAD), done(0), done(1), done(3)])
+    result = stream_commands(ser, COMMANDS, window=4, ack_timeout=0.5)
+    assert result["rejected"] == ["30 deg"]
+    assert result["completed"] == 3 and result["lost"] == [] and result["link_errors"] == 0
+
+
+def test_rejected_on_receive_in_window():
+    ser = ScriptedSerial([accepted(0), uart_protocol.encode_nack(1, uart_protocol.ERR_COMMAND), accepted(2),
+                          accepted(3), done(0), done(2), done(3)])
+    result = stream_commands(ser, COMMANDS, window=4, ack_timeout=0.5)
+    assert result["rejected"] == ["-20 deg"]
+    assert result["completed"] == 3 and result["lost"] == []
+
+
+def test_corrupted_frame_is_lost():
+    #The second frame arrives corrupted, its sequence number cannot be trusted
+    ser = ScriptedSerial([accepted(0), uart_protocol.encode_nack(0, uart_protocol.ERR_CRC), accepted(2),
+                          accepted(3), done(0), done(2), done(3)])
+    result = stream_commands(ser, COMMANDS, window=4, ack_timeout=0.5)
+    assert result["lost"] == ["-20 deg"]
+    assert result["completed"] == 3 and result["rejected"] == [] and result["link_errors"] == 1
+
+
+if __name__ == "__main__":
+    tests = [(name, function) for name, function in sorted(globals().items()) if name.startswith("test_")]
+    failures = 0
+    for name, function in tests:
+        try:
+            function()
+            print(f"{name} : passed")
+        except AssertionError as e:
+            failures += 1
+            print(f"{name} : FAILED {e}")
+    print(f"All {len(tests)} tests passed" if failures == 0 else f"{failures} tests FAILED")
+    sys.exit(1 if failures else 0)
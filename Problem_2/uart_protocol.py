@@ -0,0 +1,328 @@
+"""This is the uart_protocol script
+
+Framed binary protocol between the Host and the Raspberry Pi Pico, the same
+file runs on the Pico (MicroPython) and on the Host:
+i) Every frame is SYNC, length, command, sequence, payload, CRC. The length is
+   the payload length, the CRC-16/CCITT of length, command, sequence and
+   payload is appended little endian.
+ii) The Host sends CMD_MOVE with the angle as a signed 32 bit integer. The Pico
+    answers with CMD_ACK STATUS_ACCEPTED as soon as the frame is checked and
+    with CMD_ACK STATUS_DONE and the number of steps when the move is completed.
+    A frame that fails its checks is answered with CMD_NACK and an error code.
+    Replies carry the sequence number of their command, so the Host can keep
+    several commands in flight.
+iii) The Pico sends CMD_TELEMETRY frames with its tick count, the step position
+     and the fault and encoder pins packed into one byte (bit i is PIN_NAMES[i]).
+iv) read_frame reads one frame from a blocking stream with three reads of
+     known size, so the Pico does not build strings byte by byte, and
+     read_frame_async does the same in a uasyncio task. FrameDecoder
+     decodes frames from chunks of a non-blocking stream and skips everything
+     between frames (e.g. print output of the Pico).
+v) The Pico streams CMD_TELEMETRY_BATCH frames with up to MAX_BATCH_RECORDS
+   packed TELEMETRY_RECORD records (tick count in us, step position, encoder
+   count, pin byte) after the number of the first record, so the Host sees
+   records that were dropped. Only this frame may be longer than MAX_PAYLOAD,
+   the Pico keeps rejecting longer commands.
+"""
+
+import struct
+
+SYNC = 0xA5
+HEADER_SIZE = 4
+CRC_SIZE = 2
+MAX_PAYLOAD = 32
+
+# Commands of the Host
+CMD_MOVE = 0x01
+CMD_PING = 0x02
+
+# Replies and messages of the Pico
+CMD_ACK = 0x80
+CMD_NACK = 0x81
+CMD_TELEMETRY = 0x82
+CMD_TELEMETRY_BATCH = 0x83
+
+# Status of CMD_ACK
+STATUS_ACCEPTED = 0
+STATUS_DONE = 1
+
+# Error codes of CMD_NACK
+ERR_CRC = 1
+ERR_LENGTH = 2
+ERR_COMMAND = 3
+ERR_PAYLOAD = 4
+
+# Pins of a CMD_TELEMETRY frame, bit i of the pin byte is PIN_NAMES[i]
+PIN_NAMES = ("fault", "A+", "B+", "Z+", "A-", "B-", "Z-")
+
+# Records of a CMD_TELEMETRY_BATCH frame : ticks_us, step position, encoder count, pin byte,
+# after the number of the first record (16 bit, wraps) and the number of records
+TELEMETRY_RECORD = '<IiiB'
+TELEMETRY_RECORD_SIZE = 13
+BATCH_HEADER = '<HB'
+BATCH_HEADER_SIZE = 3
+MAX_BATCH_RECORDS = 19
+MAX_BATCH_PAYLOAD = BATCH_HEADER_SIZE + MAX_BATCH_RECORDS * TELEMETRY_RECORD_SIZE
+
+
+"""Helper Method to build the lookup table of CRC-16/CCITT (polynomial 0x1021)
+
+    Args: None
+    Returns : list of 256 table entries
+
+"""
+def _crc_table():
+    table = []
+    for byte in range(0, 256):
+        crc = byte << 8
+        for bit in range(0, 8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+"""Helper Method to compute the CRC-16/CCITT-FALSE of some bytes
+
+    Args: data : bytes, bytearray or memoryview
+          crc : Start value, the CRC of the preceding bytes
+    Returns : CRC
+
+"""
+def crc16(data, crc=0xFFFF):
+    table = _CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+class FrameError(Exception):
+
+    """Helper Method : Initialisation of the error of a frame that failed its checks
+
+    Args: error : ERR_CRC, ERR_LENGTH, ERR_COMMAND or ERR_PAYLOAD
+          sequence : Sequence number of the frame, it is not reliable for ERR_CRC
+    Returns : None
+
+    """
+    def __init__(self, error, sequence=0):
+        Exception.__init__(self, error, sequence)
+        self.error = error
+        self.sequence = sequence
+
+
+"""Helper Method to get the longest payload of a command
+
+    Args: command : Command id
+    Returns : MAX_BATCH_PAYLOAD for CMD_TELEMETRY_BATCH, MAX_PAYLOAD otherwise
+
+"""
+def max_payload(command):
+    return MAX_BATCH_PAYLOAD if command == CMD_TELEMETRY_BATCH else MAX_PAYLOAD
+
+
+"""Helper Method to encode a frame
+
+    Args: command : Command id
+          sequence : Sequence number, only the lowest 8 bits are sent
+          payload : bytes of at most max_payload(command)
+    Returns : bytearray of the frame
+
+"""
+def encode_frame(command, sequence, payload=b''):
+    length = len(payload)
+    if length > max_payload(command):
+        raise ValueError("encode_frame : payload too long")
+
+    frame = bytearray(HEADER_SIZE + length + CRC_SIZE)
+    frame[0] = SYNC
+    frame[1] = length
+    frame[2] = command
+    frame[3] = sequence & 0xFF
+    frame[HEADER_SIZE:HEADER_SIZE + length] = payload
+    crc = crc16(memoryview(frame)[1:HEADER_SIZE + length])
+    frame[-2] = crc & 0xFF
+    frame[-1] = crc >> 8
+    return frame
+
+
+def encode_move(sequence, angle):
+    return encode_frame(CMD_MOVE, sequence, struct.pack('<i', angle))
+
+
+def encode_ack(sequence, status, value=0):
+    return encode_frame(CMD_ACK, sequence, struct.pack('<Bi', status, value))
+
+
+def encode_nack(sequence, error):
+    return encode_frame(CMD_NACK, sequence, struct.pack('<B', error))
+
+
+def encode_telemetry(sequence, ticks_ms, position, pins):
+    return encode_frame(CMD_TELEMETRY, sequence, struct.pack('<IiB', ticks_ms & 0xFFFFFFFF, position, pins))
+
+
+"""Helper Method to decode the angle of a CMD_MOVE payload
+
+    Args: payload : Payload of the frame
+          sequence : Sequence number of the frame, for the error
+    Returns : Angle
+    Raises : FrameError ERR_PAYLOAD if the payload has the wrong size
+
+"""
+def decode_move(payload, sequence=0):
+    if len(payload) != 4:
+        raise FrameError(ERR_PAYLOAD, sequence)
+    return struct.unpack('<i', payload)[0]
+
+
+"""Helper Method to decode the payload of a CMD_ACK
+
+    Args: payload : Payload of the frame
+    Returns : (status, value)
+
+"""
+def decode_ack(payload):
+    return struct.unpack('<Bi', payload)
+
+
+"""Helper Method to decode the payload of a CMD_TELEMETRY
+
+    Args: payload : Payload of the frame
+    Returns : (ticks_ms, position, pins)
+
+"""
+def decode_telemetry(payload):
+    return struct.unpack('<IiB', payload)
+
+
+"""Helper Method to decode a CMD_TELEMETRY_BATCH payload
+
+    Args: payload : Payload of the frame
+    Returns : (number of the first record, number of records, memoryview of the packed records)
+    Raises : FrameError ERR_PAYLOAD if the size does not match the number of records
+
+"""
+def decode_telemetry_batch(payload):
+    if len(payload) < BATCH_HEADER_SIZE:
+        raise FrameError(ERR_PAYLOAD)
+    first, count = struct.unpack_from(BATCH_HEADER, payload)
+    if len(payload) != BATCH_HEADER_SIZE + count * TELEMETRY_RECORD_SIZE:
+        raise FrameError(ERR_PAYLOAD)
+    return first, count, memoryview(payload)[BATCH_HEADER_SIZE:]
+
+
+"""Helper Method to check the header of a frame (length, command, sequence)
+
+    Args: header : The 3 bytes after SYNC
+    Returns : Payload length
+    Raises : FrameError ERR_LENGTH
+
+"""
+def _check_header(header):
+    if header[0] > MAX_PAYLOAD:
+        raise FrameError(ERR_LENGTH, header[2])
+    return header[0]
+
+
+"""Helper Method to check the CRC of a frame
+
+    Args: header : The 3 bytes after SYNC
+          body : Payload and CRC
+    Returns : (command, sequence, payload)
+    Raises : FrameError ERR_CRC
+
+"""
+def _check_body(header, body):
+    length = header[0]
+    if crc16(body[:length], crc16(header)) != body[length] | (body[length + 1] << 8):
+        raise FrameError(ERR_CRC, header[2])
+    return header[1], header[2], bytes(body[:length])
+
+
+"""Helper Method to read one frame from a blocking stream
+
+    Args: read : Function that reads exactly n bytes, e.g. sys.stdin.buffer.read on the Pico
+    Returns : (command, sequence, payload)
+    Raises : FrameError ERR_LENGTH or ERR_CRC, the next call continues with the following bytes
+
+"""
+def read_frame(read):
+    #Everything up to the next SYNC byte is skipped
+    while read(1)[0] != SYNC:
+        pass
+
+    header = read(HEADER_SIZE - 1)
+    length = _check_header(header)
+    return _check_body(header, read(length + CRC_SIZE))
+
+
+"""Helper Method to read one frame from a uasyncio stream, other tasks run while it waits
+
+    Args: readexactly : Coroutine function that reads exactly n bytes, e.g. StreamReader.readexactly
+    Returns : (command, sequence, payload)
+    Raises : FrameError ERR_LENGTH or ERR_CRC, the next call continues with the following bytes
+
+"""
+async def read_frame_async(readexactly):
+    while (await readexactly(1))[0] != SYNC:
+        pass
+
+    header = await readexactly(HEADER_SIZE - 1)
+    length = _check_header(header)
+    return _check_body(header, await readexactly(length + CRC_SIZE))
+
+
+class FrameDecoder:
+
+    """Helper Method : Initialisation of the frame decoder, the frame buffer is preallocated
+
+    Args: None
+    Returns : None
+
+    """
+    def __init__(self):
+        self.buffer = bytearray(HEADER_SIZE + MAX_BATCH_PAYLOAD + CRC_SIZE)
+        self.size = 0
+        self.errors = 0
+
+    """Helper Method : Decodes the frames of a chunk of received bytes
+
+    A partial frame at the end of the chunk is kept until the next chunk.
+    Frames with a wrong length or CRC are counted in errors and decoding
+    resumes at the byte after their SYNC byte.
+
+    Args: data : Received bytes
+    Returns : list of (command, sequence, payload)
+
+    """
+    def feed(self, data):
+        frames = []
+        pending = list(data)
+        position = 0
+        buffer = self.buffer
+        while position < len(pending):
+            byte = pending[position]
+            position += 1
+            if self.size == 0 and byte != SYNC:
+                continue
+            buffer[self.size] = byte
+            self.size += 1
+
+            if self.size == 3 and buffer[1] > max_payload(buffer[2]):
+                self.errors += 1
+                pending[position:position] = [buffer[1], buffer[2]]
+                self.size = 0
+            elif self.size >= HEADER_SIZE and self.size == HEADER_SIZE + buffer[1] + CRC_SIZE:
+                length = buffer[1]
+                crc = crc16(memoryview(buffer)[1:HEADER_SIZE + length])
+                if crc == buffer[self.size - 2] | (buffer[self.size - 1] << 8):
+                    frames.append((buffer[2], buffer[3], bytes(buffer[HEADER_SIZE:HEADER_SIZE + length])))
+                else:
+                    #The SYNC byte was not the start of a frame, the bytes after it are decoded again
+                    self.errors += 1
+                    pending[position:position] = list(buffer[1:self.size])
+                self.size = 0
+        return frames